@@ -0,0 +1,97 @@
+# catalog_sync.py
+from pymongo import UpdateOne
+from database import cards_collection, user_cards_collection
+from models.card import extract_card_fields, with_content_hash
+from utils.bulk_data import iter_json_array
+from utils.card_sync import sync_user_cards
+from utils.fuzzy_matcher import invalidate_matcher
+import argparse
+import time
+
+DEFAULT_BATCH_SIZE = 1000
+REPORT_EVERY = 10000
+
+
+def ingest_bulk_file(path: str, batch_size: int = DEFAULT_BATCH_SIZE, incremental: bool = False,
+                     collection=cards_collection, log=print, user_cards=user_cards_collection) -> dict:
+    """
+    Charge un export Scryfall (default_cards / all_cards) dans le catalogue Cards.
+    Le fichier est lu en flux ; les cartes sont upsertees par lots via bulk_write.
+    Le champ "owners" des cartes existantes n'est pas touche ($set des seuls champs extraits).
+
+    Chaque carte porte un "content_hash" de son contenu extrait. En mode incremental,
+    les hashes deja en base sont lus par lot et seules les cartes nouvelles ou modifiees
+    sont ecrites : une synchro quotidienne ne reecrit plus tout le catalogue.
+    Les copies des cartes ecrites dans UserCards (champs de recherche) sont rafraichies au passage.
+    """
+    stats = {"processed": 0, "inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0, "user_cards_synced": 0}
+    batch = []
+    start = time.perf_counter()
+
+    def flush():
+        if not batch:
+            return
+
+        if incremental:
+            ids = [c["id"] for c in batch]
+            known_hashes = {
+                doc["id"]: doc.get("content_hash")
+                for doc in collection.find({"id": {"$in": ids}}, {"id": 1, "content_hash": 1})
+            }
+            to_write = [c for c in batch if known_hashes.get(c["id"]) != c["content_hash"]]
+            stats["unchanged"] += len(batch) - len(to_write)
+        else:
+            to_write = batch
+
+        if to_write:
+            result = collection.bulk_write(
+                [UpdateOne({"id": c["id"]}, {"$set": c}, upsert=True) for c in to_write],
+                ordered=False
+            )
+            stats["inserted"] += result.upserted_count
+            stats["updated"] += result.modified_count
+            stats["unchanged"] += result.matched_count - result.modified_count
+            stats["user_cards_synced"] += sync_user_cards(to_write, user_cards)
+        batch.clear()
+
+    with open(path, "r", encoding="utf-8") as fp:
+        for scryfall_card in iter_json_array(fp):
+            if not isinstance(scryfall_card, dict) or not scryfall_card.get("id"):
+                stats["skipped"] += 1
+                continue
+
+            cleaned = extract_card_fields(scryfall_card)
+            batch.append(with_content_hash(cleaned))
+            stats["processed"] += 1
+
+            if len(batch) >= batch_size:
+                flush()
+
+            if stats["processed"] % REPORT_EVERY == 0:
+                elapsed = time.perf_counter() - start
+                log(f"  {stats['processed']} cartes traitees ({stats['processed'] / elapsed:.0f} cartes/s)")
+
+        flush()
+
+    # Noms du catalogue changes : le matcher approximatif de ce processus est reconstruit
+    if stats["inserted"] or stats["updated"]:
+        invalidate_matcher()
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 2)
+    stats["cards_per_second"] = round(stats["processed"] / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import d'un export Scryfall (bulk data) dans le catalogue Cards")
+    parser.add_argument("path", help="Fichier JSON default_cards / all_cards telecharge depuis Scryfall")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--incremental", action="store_true", help="N'ecrit que les cartes nouvelles ou modifiees (hash de contenu)")
+    args = parser.parse_args()
+
+    print(f"Import de {args.path}{' (incremental)' if args.incremental else ''}...")
+    result = ingest_bulk_file(args.path, batch_size=args.batch_size, incremental=args.incremental)
+    print(f"Termine : {result['processed']} cartes en {result['seconds']}s ({result['cards_per_second']} cartes/s), "
+          f"{result['inserted']} nouvelles, {result['updated']} modifiees, {result['unchanged']} inchangees, "
+          f"{result['skipped']} ignorees, {result['user_cards_synced']} lignes de collection rafraichies.")
@@ -1,4 +1,5 @@
 from pymongo import MongoClient
+import asyncio
 import os
 
 
@@ -10,7 +11,7 @@ print(f"Base de données : {DB_NAME}")
 
 try:
     client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-    client.server_info() 
+    client.server_info()
 except Exception as e:
     print(f"Erreur critique de connexion MongoDB : {e}")
 
@@ -22,4 +23,115 @@ cards_collection = db["Cards"]
 user_cards_collection = db["UserCards"]
 users_collection = db["Users"]
 history_collection = db["History"]
-tag_rules_collection = db["tag_rules"]
\ No newline at end of file
+tag_rules_collection = db["tag_rules"]
+import_jobs_collection = db["import_jobs"]
+import_job_chunks_collection = db["import_job_chunks"]
+collection_versions_collection = db["collection_versions"]
+retag_jobs_collection = db["retag_jobs"]
+
+
+# --- COUCHE D'ACCES ASYNCHRONE ---
+# Les routes "async def" tournent directement dans la boucle d'evenements : un appel pymongo
+# synchrone y bloque toutes les autres requetes du worker. Comme Motor, on delegue chaque
+# operation au pool de threads (le MongoClient est thread-safe et partage son pool de connexions).
+# L'API reprend celle de Motor : `await coll.find_one(...)`, `await coll.find(...).to_list(None)`.
+
+class AsyncCursor:
+    """Curseur differe : la requete n'est executee qu'a l'appel de to_list()."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._modifiers = []
+
+    def sort(self, *args, **kwargs):
+        self._modifiers.append(("sort", args, kwargs))
+        return self
+
+    def skip(self, *args, **kwargs):
+        self._modifiers.append(("skip", args, kwargs))
+        return self
+
+    def limit(self, *args, **kwargs):
+        self._modifiers.append(("limit", args, kwargs))
+        return self
+
+    def _run(self, length):
+        cursor = self._factory()
+        for name, args, kwargs in self._modifiers:
+            cursor = getattr(cursor, name)(*args, **kwargs)
+        if length is None:
+            return list(cursor)
+        docs = []
+        for doc in cursor:
+            docs.append(doc)
+            if len(docs) >= length:
+                break
+        return docs
+
+    async def to_list(self, length=None):
+        return await asyncio.to_thread(self._run, length)
+
+
+class AsyncCollection:
+    """Enveloppe asynchrone d'une collection pymongo."""
+
+    def __init__(self, collection):
+        self.sync = collection
+        self.name = collection.name
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(lambda: self.sync.find(*args, **kwargs))
+
+    def aggregate(self, pipeline, **kwargs):
+        return AsyncCursor(lambda: self.sync.aggregate(pipeline, **kwargs))
+
+    async def _call(self, method, *args, **kwargs):
+        return await asyncio.to_thread(getattr(self.sync, method), *args, **kwargs)
+
+    async def find_one(self, *args, **kwargs):
+        return await self._call("find_one", *args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return await self._call("find_one_and_update", *args, **kwargs)
+
+    async def find_one_and_delete(self, *args, **kwargs):
+        return await self._call("find_one_and_delete", *args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        return await self._call("insert_one", *args, **kwargs)
+
+    async def insert_many(self, *args, **kwargs):
+        return await self._call("insert_many", *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return await self._call("update_one", *args, **kwargs)
+
+    async def update_many(self, *args, **kwargs):
+        return await self._call("update_many", *args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs):
+        return await self._call("delete_one", *args, **kwargs)
+
+    async def delete_many(self, *args, **kwargs):
+        return await self._call("delete_many", *args, **kwargs)
+
+    async def bulk_write(self, *args, **kwargs):
+        return await self._call("bulk_write", *args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return await self._call("count_documents", *args, **kwargs)
+
+    async def distinct(self, *args, **kwargs):
+        return await self._call("distinct", *args, **kwargs)
+
+
+async_items_collection = AsyncCollection(items_collection)
+async_cards_collection = AsyncCollection(cards_collection)
+async_user_cards_collection = AsyncCollection(user_cards_collection)
+async_users_collection = AsyncCollection(users_collection)
+async_history_collection = AsyncCollection(history_collection)
+async_tag_rules_collection = AsyncCollection(tag_rules_collection)
+async_import_jobs_collection = AsyncCollection(import_jobs_collection)
+async_import_job_chunks_collection = AsyncCollection(import_job_chunks_collection)
+async_collection_versions_collection = AsyncCollection(collection_versions_collection)
+async_retag_jobs_collection = AsyncCollection(retag_jobs_collection)
@@ -0,0 +1,22 @@
+# import_worker.py
+from utils.import_jobs import run_worker, new_worker_id
+import argparse
+import asyncio
+import logging
+import signal
+
+
+async def main(worker_id: str):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await run_worker(stop, worker_id)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Worker dedie de la file d'import (collection import_jobs)")
+    parser.add_argument("--id", default=None, help="Identifiant du worker (par defaut hote:pid:alea)")
+    args = parser.parse_args()
+    asyncio.run(main(args.id or new_worker_id()))
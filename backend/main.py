@@ -1,6 +1,14 @@
 # backend/main.py
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from migrations import run_migrations, report_index_drift
+from utils import scryfall_client
+from utils.import_jobs import run_worker, wake_worker
+from utils.retag_jobs import run_retag_worker, wake_retag_worker
+import asyncio
+import logging
+import os
 from routes.user_routes import router as user_router
 from routes.card_routes import router as card_router
 from routes.auth_routes import router as auth_router
@@ -9,7 +17,49 @@ from routes.item_routes import router as item_router
 from routes.history_routes import router as history_router
 from routes.tags_routes import router as tags_routes
 
-app = FastAPI(title="All Scans API")
+logger = logging.getLogger("main")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Index et migrations appliques avant de servir la moindre requete
+    if os.getenv("RUN_MIGRATIONS_ON_STARTUP", "1") == "1":
+        try:
+            await asyncio.to_thread(run_migrations)
+            await asyncio.to_thread(report_index_drift)
+        except Exception as e:
+            logger.error(f"Erreur lors des migrations au demarrage : {e}")
+
+    # Worker d'import embarque (desactivable si des workers dedies tournent a part : import_worker.py)
+    stop_worker = asyncio.Event()
+    worker_task = None
+    if os.getenv("IMPORT_WORKER_ENABLED", "1") == "1":
+        worker_task = asyncio.create_task(run_worker(stop_worker))
+    # Worker de re-tag (regles de tags modifiees), arrete avec le meme evenement
+    retag_task = None
+    if os.getenv("RETAG_WORKER_ENABLED", "1") == "1":
+        retag_task = asyncio.create_task(run_retag_worker(stop_worker))
+
+    yield
+
+    if retag_task:
+        stop_worker.set()
+        wake_retag_worker()
+        try:
+            await asyncio.wait_for(retag_task, timeout=30)
+        except asyncio.TimeoutError:
+            retag_task.cancel()
+
+    if worker_task:
+        # On laisse le bloc en cours se terminer : le job est rendu a la file proprement
+        stop_worker.set()
+        wake_worker()
+        try:
+            await asyncio.wait_for(worker_task, timeout=30)
+        except asyncio.TimeoutError:
+            worker_task.cancel()
+    await scryfall_client.close_client()
+
+app = FastAPI(title="All Scans API", lifespan=lifespan)
 
 # Middleware CORS complet
 app.add_middleware(
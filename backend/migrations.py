@@ -0,0 +1,343 @@
+# migrations.py
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from collections import Counter
+from datetime import datetime
+from database import db
+from models.card import card_search_fields, card_content_hash
+from utils.card_sync import resync_all_user_cards
+import argparse
+import logging
+
+logger = logging.getLogger("migrations")
+
+# Collection de suivi : un document par version appliquee ({"_id": version, ...})
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+# --- INDEX DECLARES ---
+# Etat attendu des index sur les chemins chauds, une fois toutes les migrations appliquees.
+# Sert uniquement a check_index_drift() : chaque migration cree sa propre liste d'index,
+# figee a sa livraison, pour que modifier cette declaration ne change pas une migration deja livree.
+EXPECTED_INDEXES = {
+    "UserCards": [
+        IndexModel([("user_id", ASCENDING), ("card_id", ASCENDING), ("is_foil", ASCENDING)], unique=True, name="user_card_foil_unique"),
+        # Rafraichissement des copies de champs de carte (utils/card_sync.py)
+        IndexModel([("card_id", ASCENDING)], name="user_cards_card_id"),
+        # /cards/search : filtre sur l'utilisateur puis tri sans jointure ; l'_id termine la cle
+        # pour la pagination par curseur (reprise apres (valeur de tri, _id))
+        IndexModel([("user_id", ASCENDING), ("name", ASCENDING), ("_id", ASCENDING)], name="user_cards_user_name_id"),
+        IndexModel([("user_id", ASCENDING), ("count", ASCENDING), ("_id", ASCENDING)], name="user_cards_user_count_id"),
+        IndexModel([("user_id", ASCENDING), ("prices.eur", ASCENDING), ("_id", ASCENDING)], name="user_cards_user_price_id"),
+        IndexModel([("user_id", ASCENDING), ("set_name", ASCENDING), ("_id", ASCENDING)], name="user_cards_user_set_name_id"),
+        # Filtres couleur (masque 5 bits) et force / endurance numeriques
+        IndexModel([("user_id", ASCENDING), ("color_mask", ASCENDING)], name="user_cards_user_color_mask"),
+        IndexModel([("user_id", ASCENDING), ("power_num", ASCENDING)], name="user_cards_user_power_num"),
+        IndexModel([("user_id", ASCENDING), ("toughness_num", ASCENDING)], name="user_cards_user_toughness_num"),
+        IndexModel([("user_id", ASCENDING), ("tags", ASCENDING)], name="user_cards_user_tags"),
+        IndexModel([("user_id", ASCENDING), ("set", ASCENDING), ("collector_number", ASCENDING)], name="user_cards_user_set"),
+        # Parcours par lots de la collection d'un utilisateur (re-tag : utils/tags_engine.retag_collection)
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_cards_user_id_order"),
+        # Exemplaires reserves par un deck construit (utils/deck_allocator.release_allocation)
+        IndexModel([("user_id", ASCENDING), ("allocations.deck_id", ASCENDING)], name="user_cards_user_allocations"),
+    ],
+    "Cards": [
+        # Cle de jointure de tous les $lookup et des find_one({"id": ...})
+        IndexModel([("id", ASCENDING)], name="cards_id"),
+        # Resolution locale des imports (utils/card_resolver.py)
+        IndexModel([("set", ASCENDING), ("collector_number", ASCENDING)], name="cards_set_number"),
+        IndexModel([("name", ASCENDING)], collation={"locale": "en", "strength": 2}, name="cards_name"),
+        IndexModel([("card_faces.name", ASCENDING)], collation={"locale": "en", "strength": 2}, name="cards_face_name"),
+    ],
+    "Users": [
+        # Lu a chaque requete authentifiee par get_current_user
+        IndexModel([("session_token", ASCENDING)], sparse=True, name="users_session_token"),
+        IndexModel([("email", ASCENDING)], name="users_email"),
+    ],
+    "History": [
+        IndexModel([("user_id", ASCENDING), ("date", DESCENDING)], name="history_user_date"),
+        # Entree d'historique unique par job d'import
+        IndexModel([("job_id", ASCENDING)], sparse=True, name="history_job_id"),
+        IndexModel([("user_id", ASCENDING), ("fingerprint", ASCENDING)], sparse=True, name="history_user_fingerprint"),
+    ],
+    "Items": [
+        IndexModel([("user_id", ASCENDING), ("type", ASCENDING), ("parent_id", ASCENDING)], name="items_user_type_parent"),
+    ],
+    "tag_rules": [
+        IndexModel([("user_id", ASCENDING)], name="tag_rules_user"),
+    ],
+    "import_jobs": [
+        # Prise de job par les workers (utils/import_jobs.claim_job)
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="import_jobs_status_created"),
+        # Ordre de service de l'ordonnanceur (tourniquet) et position dans la file
+        IndexModel([("status", ASCENDING), ("scheduled_at", ASCENDING), ("created_at", ASCENDING)], name="import_jobs_status_scheduled"),
+        # Progression : dernier job d'un utilisateur
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="import_jobs_user_created"),
+        # Detection des imports en double (utils/import_jobs.find_duplicate)
+        IndexModel([("user_id", ASCENDING), ("fingerprint", ASCENDING)], sparse=True, name="import_jobs_user_fingerprint"),
+    ],
+    "retag_jobs": [
+        # Prise de job par les workers de re-tag (utils/retag_jobs.claim_retag_job)
+        IndexModel([("status", ASCENDING), ("scheduled_at", ASCENDING)], name="retag_jobs_status_scheduled"),
+    ],
+    "import_job_chunks": [
+        IndexModel([("job_id", ASCENDING), ("seq", ASCENDING)], unique=True, name="import_job_chunks_job_seq"),
+    ],
+}
+
+
+def create_indexes(database, indexes: dict):
+    """Cree (de facon idempotente) les index d'une migration : {collection: [IndexModel, ...]}."""
+    for collection_name, models in indexes.items():
+        database[collection_name].create_indexes(models)
+
+
+# --- MIGRATIONS ---
+
+def migration_001_user_card_foil_unique(database):
+    """Remplace l'ancien index unique (user_id, card_id) par user_card_foil_unique (ex fix_indexes.py)."""
+    user_cards = database["UserCards"]
+    for index_name, info in user_cards.index_information().items():
+        keys = list(info.get("key", []))
+        if len(keys) == 2 and keys[0][0] == "user_id" and keys[1][0] == "card_id":
+            logger.info(f"Suppression de l'ancien index bloquant : {index_name}")
+            user_cards.drop_index(index_name)
+    create_indexes(database, {"UserCards": [
+        IndexModel([("user_id", ASCENDING), ("card_id", ASCENDING), ("is_foil", ASCENDING)], unique=True, name="user_card_foil_unique"),
+    ]})
+
+
+def migration_002_hot_path_indexes(database):
+    """Index des lectures frequentes : Cards.id, sessions, emails, historique, items, regles de tags."""
+    create_indexes(database, {
+        "Cards": [IndexModel([("id", ASCENDING)], name="cards_id")],
+        "Users": [
+            IndexModel([("session_token", ASCENDING)], sparse=True, name="users_session_token"),
+            IndexModel([("email", ASCENDING)], name="users_email"),
+        ],
+        "History": [IndexModel([("user_id", ASCENDING), ("date", DESCENDING)], name="history_user_date")],
+        "Items": [IndexModel([("user_id", ASCENDING), ("type", ASCENDING), ("parent_id", ASCENDING)], name="items_user_type_parent")],
+        "tag_rules": [IndexModel([("user_id", ASCENDING)], name="tag_rules_user")],
+    })
+
+
+def migration_003_card_resolver_indexes(database):
+    """Index du catalogue pour la resolution locale des imports (set/numero, noms insensibles a la casse)."""
+    create_indexes(database, {"Cards": [
+        IndexModel([("set", ASCENDING), ("collector_number", ASCENDING)], name="cards_set_number"),
+        IndexModel([("name", ASCENDING)], collation={"locale": "en", "strength": 2}, name="cards_name"),
+        IndexModel([("card_faces.name", ASCENDING)], collation={"locale": "en", "strength": 2}, name="cards_face_name"),
+    ]})
+
+
+def migration_004_import_jobs(database):
+    """File d'import persistante : index de import_jobs et de import_job_chunks, historique par job."""
+    create_indexes(database, {
+        "import_jobs": [
+            IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="import_jobs_status_created"),
+            IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="import_jobs_user_created"),
+        ],
+        "import_job_chunks": [
+            IndexModel([("job_id", ASCENDING), ("seq", ASCENDING)], unique=True, name="import_job_chunks_job_seq"),
+        ],
+        "History": [IndexModel([("job_id", ASCENDING)], sparse=True, name="history_job_id")],
+    })
+
+
+def migration_005_import_fingerprints(database):
+    """Empreintes de contenu des imports : recherche des doublons par utilisateur."""
+    create_indexes(database, {
+        "import_jobs": [IndexModel([("user_id", ASCENDING), ("fingerprint", ASCENDING)], sparse=True, name="import_jobs_user_fingerprint")],
+        "History": [IndexModel([("user_id", ASCENDING), ("fingerprint", ASCENDING)], sparse=True, name="history_user_fingerprint")],
+    })
+
+
+def migration_006_import_scheduler(database):
+    """Ordonnanceur d'import : index de la file et date de passage des jobs deja enregistres."""
+    create_indexes(database, {"import_jobs": [
+        IndexModel([("status", ASCENDING), ("scheduled_at", ASCENDING), ("created_at", ASCENDING)], name="import_jobs_status_scheduled"),
+    ]})
+    for job in database["import_jobs"].find({"scheduled_at": {"$exists": False}}, {"created_at": 1}):
+        database["import_jobs"].update_one({"_id": job["_id"]}, {"$set": {"scheduled_at": job.get("created_at")}})
+
+
+def migration_007_user_cards_search(database):
+    """Recherche sans jointure : index de tri/filtre sur UserCards et recopie des champs de Cards."""
+    # Les index de tri sans _id sont ceux livres ici ; la migration 8 les remplace
+    create_indexes(database, {"UserCards": [
+        IndexModel([("card_id", ASCENDING)], name="user_cards_card_id"),
+        IndexModel([("user_id", ASCENDING), ("name", ASCENDING)], name="user_cards_user_name"),
+        IndexModel([("user_id", ASCENDING), ("count", ASCENDING)], name="user_cards_user_count"),
+        IndexModel([("user_id", ASCENDING), ("prices.eur", ASCENDING)], name="user_cards_user_price"),
+        IndexModel([("user_id", ASCENDING), ("set_name", ASCENDING)], name="user_cards_user_set_name"),
+        IndexModel([("user_id", ASCENDING), ("tags", ASCENDING)], name="user_cards_user_tags"),
+        IndexModel([("user_id", ASCENDING), ("set", ASCENDING), ("collector_number", ASCENDING)], name="user_cards_user_set"),
+    ]})
+    modified = resync_all_user_cards(database)
+    logger.info(f"Copies de cartes rafraichies dans UserCards : {modified}")
+
+
+def migration_008_user_cards_keyset_indexes(database):
+    """Index de tri de /cards/search prolonges par _id (pagination par curseur) ; les anciens sont retires."""
+    existing = database["UserCards"].index_information()
+    for name in ["user_cards_user_name", "user_cards_user_count", "user_cards_user_price", "user_cards_user_set_name"]:
+        if name in existing:
+            database["UserCards"].drop_index(name)
+    create_indexes(database, {"UserCards": [
+        IndexModel([("user_id", ASCENDING), ("name", ASCENDING), ("_id", ASCENDING)], name="user_cards_user_name_id"),
+        IndexModel([("user_id", ASCENDING), ("count", ASCENDING), ("_id", ASCENDING)], name="user_cards_user_count_id"),
+        IndexModel([("user_id", ASCENDING), ("prices.eur", ASCENDING), ("_id", ASCENDING)], name="user_cards_user_price_id"),
+        IndexModel([("user_id", ASCENDING), ("set_name", ASCENDING), ("_id", ASCENDING)], name="user_cards_user_set_name_id"),
+    ]})
+
+
+def migration_009_card_search_fields(database, batch_size: int = 1000):
+    """
+    Masques de couleur et force / endurance numeriques : calcules sur les cartes du catalogue
+    qui ne les ont pas encore, puis recopies dans UserCards.
+    """
+    operations = []
+    for card in database["Cards"].find({"color_mask": {"$exists": False}}, {"owners": 0}):
+        fields = card_search_fields(card)
+        if card.get("content_hash"):
+            # Meme empreinte que celle qu'une nouvelle extraction de la carte produira
+            fields["content_hash"] = card_content_hash({**card, **fields})
+        operations.append(UpdateOne({"_id": card["_id"]}, {"$set": fields}))
+        if len(operations) >= batch_size:
+            database["Cards"].bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        database["Cards"].bulk_write(operations, ordered=False)
+
+    create_indexes(database, {"UserCards": [
+        IndexModel([("user_id", ASCENDING), ("color_mask", ASCENDING)], name="user_cards_user_color_mask"),
+        IndexModel([("user_id", ASCENDING), ("power_num", ASCENDING)], name="user_cards_user_power_num"),
+        IndexModel([("user_id", ASCENDING), ("toughness_num", ASCENDING)], name="user_cards_user_toughness_num"),
+    ]})
+    modified = resync_all_user_cards(database)
+    logger.info(f"Champs de recherche recopies dans UserCards : {modified}")
+
+
+def migration_010_retag_jobs(database):
+    """Re-tag en arriere-plan : file retag_jobs et parcours de UserCards par (user_id, _id)."""
+    create_indexes(database, {
+        "retag_jobs": [IndexModel([("status", ASCENDING), ("scheduled_at", ASCENDING)], name="retag_jobs_status_scheduled")],
+        "UserCards": [IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_cards_user_id_order")],
+    })
+
+
+def migration_011_deck_allocations(database):
+    """Reservations de deck marquees dans UserCards : index de liberation au demontage."""
+    create_indexes(database, {"UserCards": [
+        IndexModel([("user_id", ASCENDING), ("allocations.deck_id", ASCENDING)], name="user_cards_user_allocations"),
+    ]})
+
+
+def migration_012_allocation_ledger(database):
+    """
+    Registre des reservations pour les decks construits avant le marquage : la part de chaque
+    carte est rattachee a la premiere ligne de son card_id (celle que leur demontage liberait).
+    """
+    for deck in database["Items"].find(
+        {"type": "deck", "is_constructed": True, "tracked_allocations": {"$ne": True}},
+        {"user_id": 1, "cards": 1, "sideboard": 1}
+    ):
+        deck_id = str(deck["_id"])
+        counts = Counter(deck.get("cards", []) + deck.get("sideboard", []))
+        primary = {}
+        for row in database["UserCards"].find({"user_id": deck.get("user_id"), "card_id": {"$in": list(counts)}}, {"card_id": 1}):
+            primary.setdefault(row["card_id"], row["_id"])
+        operations = [
+            UpdateOne({"_id": row_id, "allocations.deck_id": {"$ne": deck_id}}, {"$push": {"allocations": {"deck_id": deck_id, "qty": counts[cid]}}})
+            for cid, row_id in primary.items()
+        ]
+        if operations:
+            database["UserCards"].bulk_write(operations, ordered=False)
+        database["Items"].update_one({"_id": deck["_id"]}, {"$set": {"tracked_allocations": True}})
+
+
+# Registre ordonne : (version, description, fonction). Ne jamais renumeroter une version deja livree.
+MIGRATIONS = [
+    (1, "Index unique user_card_foil_unique sur UserCards", migration_001_user_card_foil_unique),
+    (2, "Index des chemins chauds (Cards, Users, History, Items, tag_rules)", migration_002_hot_path_indexes),
+    (3, "Index de resolution locale des cartes (set/numero, noms)", migration_003_card_resolver_indexes),
+    (4, "File d'import persistante (import_jobs, import_job_chunks)", migration_004_import_jobs),
+    (5, "Empreintes des imports (doublons)", migration_005_import_fingerprints),
+    (6, "Ordonnanceur d'import (file par tourniquet)", migration_006_import_scheduler),
+    (7, "Recherche sur les champs copies dans UserCards (index, recopie)", migration_007_user_cards_search),
+    (8, "Index de pagination par curseur sur UserCards", migration_008_user_cards_keyset_indexes),
+    (9, "Masques de couleur et force/endurance numeriques (Cards, UserCards)", migration_009_card_search_fields),
+    (10, "File de re-tag en arriere-plan (retag_jobs)", migration_010_retag_jobs),
+    (11, "Reservations des decks construits (UserCards.allocations)", migration_011_deck_allocations),
+    (12, "Registre des reservations des decks deja construits", migration_012_allocation_ledger),
+]
+
+
+def get_applied_versions(database=db) -> set:
+    return {m["_id"] for m in database[MIGRATIONS_COLLECTION].find({}, {"_id": 1})}
+
+
+def run_migrations(database=db) -> list:
+    """
+    Applique dans l'ordre les migrations pas encore enregistrees.
+    Chaque migration est idempotente : si deux workers demarrent en meme temps,
+    la rejouer est sans effet.
+    """
+    applied = get_applied_versions(database)
+    newly_applied = []
+
+    for version, description, func in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info(f"Migration {version} : {description}")
+        func(database)
+        database[MIGRATIONS_COLLECTION].update_one(
+            {"_id": version},
+            {"$set": {"description": description, "applied_at": datetime.utcnow()}},
+            upsert=True
+        )
+        newly_applied.append(version)
+
+    return newly_applied
+
+
+def check_index_drift(database=db) -> list:
+    """Compare les index declares a ceux presents en base et liste les ecarts."""
+    drift = []
+    for collection_name, models in EXPECTED_INDEXES.items():
+        existing = database[collection_name].index_information()
+        for model in models:
+            spec = model.document
+            name = spec["name"]
+            expected_key = list(spec["key"].items())
+            current = existing.get(name)
+
+            if current is None:
+                drift.append({"collection": collection_name, "index": name, "problem": "missing"})
+            elif [(k, v) for k, v in current["key"]] != expected_key or bool(current.get("unique")) != bool(spec.get("unique")):
+                drift.append({"collection": collection_name, "index": name, "problem": "different"})
+    return drift
+
+
+def report_index_drift(database=db) -> list:
+    drift = check_index_drift(database)
+    for d in drift:
+        logger.warning(f"Derive d'index : {d['collection']}.{d['index']} ({d['problem']})")
+    return drift
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Migrations et index MongoDB de All Scans")
+    parser.add_argument("command", nargs="?", default="migrate", choices=["migrate", "status"])
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        done = run_migrations()
+        print(f"Migrations appliquees : {done if done else 'aucune (base a jour)'}")
+
+    applied = get_applied_versions()
+    for version, description, _ in MIGRATIONS:
+        state = "OK" if version in applied else "EN ATTENTE"
+        print(f"  [{state}] {version:03d} - {description}")
+
+    drift = report_index_drift()
+    print("Aucune derive d'index." if not drift else f"{len(drift)} derive(s) d'index detectee(s).")
@@ -1,5 +1,38 @@
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+import hashlib
+import json
+
+# Un bit par couleur : les filtres de couleur deviennent des egalites / $in sur un entier indexe
+COLOR_BITS = {"W": 1, "U": 2, "B": 4, "R": 8, "G": 16}
+
+
+def color_mask(colors) -> int:
+    """Masque 5 bits d'une liste de couleurs ; les symboles inconnus sont ignores."""
+    mask = 0
+    for color in colors or []:
+        mask |= COLOR_BITS.get(color, 0)
+    return mask
+
+
+def stat_number(value):
+    """Force / endurance numerique ("3" -> 3.0, "-1" -> -1.0) ; None pour "*", "1+*", "?"..."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number == number and abs(number) != float("inf") else None
+
+
+def card_search_fields(card: dict) -> dict:
+    """Champs derives pour la recherche, calcules depuis colors / color_identity / power / toughness."""
+    return {
+        "color_mask": color_mask(card.get("colors")),
+        "identity_mask": color_mask(card.get("color_identity")),
+        "power_num": stat_number(card.get("power")),
+        "toughness_num": stat_number(card.get("toughness"))
+    }
+
 
 def extract_card_fields(scryfall_data: dict) -> dict:
     # 1. Gestion des faces
@@ -48,7 +81,7 @@ def extract_card_fields(scryfall_data: dict) -> dict:
     purchase_uris = scryfall_data.get("purchase_uris", {})
 
     # 3. Retour
-    return {
+    cleaned = {
         "id": scryfall_data.get("id"),
         "oracle_id": scryfall_data.get("oracle_id"),
         "name": scryfall_data.get("name"),
@@ -81,6 +114,28 @@ def extract_card_fields(scryfall_data: dict) -> dict:
         
         "card_faces": scryfall_data.get("card_faces")
     }
+    cleaned.update(card_search_fields(cleaned))
+    return cleaned
+
+
+def card_content_hash(cleaned: dict) -> str:
+    """
+    Empreinte stable du contenu d'une carte nettoyee (sortie de extract_card_fields).
+    Les cles sont triees : deux extractions identiques donnent toujours le meme hash.
+    Les champs propres a notre base (_id, owners, content_hash) sont ignores.
+    """
+    content = {k: v for k, v in cleaned.items() if k not in ("_id", "owners", "content_hash")}
+    payload = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def with_content_hash(card: dict) -> dict:
+    """
+    (Re)calcule content_hash sur la carte et la renvoie. A appeler sur toute carte ecrite dans
+    Cards : un hash perime ferait passer une carte modifiee pour inchangee a la synchro incrementale.
+    """
+    card["content_hash"] = card_content_hash(card)
+    return card
 
 
 class Card(BaseModel):
@@ -111,6 +166,10 @@ class Card(BaseModel):
     reprint: Optional[bool] = False # AJOUTE: synchronisation avec la fonction d'extraction
     released_at: Optional[str] = None # AJOUTE: synchronisation avec la fonction d'extraction
     card_faces: Optional[List[Dict[str, Any]]] = None
+    color_mask: Optional[int] = 0
+    identity_mask: Optional[int] = 0
+    power_num: Optional[float] = None
+    toughness_num: Optional[float] = None
 
 
 def card_from_dict(data: dict) -> Card:
@@ -141,5 +200,6 @@ def card_from_dict(data: dict) -> Card:
         purchase_uris=data.get("purchase_uris", {}),
         reprint=data.get("reprint", False),
         released_at=data.get("released_at"),
-        card_faces=data.get("card_faces")
+        card_faces=data.get("card_faces"),
+        **card_search_fields(data)
     )
\ No newline at end of file
@@ -1,14 +1,16 @@
 import secrets
-import httpx
 import pyotp
 import urllib.parse
 from fastapi import APIRouter, HTTPException, Response, Request, Body, Depends
 from bson import ObjectId
 from datetime import datetime
 from utils.passwords import hash_password, verify_password, validate_password_strength
-from database import users_collection, user_cards_collection, cards_collection, items_collection, history_collection, tag_rules_collection
-from models.card import extract_card_fields
-from utils.tags_engine import get_automated_tags
+from database import users_collection, async_users_collection, async_user_cards_collection, async_cards_collection, async_items_collection, async_history_collection
+from models.card import extract_card_fields, with_content_hash
+from utils.tags_engine import get_automated_tags, load_user_rules
+from utils.card_sync import async_sync_user_cards
+from utils.search_cache import bump_collection_version
+from utils import scryfall_client
 
 router = APIRouter()
 
@@ -19,7 +21,7 @@ async def get_current_user(request: Request):
     if not token:
         raise HTTPException(status_code=401, detail="Non connecte")
 
-    user = users_collection.find_one({"session_token": token})
+    user = await async_users_collection.find_one({"session_token": token})
     if not user:
         raise HTTPException(status_code=401, detail="Session expiree ou invalide")
 
@@ -223,12 +225,12 @@ async def proxy_image(url: str):
     if not url.startswith("https://cards.scryfall.io/"):
         raise HTTPException(status_code=400, detail="URL non autorisee")
     
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(url)
-        if resp.status_code != 200:
-            raise HTTPException(status_code=404, detail="Image introuvable sur Scryfall")
-        
-        return Response(content=resp.content, media_type=resp.headers.get("content-type", "image/jpeg"))
+    # Le CDN d'images n'est pas soumis a la limite de l'API : pas de limiteur, mais le pool est partage
+    resp = await scryfall_client.get(url, rate_limited=False)
+    if resp.status_code != 200:
+        raise HTTPException(status_code=404, detail="Image introuvable sur Scryfall")
+    
+    return Response(content=resp.content, media_type=resp.headers.get("content-type", "image/jpeg"))
 
 @router.put("/me/nom")
 async def update_nom(data: dict = Body(...), user_id: str = Depends(get_current_user)):
@@ -239,13 +241,13 @@ async def update_nom(data: dict = Body(...), user_id: str = Depends(get_current_
     if len(new_nom) > 32:
         raise HTTPException(status_code=400, detail="Le pseudo est trop long (32 caracteres max)")
 
-    users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"nom": new_nom}})
+    await async_users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"nom": new_nom}})
     return {"message": "Pseudo mis a jour", "nom": new_nom}
 
 @router.put("/me/avatar")
 async def update_avatar(data: dict = Body(...), user_id: str = Depends(get_current_user)):
     new_avatar = data.get("avatar")
-    users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"avatar": new_avatar}})
+    await async_users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"avatar": new_avatar}})
     return {"message": "Avatar mis a jour", "avatar": new_avatar}
 
 @router.put("/me/email")
@@ -256,14 +258,14 @@ async def update_email(data: dict = Body(...), user_id: str = Depends(get_curren
     if not new_email or not password:
         raise HTTPException(status_code=400, detail="Champs manquants")
 
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    user = await async_users_collection.find_one({"_id": ObjectId(user_id)})
     if not verify_password(password, user["password"]):
         raise HTTPException(status_code=401, detail="Mot de passe actuel incorrect")
 
-    if users_collection.find_one({"email": new_email, "_id": {"$ne": ObjectId(user_id)}}):
+    if await async_users_collection.find_one({"email": new_email, "_id": {"$ne": ObjectId(user_id)}}):
         raise HTTPException(status_code=400, detail="Cette adresse email est deja utilisee")
 
-    users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"email": new_email}})
+    await async_users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"email": new_email}})
     return {"message": "Adresse email mise a jour"}
 
 @router.put("/me/password")
@@ -274,7 +276,7 @@ async def update_password(data: dict = Body(...), user_id: str = Depends(get_cur
     if not old_password or not new_password:
         raise HTTPException(status_code=400, detail="Champs manquants")
 
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    user = await async_users_collection.find_one({"_id": ObjectId(user_id)})
     if not verify_password(old_password, user["password"]):
         raise HTTPException(status_code=401, detail="Ancien mot de passe incorrect")
 
@@ -283,12 +285,12 @@ async def update_password(data: dict = Body(...), user_id: str = Depends(get_cur
         raise HTTPException(status_code=400, detail=pwd_check["message"])
 
     hashed_pw = hash_password(new_password)
-    users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"password": hashed_pw}})
+    await async_users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"password": hashed_pw}})
     return {"message": "Mot de passe mis a jour"}
 
 @router.get("/me/collection/ids")
 async def get_my_collection_ids(user_id: str = Depends(get_current_user)):
-    user_cards = list(user_cards_collection.find({"user_id": user_id}, {"card_id": 1}))
+    user_cards = await async_user_cards_collection.find({"user_id": user_id}, {"card_id": 1}).to_list(None)
     if not user_cards:
         return {"ids": []}
         
@@ -298,7 +300,7 @@ async def get_my_collection_ids(user_id: str = Depends(get_current_user)):
 @router.post("/me/collection/update/log")
 async def log_collection_update(data: dict = Body(...), user_id: str = Depends(get_current_user)):
     processed = data.get("processed", 0)
-    history_collection.insert_one({
+    await async_history_collection.insert_one({
         "user_id": user_id,
         "type": "COLLECTION_UPDATE",
         "date": datetime.utcnow(),
@@ -310,15 +312,17 @@ async def log_collection_update(data: dict = Body(...), user_id: str = Depends(g
 
 @router.delete("/me/collection")
 async def delete_my_collection(user_id: str = Depends(get_current_user)):
-    result = user_cards_collection.delete_many({"user_id": user_id})
+    result = await async_user_cards_collection.delete_many({"user_id": user_id})
+    await bump_collection_version(user_id)
     return {"message": f"Collection videe. {result.deleted_count} cartes supprimees."}
 
 @router.delete("/me")
 async def delete_account(request: Request, response: Response, user_id: str = Depends(get_current_user)):
-    user_cards_collection.delete_many({"user_id": user_id})
-    items_collection.delete_many({"user_id": user_id})
-    history_collection.delete_many({"user_id": user_id})
-    users_collection.delete_one({"_id": ObjectId(user_id)})
+    await async_user_cards_collection.delete_many({"user_id": user_id})
+    await bump_collection_version(user_id)
+    await async_items_collection.delete_many({"user_id": user_id})
+    await async_history_collection.delete_many({"user_id": user_id})
+    await async_users_collection.delete_one({"_id": ObjectId(user_id)})
 
     response.delete_cookie("session_token")
 
@@ -335,50 +339,55 @@ async def update_my_collection_chunk(data: dict = Body(...), user_id: str = Depe
     updated_count = 0
     
     # 1. Récupération des règles
-    user_rules = list(tag_rules_collection.find({"user_id": user_id}))
-    automated_tag_names = [rule.get("tag_name").strip().lower() for rule in user_rules]
+    user_rules = await load_user_rules(user_id)
+    automated_tag_names = user_rules.tag_names
     
     print(f"DEBUG: Synchronisation de {len(chunk)} cartes. Règles actives : {len(user_rules)}")
     
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            resp = await client.post("https://api.scryfall.com/cards/collection", json={"identifiers": identifiers})
-            if resp.status_code == 200:
-                scryfall_data = resp.json().get("data", [])
-                for scryfall_card in scryfall_data:
-                    cleaned = extract_card_fields(scryfall_card)
-                    card_id = cleaned["id"]
-                    
-                    # Mise à jour globale
-                    cards_collection.update_one({"id": card_id}, {"$set": cleaned})
-                    
-                    # 2. Calcul des tags
-                    current_auto_tags = get_automated_tags(cleaned, user_rules)
-                    
-                    if current_auto_tags:
-                        print(f"[Tags] Sync de {cleaned.get('name')} -> Applique : {current_auto_tags}")
-
-                    # 3. Nettoyage des anciens tags automatiques (pour éviter les doublons ou tags obsolètes)
-                    if automated_tag_names:
-                        user_cards_collection.update_many(
-                            {"user_id": user_id, "card_id": card_id},
-                            {"$pull": {"tags": {"$in": automated_tag_names}}}
-                        )
-
-                    # 4. Application des nouveaux tags
-                    if current_auto_tags:
-                        user_cards_collection.update_many(
-                            {"user_id": user_id, "card_id": card_id},
-                            {"$addToSet": {"tags": {"$each": current_auto_tags}}}
-                        )
-                    
-                    updated_count += 1
-            else:
-                print(f"DEBUG: Erreur Scryfall API: {resp.status_code}")
-        except Exception as e:
-            print(f"Erreur API Scryfall chunk: {e}")
-            import traceback
-            traceback.print_exc()
-            raise HTTPException(status_code=500, detail="Erreur API Scryfall")
-            
+    try:
+        resp = await scryfall_client.post("/cards/collection", json={"identifiers": identifiers})
+        if resp.status_code == 200:
+            scryfall_data = resp.json().get("data", [])
+            refreshed_cards = []
+            for scryfall_card in scryfall_data:
+                cleaned = extract_card_fields(scryfall_card)
+                card_id = cleaned["id"]
+                
+                # Mise à jour globale
+                await async_cards_collection.update_one({"id": card_id}, {"$set": with_content_hash(cleaned)})
+                refreshed_cards.append(cleaned)
+                
+                # 2. Calcul des tags
+                current_auto_tags = get_automated_tags(cleaned, user_rules)
+                
+                if current_auto_tags:
+                    print(f"[Tags] Sync de {cleaned.get('name')} -> Applique : {current_auto_tags}")
+
+                # 3. Nettoyage des anciens tags automatiques (pour éviter les doublons ou tags obsolètes)
+                if automated_tag_names:
+                    await async_user_cards_collection.update_many(
+                        {"user_id": user_id, "card_id": card_id},
+                        {"$pull": {"tags": {"$in": automated_tag_names}}}
+                    )
+
+                # 4. Application des nouveaux tags
+                if current_auto_tags:
+                    await async_user_cards_collection.update_many(
+                        {"user_id": user_id, "card_id": card_id},
+                        {"$addToSet": {"tags": {"$each": current_auto_tags}}}
+                    )
+                
+                updated_count += 1
+
+            # Copies des champs de carte dans UserCards (tous les utilisateurs qui la possedent)
+            await async_sync_user_cards(refreshed_cards)
+            await bump_collection_version(user_id)
+        else:
+            print(f"DEBUG: Erreur Scryfall API: {resp.status_code}")
+    except Exception as e:
+        print(f"Erreur API Scryfall chunk: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Erreur API Scryfall")
+        
     return {"updated": updated_count}
\ No newline at end of file
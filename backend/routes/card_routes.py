@@ -1,28 +1,140 @@
 # routes/card_routes.py
 from fastapi import APIRouter, HTTPException, Depends, Request, Query
-from database import cards_collection, user_cards_collection
-from models.card import extract_card_fields
+from database import async_cards_collection, async_user_cards_collection
+from models.card import extract_card_fields, with_content_hash, color_mask, stat_number, COLOR_BITS
 from routes.auth_routes import get_current_user
 from bson import ObjectId
+from bson.errors import InvalidId
 from typing import List, Optional
 from pydantic import BaseModel
+from collections import OrderedDict
+import asyncio
+import base64
+import binascii
+import json
+import os
 import re
-import httpx
+import time
+from utils import scryfall_client
+from utils.search_cache import search_cache, get_collection_version, bump_collection_version
+from utils.fuzzy_matcher import invalidate_matcher
 
 
 router = APIRouter()
 
+# Champs renvoyes par /cards/search, lus directement sur les lignes UserCards
+# (copies des champs de Cards, tenues a jour par utils/card_sync.py)
+SEARCH_PROJECTION = {
+    "_id": 1,
+    "count": 1,
+    "is_foil": 1,
+    "tags": 1,
+    "name": 1,
+    "rarity": 1,
+    "colors": 1,
+    "oracle_text": 1,
+    "power": 1,
+    "toughness": 1,
+    "image_normal": 1,
+    "image_art_crop": 1,
+    "set_name": 1,
+    "set": 1,
+    "prices": 1,
+    "id": "$card_id"
+}
+
+# Total d'une recherche : compte arrete a SEARCH_COUNT_LIMIT (au-dela, le total est une borne
+# basse signalee par total_estimated). Compte a la premiere page, puis reutilise quelques
+# secondes pour les pages suivantes de la meme recherche (defilement infini).
+SEARCH_COUNT_LIMIT = int(os.getenv("SEARCH_COUNT_LIMIT", "10000"))
+SEARCH_COUNT_TTL_SECONDS = float(os.getenv("SEARCH_COUNT_TTL_SECONDS", "30"))
+SEARCH_COUNT_CACHE_SIZE = 1024
+
+# {(user_id, version de la collection, filtre serialise): (instant du comptage, total, estime)}
+_search_counts = OrderedDict()
+
+
+async def count_search_results(user_id: str, version: int, query: dict, reuse: bool = False):
+    """
+    Nombre de cartes correspondant au filtre complet de /cards/search, renvoye avec un indicateur
+    d'estimation. Le comptage s'arrete a SEARCH_COUNT_LIMIT ; sur les filtres couverts par un index
+    (utilisateur, tags, set...), MongoDB compte sur l'index sans lire les documents.
+    Avec reuse, un total compte recemment pour le meme filtre est renvoye tel quel, tant que la
+    collection n'a pas change (version de utils/search_cache.py, comme le cache des reponses).
+    """
+    key = (user_id, version, json.dumps(query, sort_keys=True, default=str))
+    cached = _search_counts.get(key)
+    if reuse and cached and time.monotonic() - cached[0] < SEARCH_COUNT_TTL_SECONDS:
+        _search_counts.move_to_end(key)
+        return cached[1], cached[2]
+
+    total = await async_user_cards_collection.count_documents(query, limit=SEARCH_COUNT_LIMIT)
+    estimated = total >= SEARCH_COUNT_LIMIT
+
+    _search_counts[key] = (time.monotonic(), total, estimated)
+    _search_counts.move_to_end(key)
+    while len(_search_counts) > SEARCH_COUNT_CACHE_SIZE:
+        _search_counts.popitem(last=False)
+    return total, estimated
+
+
+# Tris proposes par /cards/search (sort_by -> champ de UserCards). L'_id departage les egalites :
+# l'ordre est total, ce qui permet la pagination par curseur.
+SEARCH_SORT_FIELDS = {
+    "count": "count",
+    "price": "prices.eur",
+    "set": "set_name",
+    "name": "name"
+}
+
+
+def encode_search_cursor(doc: dict, sort_field: str, sort_dir: int) -> str:
+    """Curseur opaque (base64 url) de la derniere carte d'une page : (tri, valeur de tri, _id)."""
+    value = doc
+    for part in sort_field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    payload = json.dumps({"f": sort_field, "d": sort_dir, "v": value, "id": str(doc["_id"])}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def keyset_filter(sort_field: str, sort_dir: int, value, last_id: ObjectId) -> dict:
+    """
+    Cartes situees apres (value, last_id) dans l'ordre {sort_field: sort_dir, _id: sort_dir}.
+    Les valeurs nulles ou absentes sont triees avant toutes les autres : en tete en ordre
+    croissant, en fin en ordre decroissant.
+    """
+    after = "$gt" if sort_dir == 1 else "$lt"
+    if value is None:
+        same_value = {sort_field: None, "_id": {after: last_id}}
+        return {"$or": [same_value, {sort_field: {"$ne": None}}]} if sort_dir == 1 else same_value
+
+    branches = [{sort_field: {after: value}}, {sort_field: value, "_id": {after: last_id}}]
+    if sort_dir == -1:
+        branches.append({sort_field: None})
+    return {"$or": branches}
+
+
+def decode_search_cursor(cursor: str, sort_field: str, sort_dir: int) -> dict:
+    """Filtre de reprise correspondant a un curseur renvoye par /cards/search."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(payload)
+        last_id = ObjectId(state["id"])
+    except (binascii.Error, ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    if state.get("f") != sort_field or state.get("d") != sort_dir:
+        raise HTTPException(status_code=400, detail="Curseur obtenu avec un autre tri")
+    return keyset_filter(sort_field, sort_dir, state.get("v"), last_id)
+
+
 class CardBatchRequest(BaseModel):
     card_ids: List[str]
 
-def build_comparison_query(value: str, operator: str):
-    try:
-        numeric_value = float(value)
-        is_numeric = True
-    except ValueError:
-        numeric_value = value
-        is_numeric = False
-
+def build_stat_query(field: str, value: str, operator: str) -> dict:
+    """
+    Filtre sur la force ou l'endurance. Valeur numerique : comparaison sur le champ numerique
+    indexe (power_num / toughness_num). Sinon ("*", "1+*"...) : egalite sur le texte.
+    """
     mongo_ops = {
         "=": "$eq",
         ">": "$gt",
@@ -33,11 +145,18 @@ def build_comparison_query(value: str, operator: str):
     }
     
     op_code = mongo_ops.get(operator, "$eq")
-    
-    if not is_numeric and operator in [">", ">=", "<", "<="]:
-        return value
+    numeric_value = stat_number(value)
+
+    if numeric_value is not None:
+        return {f"{field}_num": {op_code: numeric_value}}
+    if operator in [">", ">=", "<", "<="]:
+        return {field: value}
+    return {field: {op_code: value}}
 
-    return {op_code: numeric_value}
+
+def color_subset_masks(mask: int) -> list:
+    """Masques non vides inclus dans mask (au plus 31) : un $in sur l'index plutot qu'un test bit a bit."""
+    return [m for m in range(1, 32) if m & ~mask == 0]
 
 @router.post("/cards/batch")
 async def get_cards_batch(payload: CardBatchRequest, user_id: str = Depends(get_current_user)):
@@ -46,10 +165,10 @@ async def get_cards_batch(payload: CardBatchRequest, user_id: str = Depends(get_
         if not ids:
             return {"cards": []}
 
-        cards_cursor = cards_collection.find({"id": {"$in": ids}})
+        cards_cursor = await async_cards_collection.find({"id": {"$in": ids}}).to_list(None)
         cards_map = {c["id"]: c for c in cards_cursor}
 
-        user_entries = list(user_cards_collection.find({"user_id": user_id, "card_id": {"$in": ids}}))
+        user_entries = await async_user_cards_collection.find({"user_id": user_id, "card_id": {"$in": ids}}).to_list(None)
         user_counts = {u["card_id"]: u["count"] for u in user_entries}
 
         result = []
@@ -91,9 +210,24 @@ async def search_user_cards(
     sort_dir: int = 1,
     set_code: Optional[str] = None,
     page: int = 1,
-    limit: int = 200
+    limit: int = 200,
+    cursor: Optional[str] = None
 ):
+    """
+    Recherche dans la collection de l'utilisateur. Pagination par page (skip) ou, pour le
+    defilement, par curseur : next_cursor de la reponse precedente reprend juste apres
+    la derniere carte renvoyee, en temps constant quelle que soit la profondeur.
+    Les reponses sont mises en cache jusqu'a la prochaine modification de la collection.
+    """
+    # Parametres de la recherche, lus avant toute autre variable locale
+    search_params = {k: v for k, v in locals().items() if k not in ("request", "user_id")}
     try:
+        version = await get_collection_version(user_id)
+        cache_key = search_cache.make_key(user_id, version, search_params)
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         initial_match = {"user_id": user_id}
         
         if tags:
@@ -110,11 +244,6 @@ async def search_user_cards(
                 else:
                     initial_match["tags"] = {"$nin": excluded_tags}
 
-            if set_code:
-                initial_match["card_id"] = {"$regex": f"^{set_code.lower()}"}
-
-        pipeline = [{"$match": initial_match}]
-        
         match_filters = {}
 
         if name:
@@ -128,19 +257,16 @@ async def search_user_cards(
 
         if colors:
             raw_colors = [c.strip() for c in colors.split(",")]
+            # color_mask : un bit par couleur (W=1, U=2, B=4, R=8, G=16), 0 pour incolore
             if "C" in raw_colors:
-                match_filters["colors"] = {"$size": 0}
+                match_filters["color_mask"] = 0
             else:
                 if color_mode == "exact":
-                    match_filters["$and"] = [
-                        {"colors": {"$all": raw_colors}},
-                        {"colors": {"$size": len(raw_colors)}}
-                    ]
+                    # Un symbole inconnu ne peut correspondre a aucune carte
+                    known = all(c in COLOR_BITS for c in raw_colors)
+                    match_filters["color_mask"] = color_mask(raw_colors) if known else -1
                 else: 
-                    match_filters["colors"] = {
-                        "$not": {"$elemMatch": {"$nin": raw_colors}},
-                        "$ne": []
-                    }
+                    match_filters["color_mask"] = {"$in": color_subset_masks(color_mask(raw_colors))}
 
         if type_line:
             types = [t.strip() for t in type_line.split(",") if t.strip()]
@@ -165,10 +291,10 @@ async def search_user_cards(
             match_filters["cmc"] = float(cmc)
 
         if power is not None:
-            match_filters["power"] = build_comparison_query(power, power_op)
+            match_filters.update(build_stat_query("power", power, power_op))
         
         if toughness is not None:
-            match_filters["toughness"] = build_comparison_query(toughness, toughness_op)
+            match_filters.update(build_stat_query("toughness", toughness, toughness_op))
 
         if format_legality:
             field_path = f"legalities.{format_legality.lower()}"
@@ -182,77 +308,44 @@ async def search_user_cards(
         if set_code:
             match_filters["set"] = set_code.lower()
 
-        skip = (page - 1) * limit
-        
         sort_dir_val = int(sort_dir) if int(sort_dir) in [1, -1] else 1
-        sort_field_map = {
-            "count": "count",
-            "price": "prices.eur",
-            "set": "set_name",
-            "name": "name"
-        }
-        actual_sort_field = sort_field_map.get(sort_by, "name")
-
-        # Construction dynamique du sous-pipeline data
-        data_pipeline = [
-            {
-                "$lookup": {
-                    "from": "Cards",
-                    "localField": "card_id",
-                    "foreignField": "id",
-                    "as": "details"
-                }
-            },
-            {"$unwind": "$details"},
-            {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$details", "$$ROOT"]}}}
-        ]
-
-        if match_filters:
-            data_pipeline.append({"$match": match_filters})
-
-        data_pipeline.extend([
-            {"$sort": {actual_sort_field: sort_dir_val}},
+        actual_sort_field = SEARCH_SORT_FIELDS.get(sort_by, "name")
+
+        query = {**initial_match, **match_filters}
+        if cursor:
+            page_match = {"$and": [query, decode_search_cursor(cursor, actual_sort_field, sort_dir_val)]}
+            skip = 0
+        else:
+            page_match = query
+            skip = (page - 1) * limit
+
+        # Filtres et tri portent sur les champs copies dans UserCards : pas de jointure vers Cards,
+        # le $match et le $sort de tete s'appuient sur les index (user_id, <champ de tri>).
+        # La page est lue seule (tri + limite) ; le total est compte a part, sur le meme filtre.
+        pipeline = [
+            {"$match": page_match},
+            {"$sort": {actual_sort_field: sort_dir_val, "_id": sort_dir_val}},
             {"$skip": skip},
             {"$limit": limit},
-            {
-                "$project": {
-                    "_id": 1,
-                    "count": 1,
-                    "is_foil": 1, 
-                    "tags": 1, 
-                    "name": "$details.name",
-                    "rarity": "$details.rarity",
-                    "colors": "$details.colors",
-                    "oracle_text": "$details.oracle_text",
-                    "power": "$details.power",
-                    "toughness": "$details.toughness",
-                    "image_normal": "$details.image_normal",
-                    "image_art_crop": "$details.image_art_crop",
-                    "set_name": "$details.set_name",
-                    "set": "$details.set",
-                    "prices": "$details.prices",
-                    "id": "$details.id"
-                }
-            }
-        ])
+            {"$project": SEARCH_PROJECTION}
+        ]
 
-        pipeline.append({
-            "$facet": {
-                "metadata": [{"$count": "total"}],
-                "data": data_pipeline
-            }
-        })
+        data, (total, total_estimated) = await asyncio.gather(
+            async_user_cards_collection.aggregate(pipeline).to_list(None),
+            count_search_results(user_id, version, query, reuse=page > 1 or bool(cursor))
+        )
 
-        result = list(user_cards_collection.aggregate(pipeline))
-        
-        data = result[0]["data"]
-        total = result[0]["metadata"][0]["total"] if result[0]["metadata"] else 0
+        next_cursor = encode_search_cursor(data[-1], actual_sort_field, sort_dir_val) if len(data) == limit else None
 
         for c in data:
             c["_id"] = str(c["_id"])
 
-        return {"cards": data, "total": total}
+        result = {"cards": data, "total": total, "total_estimated": total_estimated, "next_cursor": next_cursor}
+        search_cache.put(cache_key, result)
+        return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -261,24 +354,28 @@ async def search_user_cards(
 async def get_all_cards(user_id: str = Depends(get_current_user)):
     return await search_user_cards(Request, user_id=user_id, page=1, limit=200)
 
+@router.get("/cards/search/cache-stats")
+async def get_search_cache_stats(user_id: str = Depends(get_current_user)):
+    """Taille et taux de succes du cache de /cards/search (processus courant)."""
+    return search_cache.stats()
+
 @router.get("/cards/{card_id}")
 async def get_single_card(card_id: str, is_foil: Optional[bool] = None, user_id: str = Depends(get_current_user)):
     try:
         query = {"_id": ObjectId(card_id)} if ObjectId.is_valid(card_id) else {"id": card_id}
-        card = cards_collection.find_one(query)
+        card = await async_cards_collection.find_one(query)
         
         # --- FALLBACK SCRYFALL SECURISE ---
         if not card and not ObjectId.is_valid(card_id):
             try:
-                headers = {"User-Agent": "MyMTGApp/1.0", "Accept": "application/json"}
-                async with httpx.AsyncClient(timeout=15.0) as client:
-                    resp = await client.get(f"https://api.scryfall.com/cards/{card_id}", headers=headers)
-                    if resp.status_code == 200:
-                        cleaned = extract_card_fields(resp.json())
-                        cards_collection.insert_one(cleaned)
-                        card = cleaned
-                    else:
-                        raise HTTPException(status_code=404, detail=f"Non trouve sur Scryfall (Code: {resp.status_code})")
+                resp = await scryfall_client.get(f"/cards/{card_id}")
+                if resp.status_code == 200:
+                    cleaned = extract_card_fields(resp.json())
+                    await async_cards_collection.insert_one(with_content_hash(cleaned))
+                    invalidate_matcher()
+                    card = cleaned
+                else:
+                    raise HTTPException(status_code=404, detail=f"Non trouve sur Scryfall (Code: {resp.status_code})")
             except Exception as fallback_err:
                 print(f"Erreur de telechargement Scryfall: {fallback_err}")
                 raise HTTPException(status_code=500, detail=f"Erreur de telechargement depuis Scryfall: {str(fallback_err)}")
@@ -290,7 +387,7 @@ async def get_single_card(card_id: str, is_foil: Optional[bool] = None, user_id:
         if is_foil is not None:
             uc_query["is_foil"] = is_foil
 
-        uc = user_cards_collection.find_one(uc_query)
+        uc = await async_user_cards_collection.find_one(uc_query)
         
         if "_id" in card:
             card["_id"] = str(card["_id"])
@@ -313,7 +410,7 @@ async def delete_card(card_id: str, is_foil: Optional[bool] = None, user_id: str
     try:
         target_id = card_id
         if ObjectId.is_valid(card_id):
-            c = cards_collection.find_one({"_id": ObjectId(card_id)})
+            c = await async_cards_collection.find_one({"_id": ObjectId(card_id)})
             if c:
                 target_id = c.get("id")
         
@@ -321,11 +418,12 @@ async def delete_card(card_id: str, is_foil: Optional[bool] = None, user_id: str
         if is_foil is not None:
             uc_query["is_foil"] = is_foil
 
-        res = user_cards_collection.delete_one(uc_query)
+        res = await async_user_cards_collection.delete_one(uc_query)
+        await bump_collection_version(user_id)
         
-        remaining = user_cards_collection.count_documents({"user_id": user_id, "card_id": target_id})
+        remaining = await async_user_cards_collection.count_documents({"user_id": user_id, "card_id": target_id})
         if remaining == 0:
-            cards_collection.update_one({"id": target_id}, {"$pull": {"owners": user_id}})
+            await async_cards_collection.update_one({"id": target_id}, {"$pull": {"owners": user_id}})
         
         if res.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Introuvable")
@@ -333,6 +431,11 @@ async def delete_card(card_id: str, is_foil: Optional[bool] = None, user_id: str
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/cards/scryfall/stats")
+async def get_scryfall_stats(user_id: str = Depends(get_current_user)):
+    """Compteurs du client Scryfall partage (requetes, reessais, latence moyenne)."""
+    return scryfall_client.get_stats()
+
 @router.post("/cards/update-multifaces")
 async def update_multiface_cards(user_id: str = Depends(get_current_user)):
     return {"message": "Non implemente"}
@@ -375,7 +478,7 @@ async def get_collection_sets(sort_dir: int = -1, user_id: str = Depends(get_cur
             }
         }
     ]
-    sets = list(user_cards_collection.aggregate(pipeline))
+    sets = await async_user_cards_collection.aggregate(pipeline).to_list(None)
     return {"sets": sets}
 
 
@@ -383,19 +486,17 @@ async def get_collection_sets(sort_dir: int = -1, user_id: str = Depends(get_cur
 async def get_card_prints(oracle_id: str, user_id: str = Depends(get_current_user)):
     """Recupere toutes les impressions (reprints) d'une carte via son oracle_id depuis Scryfall."""
     try:
-        url = f"https://api.scryfall.com/cards/search?order=released&q=oracle_id:{oracle_id}&unique=prints"
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(url)
-            
-            if resp.status_code != 200:
-                raise HTTPException(status_code=404, detail="Impressions introuvables sur Scryfall.")
-            
-            data = resp.json().get("data", [])
-            
-            # On passe chaque impression dans ton modele d'extraction pour standardiser la donnee
-            cleaned_prints = [extract_card_fields(c) for c in data]
-            
-            return {"prints": cleaned_prints}
+        resp = await scryfall_client.get(f"/cards/search?order=released&q=oracle_id:{oracle_id}&unique=prints")
+        
+        if resp.status_code != 200:
+            raise HTTPException(status_code=404, detail="Impressions introuvables sur Scryfall.")
+        
+        data = resp.json().get("data", [])
+        
+        # On passe chaque impression dans ton modele d'extraction pour standardiser la donnee
+        cleaned_prints = [extract_card_fields(c) for c in data]
+        
+        return {"prints": cleaned_prints}
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -429,5 +530,5 @@ async def get_collection_tags_summary(sort_dir: int = 1, user_id: str = Depends(
         }
     ]
     
-    tags_summary = list(user_cards_collection.aggregate(pipeline))
+    tags_summary = await async_user_cards_collection.aggregate(pipeline).to_list(None)
     return {"tags_summary": tags_summary}
\ No newline at end of file
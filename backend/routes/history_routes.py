@@ -1,7 +1,8 @@
 # routes/history_routes.py
 from fastapi import APIRouter, HTTPException, Depends
-from database import history_collection, user_cards_collection, cards_collection
+from database import async_history_collection, async_user_cards_collection, async_cards_collection, async_import_jobs_collection
 from routes.auth_routes import get_current_user
+from utils.search_cache import bump_collection_version
 from bson import ObjectId
 import logging
 
@@ -13,7 +14,7 @@ router = APIRouter()
 async def get_user_history(user_id: str = Depends(get_current_user)):
     try:
         # Récupère l'historique du plus récent au plus ancien
-        cursor = history_collection.find({"user_id": user_id}).sort("date", -1).limit(50)
+        cursor = await async_history_collection.find({"user_id": user_id}).sort("date", -1).limit(50).to_list(None)
         history_list = []
         
         for entry in cursor:
@@ -27,7 +28,7 @@ async def get_user_history(user_id: str = Depends(get_current_user)):
 @router.delete("/history")
 async def clear_user_history(user_id: str = Depends(get_current_user)):
     try:
-        result = history_collection.delete_many({"user_id": user_id})
+        result = await async_history_collection.delete_many({"user_id": user_id})
         return {"message": f"Historique effacé. {result.deleted_count} entrées supprimées."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -41,7 +42,7 @@ async def revert_history_import(history_id: str, user_id: str = Depends(get_curr
         if not ObjectId.is_valid(history_id):
             raise HTTPException(status_code=400, detail="ID d'historique invalide")
             
-        entry = history_collection.find_one({"_id": ObjectId(history_id), "user_id": uid})
+        entry = await async_history_collection.find_one({"_id": ObjectId(history_id), "user_id": uid})
         
         if not entry:
             raise HTTPException(status_code=404, detail="Historique introuvable")
@@ -59,25 +60,30 @@ async def revert_history_import(history_id: str, user_id: str = Depends(get_curr
                 qty_to_remove = card.get("quantity", 1)
                 
                 # On cherche la carte dans la collection de l'utilisateur
-                user_card = user_cards_collection.find_one({"user_id": uid, "card_id": card_id})
+                user_card = await async_user_cards_collection.find_one({"user_id": uid, "card_id": card_id})
                 
                 if user_card:
                     new_count = user_card.get("count", 0) - qty_to_remove
                     
                     if new_count <= 0:
                         # Si on tombe a 0 ou moins, on supprime completement la carte de la collection
-                        user_cards_collection.delete_one({"_id": user_card["_id"]})
+                        await async_user_cards_collection.delete_one({"_id": user_card["_id"]})
                     else:
                         # Sinon on met a jour la quantite restante
-                        user_cards_collection.update_one(
+                        await async_user_cards_collection.update_one(
                             {"_id": user_card["_id"]},
                             {"$set": {"count": new_count}}
                         )
                 
                 reverted_count += qty_to_remove
 
+        await bump_collection_version(uid)
+
         # 3. On supprime la ligne de l'historique pour confirmer l'annulation
-        history_collection.delete_one({"_id": ObjectId(history_id)})
+        await async_history_collection.delete_one({"_id": ObjectId(history_id)})
+        # Le meme contenu pourra etre reimporte sans etre signale comme doublon
+        if entry.get("job_id"):
+            await async_import_jobs_collection.update_one({"_id": entry["job_id"]}, {"$unset": {"fingerprint": ""}})
 
         return {"message": "Import annule avec succes", "reverted_count": reverted_count}
 
@@ -91,7 +97,7 @@ async def revert_history_import(history_id: str, user_id: str = Depends(get_curr
 async def get_history_recap(log_id: str, user_id: str = Depends(get_current_user)):
     from bson import ObjectId
     
-    log = history_collection.find_one({"_id": ObjectId(log_id), "user_id": user_id})
+    log = await async_history_collection.find_one({"_id": ObjectId(log_id), "user_id": user_id})
     if not log:
         raise HTTPException(status_code=404, detail="Historique introuvable")
 
@@ -100,7 +106,7 @@ async def get_history_recap(log_id: str, user_id: str = Depends(get_current_user
         return {"cards": [], "log_details": log.get("details", "")}
 
     card_ids = [c["id"] for c in cards_in_log if "id" in c]
-    global_cards = list(cards_collection.find({"id": {"$in": card_ids}}))
+    global_cards = await async_cards_collection.find({"id": {"$in": card_ids}}).to_list(None)
     cards_map = {c["id"]: c for c in global_cards}
 
     enriched_cards = []
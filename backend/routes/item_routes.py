@@ -2,17 +2,23 @@ from fastapi import APIRouter, HTTPException, Depends, Request, Body
 from pymongo import MongoClient
 from bson import ObjectId
 from routes.auth_routes import get_current_user
-from database import items_collection, user_cards_collection, cards_collection, history_collection
+from database import items_collection, async_items_collection, async_user_cards_collection, async_cards_collection, async_history_collection
 from collections import Counter 
-from models.card import extract_card_fields
+from models.card import extract_card_fields, with_content_hash
 from utils.import_parser import parse_mtg_line
 import math
 import re
-import httpx
-from datetime import datetime
+from utils import scryfall_client
+from utils.card_resolver import resolve_identifiers
+from utils.fuzzy_matcher import invalidate_matcher
+from utils.deck_allocator import ALLOCATION_ATTEMPTS, load_allocation_rows, plan_allocation, apply_allocation, release_allocation, release_legacy_allocation, decks_using_cards
+from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/items", tags=["items"])
 
+# Duree maximale d'une construction de deck (au-dela, le bail est repris par une nouvelle demande)
+BUILD_LEASE_SECONDS = 30
+
 BASIC_LAND_NAMES = {
     "W": "Plains", "U": "Island", "B": "Swamp", "R": "Mountain", "G": "Forest", "C": "Wastes"
 }
@@ -27,16 +33,15 @@ FALLBACK_LAND_IDS = {
 }
 
 async def ensure_card_exists_in_db(card_id: str):
-    if not cards_collection.find_one({"id": card_id}):
-        async with httpx.AsyncClient() as client:
-            try:
-                resp = await client.get(f"https://api.scryfall.com/cards/{card_id}")
-                if resp.status_code == 200:
-                    from models.card import extract_card_fields
-                    cleaned = extract_card_fields(resp.json())
-                    cards_collection.insert_one(cleaned)
-            except Exception as e:
-                print(f"Erreur fallback download {card_id}: {e}")
+    if not await async_cards_collection.find_one({"id": card_id}):
+        try:
+            resp = await scryfall_client.get(f"/cards/{card_id}")
+            if resp.status_code == 200:
+                cleaned = extract_card_fields(resp.json())
+                await async_cards_collection.insert_one(with_content_hash(cleaned))
+                invalidate_matcher()
+        except Exception as e:
+            print(f"Erreur fallback download {card_id}: {e}")
 
 @router.get("/folders/all")
 def get_all_folders(user_id: str = Depends(get_current_user)):
@@ -72,7 +77,7 @@ async def create_item(request: Request, user_id: str = Depends(get_current_user)
     }
     if type_ == "deck": new_item["format"] = format_
 
-    result = items_collection.insert_one(new_item)
+    result = await async_items_collection.insert_one(new_item)
     return {"message": f"{type_.capitalize()} cree", "id": str(result.inserted_id)}
 
 @router.get("")
@@ -90,7 +95,7 @@ async def get_item_details(item_id: str, user_id: str = Depends(get_current_user
         if not ObjectId.is_valid(item_id):
             raise HTTPException(status_code=400, detail="ID Invalide")
             
-        item = items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
+        item = await async_items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
         if not item: raise HTTPException(status_code=404, detail="Introuvable")
 
         if item.get("type") == "deck":
@@ -98,12 +103,12 @@ async def get_item_details(item_id: str, user_id: str = Depends(get_current_user
             side_counts = Counter(item.get("sideboard", []))
             unique_ids = list(set(main_counts.keys()).union(side_counts.keys()))
             
-            global_cards = list(cards_collection.find({"id": {"$in": unique_ids}}))
+            global_cards = await async_cards_collection.find({"id": {"$in": unique_ids}}).to_list(None)
             cards_map = {c["id"]: c for c in global_cards}
             
             deck_card_names = [c.get("name") for c in global_cards if c.get("name")]
             
-            user_cards_cursor = user_cards_collection.find({"user_id": user_id, "name": {"$in": deck_card_names}})
+            user_cards_cursor = await async_user_cards_collection.find({"user_id": user_id, "name": {"$in": deck_card_names}}).to_list(None)
             user_cards_map = {}
             for uc in user_cards_cursor:
                 c_name = uc.get("name")
@@ -169,96 +174,66 @@ async def update_item(item_id: str, data: dict = Body(...), user_id: str = Depen
     if "image" in data: update_fields["image"] = data["image"]
     if "parent_id" in data: update_fields["parent_id"] = data["parent_id"]
 
-    item = items_collection.find_one({"_id": ObjectId(item_id), "user_id": uid})
+    item = await async_items_collection.find_one({"_id": ObjectId(item_id), "user_id": uid})
     if not item: raise HTTPException(status_code=404, detail="Item non trouve")
 
+    building = False
     if "is_constructed" in data:
         target_status = data["is_constructed"]
         current_status = item.get("is_constructed", False)
 
         if target_status and not current_status:
-            all_cards_to_build = item.get("cards", []) + item.get("sideboard", [])
-            card_counts = Counter(all_cards_to_build)
-            missing_details = []
-            cards_to_lock = []
-            swaps_to_make = []
-
-            unique_ids = list(card_counts.keys())
-            global_cards = {c["id"]: c for c in cards_collection.find({"id": {"$in": unique_ids}})}
-
-            for cid, required_qty in card_counts.items():
-                user_card = user_cards_collection.find_one({"user_id": uid, "card_id": cid})
-                global_card = global_cards.get(cid)
-                
-                card_name = cid
-                if user_card and "name" in user_card:
-                    card_name = user_card["name"]
-                elif global_card and "name" in global_card:
-                    card_name = global_card["name"]
-
-                total_owned = user_card.get("count", 0) if user_card else 0
-                assigned = user_card.get("assigned_count", 0) if user_card else 0
-                available = total_owned - assigned
-
-                if available < required_qty:
-                    shortage = required_qty - available
-                    
-                    alternatives = list(user_cards_collection.find({
-                        "user_id": uid, "name": card_name, "card_id": {"$ne": cid}
-                    }))
-
-                    found_alternatives = []
-                    current_shortage = shortage
-
-                    for alt in alternatives:
-                        if current_shortage <= 0: break
-                        alt_avail = alt.get("count", 0) - alt.get("assigned_count", 0)
-                        if alt_avail > 0:
-                            take = min(current_shortage, alt_avail)
-                            found_alternatives.append({
-                                "_id": alt["_id"], "id": alt["card_id"], "name": alt.get("name", card_name), "qty": take
-                            })
-                            current_shortage -= take
-
-                    if current_shortage == 0:
-                        if available > 0:
-                            cards_to_lock.append({"_id": user_card["_id"], "qty": available, "name": card_name, "id": cid})
-                        cards_to_lock.extend(found_alternatives)
-                        swaps_to_make.append({"old_id": cid, "qty_to_swap": shortage, "new_cards": found_alternatives})
-                        continue 
-
-                    total_alt_avail = sum([alt.get("count", 0) - alt.get("assigned_count", 0) for alt in alternatives])
-                    true_available = available + total_alt_avail
-
-                    using_decks = items_collection.find({
-                        "user_id": uid, "type": "deck", "is_constructed": True,
-                        "$or": [{"cards": cid}, {"sideboard": cid}]
-                    })
-                    
-                    used_in_list = []
-                    for d in using_decks:
-                        qty_in_this_deck = d.get("cards", []).count(cid) + d.get("sideboard", []).count(cid)
-                        if qty_in_this_deck > 0 and str(d["_id"]) != item_id:
-                            used_in_list.append(f"{d.get('nom', 'Deck inconnu')} (x{qty_in_this_deck})")
-
-                    reason = "assigned_elsewhere" if (true_available > 0 and used_in_list) else "not_in_collection"
-
-                    missing_details.append({
-                        "name": card_name, "required": required_qty, "available": true_available,
-                        "reason": reason, "used_in": used_in_list
-                    })
-                else:
-                    cards_to_lock.append({"_id": user_card["_id"], "qty": required_qty, "name": card_name, "id": cid})
+            # Bail de construction : un double envoi ne reserve pas deux fois les memes cartes
+            now = datetime.utcnow()
+            claimed = await async_items_collection.find_one_and_update(
+                {"_id": ObjectId(item_id), "user_id": uid, "is_constructed": {"$ne": True},
+                 "$or": [{"building_until": {"$exists": False}}, {"building_until": {"$lt": now}}]},
+                {"$set": {"building_until": now + timedelta(seconds=BUILD_LEASE_SECONDS)}}
+            )
+            if not claimed:
+                raise HTTPException(status_code=409, detail="Construction du deck deja en cours.")
+            building = True
 
-            if missing_details:
-                raise HTTPException(
-                    status_code=400, 
-                    detail={"message": "Impossible de construire le deck.", "missing_cards": missing_details}
-                )
+            try:
+                card_counts = Counter(item.get("cards", []) + item.get("sideboard", []))
+                unique_ids = list(card_counts.keys())
+                global_cards = {c["id"]: c for c in await async_cards_collection.find({"id": {"$in": unique_ids}}).to_list(None)}
+                names = list({c["name"] for c in global_cards.values() if c.get("name")})
+
+                # Reservations laissees par une construction interrompue : rendues avant de recommencer
+                await release_allocation(uid, item_id)
+
+                for _ in range(ALLOCATION_ATTEMPTS):
+                    rows = await load_allocation_rows(uid, unique_ids, names)
+                    # Nom different dans la collection et dans le catalogue : ses autres impressions aussi
+                    extra_names = {r["name"] for r in rows if r.get("card_id") in card_counts and r.get("name")} - set(names)
+                    if extra_names:
+                        names += list(extra_names)
+                        rows = await load_allocation_rows(uid, unique_ids, names)
+
+                    plan = plan_allocation(card_counts, rows, global_cards)
+                    if plan["missing"]:
+                        used_in = await decks_using_cards(uid, [m["id"] for m in plan["missing"]], item_id)
+                        missing_details = [{
+                            "name": m["name"], "required": m["required"], "available": m["available"],
+                            "reason": "assigned_elsewhere" if (m["available"] > 0 and used_in[m["id"]]) else "not_in_collection",
+                            "used_in": used_in[m["id"]]
+                        } for m in plan["missing"]]
+                        raise HTTPException(
+                            status_code=400,
+                            detail={"message": "Impossible de construire le deck.", "missing_cards": missing_details}
+                        )
+                    if await apply_allocation(uid, item_id, plan["locks"]):
+                        break
+                else:
+                    raise HTTPException(status_code=409, detail="La collection a change pendant la construction, veuillez reessayer.")
+            except BaseException:
+                await async_items_collection.update_one({"_id": ObjectId(item_id)}, {"$unset": {"building_until": ""}})
+                raise
 
-            if swaps_to_make:
+            if plan["swaps"]:
                 new_deck_list = item.get("cards", []).copy()
-                for swap in swaps_to_make:
+                for swap in plan["swaps"]:
                     for _ in range(swap["qty_to_swap"]):
                         if swap["old_id"] in new_deck_list:
                             new_deck_list.remove(swap["old_id"])
@@ -266,47 +241,67 @@ async def update_item(item_id: str, data: dict = Body(...), user_id: str = Depen
                         new_deck_list.extend([new_c["id"]] * new_c["qty"])
                 update_fields["cards"] = new_deck_list
 
-            history_cards = []
-            for c in cards_to_lock:
-                user_cards_collection.update_one({"_id": c["_id"]}, {"$inc": {"assigned_count": c["qty"]}})
-                history_cards.append({"id": c["id"], "name": c["name"], "found": True, "quantity": c["qty"]})
-
-            history_collection.insert_one({
+            history_cards = [{"id": c["id"], "name": c["name"], "found": True, "quantity": c["qty"]} for c in plan["locks"]]
+            await async_history_collection.insert_one({
                 "user_id": uid, "type": "DECK_BUILD", "date": datetime.utcnow(),
                 "details": f"Construction du deck : {item.get('nom', 'Inconnu')}", "status": "success",
                 "cards": history_cards
             })
             update_fields["is_constructed"] = True
+            # Reservations marquees dans UserCards (allocations) : le demontage rend exactement ces lignes
+            update_fields["tracked_allocations"] = True
 
         elif not target_status and current_status:
-            all_cards_to_free = item.get("cards", []) + item.get("sideboard", [])
-            card_counts = Counter(all_cards_to_free)
-            history_cards = []
-
-            for cid, qty_to_free in card_counts.items():
-                user_card = user_cards_collection.find_one({"user_id": uid, "card_id": cid})
-                if user_card and user_card.get("assigned_count", 0) > 0:
-                    user_cards_collection.update_one({"_id": user_card["_id"]}, {"$inc": {"assigned_count": -qty_to_free}})
-                    history_cards.append({"id": cid, "name": user_card.get("name", "Carte inconnue"), "found": True, "quantity": qty_to_free})
-
-            history_collection.insert_one({
-                "user_id": uid, "type": "DECK_UNBUILD", "date": datetime.utcnow(),
-                "details": f"Demantelement du deck : {item.get('nom', 'Inconnu')}", "status": "success",
-                "cards": history_cards
-            })
+            # Meme bail que la construction, pris avant de rendre quoi que ce soit : is_constructed
+            # ne repasse a False qu'une fois les reservations rendues, aucune construction du meme
+            # deck ne peut s'intercaler. Un seul demontage rend les cartes, meme en cas de double envoi.
+            now = datetime.utcnow()
+            claimed = await async_items_collection.find_one_and_update(
+                {"_id": ObjectId(item_id), "user_id": uid, "is_constructed": True,
+                 "$or": [{"building_until": {"$exists": False}}, {"building_until": {"$lt": now}}]},
+                {"$set": {"building_until": now + timedelta(seconds=BUILD_LEASE_SECONDS)}}
+            )
+            if claimed:
+                building = True
+                try:
+                    if claimed.get("tracked_allocations"):
+                        released = await release_allocation(uid, item_id)
+                    else:
+                        released = await release_legacy_allocation(uid, Counter(claimed.get("cards", []) + claimed.get("sideboard", [])))
+                except BaseException:
+                    await async_items_collection.update_one({"_id": ObjectId(item_id)}, {"$unset": {"building_until": ""}})
+                    raise
+                history_cards = [{"id": c["id"], "name": c["name"], "found": True, "quantity": c["qty"]} for c in released]
+
+                await async_history_collection.insert_one({
+                    "user_id": uid, "type": "DECK_UNBUILD", "date": datetime.utcnow(),
+                    "details": f"Demantelement du deck : {item.get('nom', 'Inconnu')}", "status": "success",
+                    "cards": history_cards
+                })
+            else:
+                current = await async_items_collection.find_one({"_id": ObjectId(item_id), "user_id": uid}, {"is_constructed": 1})
+                if current and current.get("is_constructed"):
+                    raise HTTPException(status_code=409, detail="Construction ou demontage du deck deja en cours.")
             update_fields["is_constructed"] = False
+            update_fields["tracked_allocations"] = False
 
     if not update_fields: 
         raise HTTPException(status_code=400, detail="Aucune donnee a modifier")
 
-    items_collection.update_one({"_id": ObjectId(item_id), "user_id": uid}, {"$set": update_fields})
+    update = {"$set": update_fields}
+    if building:
+        update["$unset"] = {"building_until": ""}
+    await async_items_collection.update_one({"_id": ObjectId(item_id), "user_id": uid}, update)
     return {"message": "Mise a jour effectuee"}
 
 @router.delete("/{item_id}")
-def delete_item(item_id: str, user_id: str = Depends(get_current_user)):
-    result = items_collection.delete_one({"_id": ObjectId(item_id), "user_id": user_id})
-    if result.deleted_count == 1: return {"message": "Element supprime"}
-    raise HTTPException(status_code=404, detail="Element non trouve")
+async def delete_item(item_id: str, user_id: str = Depends(get_current_user)):
+    item = await async_items_collection.find_one_and_delete({"_id": ObjectId(item_id), "user_id": user_id})
+    if not item: raise HTTPException(status_code=404, detail="Element non trouve")
+    # Deck construit supprime : ses exemplaires reserves redeviennent disponibles
+    if item.get("is_constructed") and item.get("tracked_allocations"):
+        await release_allocation(str(user_id), item_id)
+    return {"message": "Element supprime"}
 
 @router.post("/{item_id}/add_card")
 async def add_card_to_item(item_id: str, data: dict = Body(...), user_id: str = Depends(get_current_user)):
@@ -315,7 +310,7 @@ async def add_card_to_item(item_id: str, data: dict = Body(...), user_id: str =
     
     if not card_id_received: raise HTTPException(status_code=400, detail="Aucun ID fourni")
 
-    item = items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
+    item = await async_items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
     if not item: raise HTTPException(status_code=404, detail="Item non trouve")
     if item["type"] != "deck": raise HTTPException(status_code=400, detail="Ce n'est pas un deck")
     if item.get("is_constructed", False): raise HTTPException(status_code=400, detail="Veuillez demonter le deck au prealable.")
@@ -324,17 +319,17 @@ async def add_card_to_item(item_id: str, data: dict = Body(...), user_id: str =
     card_image = None
 
     if ObjectId.is_valid(card_id_received):
-        user_card = user_cards_collection.find_one({"_id": ObjectId(card_id_received)})
+        user_card = await async_user_cards_collection.find_one({"_id": ObjectId(card_id_received)})
         if user_card:
             target_scryfall_id = user_card.get("card_id")
             card_image = user_card.get("image_art_crop") or user_card.get("image_normal")
         else:
-            global_card = cards_collection.find_one({"_id": ObjectId(card_id_received)})
+            global_card = await async_cards_collection.find_one({"_id": ObjectId(card_id_received)})
             if global_card:
                 target_scryfall_id = global_card.get("id")
                 card_image = global_card.get("image_art_crop") or global_card.get("image_normal")
     else:
-        global_card = cards_collection.find_one({"id": card_id_received})
+        global_card = await async_cards_collection.find_one({"id": card_id_received})
         if global_card: card_image = global_card.get("image_art_crop") or global_card.get("image_normal")
 
     target_array = "sideboard" if is_sideboard else "cards"
@@ -343,7 +338,7 @@ async def add_card_to_item(item_id: str, data: dict = Body(...), user_id: str =
     if not item.get("image") and card_image and not is_sideboard:
         update_query["$set"] = {"image": card_image}
 
-    items_collection.update_one({"_id": ObjectId(item_id)}, update_query)
+    await async_items_collection.update_one({"_id": ObjectId(item_id)}, update_query)
     return {"message": "Carte ajoutee", "added_id": target_scryfall_id}
 
 @router.post("/{item_id}/remove_card")
@@ -353,7 +348,7 @@ async def remove_card_from_item(item_id: str, data: dict = Body(...), user_id: s
     
     if not card_id: raise HTTPException(status_code=400, detail="Aucun ID de carte fourni")
 
-    item = items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
+    item = await async_items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
     if not item: raise HTTPException(status_code=404, detail="Item non trouve")
     if item.get("is_constructed", False): raise HTTPException(status_code=400, detail="Veuillez demonter au prealable.")
 
@@ -362,7 +357,7 @@ async def remove_card_from_item(item_id: str, data: dict = Body(...), user_id: s
     
     if card_id in current_cards:
         current_cards.remove(card_id) 
-        items_collection.update_one({"_id": ObjectId(item_id)}, {"$set": {target_array: current_cards}})
+        await async_items_collection.update_one({"_id": ObjectId(item_id)}, {"$set": {target_array: current_cards}})
         return {"message": "Carte retiree"}
     else:
         raise HTTPException(status_code=404, detail="Carte non presente")
@@ -374,7 +369,7 @@ async def toggle_card_board(item_id: str, data: dict = Body(...), user_id: str =
     
     if not card_id: raise HTTPException(status_code=400, detail="Aucun ID fourni")
 
-    item = items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
+    item = await async_items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
     if not item: raise HTTPException(status_code=404, detail="Item non trouve")
     if item.get("is_constructed", False): raise HTTPException(status_code=400, detail="Veuillez demonter au prealable.")
 
@@ -387,7 +382,7 @@ async def toggle_card_board(item_id: str, data: dict = Body(...), user_id: str =
     if card_id in current_source:
         current_source.remove(card_id)
         current_dest.append(card_id)
-        items_collection.update_one(
+        await async_items_collection.update_one(
             {"_id": ObjectId(item_id)}, 
             {"$set": {source_array: current_source, dest_array: current_dest}}
         )
@@ -414,12 +409,12 @@ def duplicate_item(item_id: str, data: dict = Body(...), user_id: str = Depends(
 async def auto_balance_lands(item_id: str, user_id: str = Depends(get_current_user)):
     try:
         if not ObjectId.is_valid(item_id): raise HTTPException(status_code=400, detail="ID Invalide")
-        deck = items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
+        deck = await async_items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
         if not deck or deck.get("type") != "deck": raise HTTPException(status_code=404, detail="Deck introuvable")
 
         current_card_ids = deck.get("cards", [])
         unique_ids = list(set(current_card_ids))
-        global_cards = list(cards_collection.find({"id": {"$in": unique_ids}}))
+        global_cards = await async_cards_collection.find({"id": {"$in": unique_ids}}).to_list(None)
         cards_map = {c["id"]: c for c in global_cards}
 
         pips = {"W": 0, "U": 0, "B": 0, "R": 0, "G": 0, "C": 0}
@@ -477,7 +472,7 @@ async def auto_balance_lands(item_id: str, user_id: str = Depends(get_current_us
             elif diff > 0:
                 to_add = diff
                 logs.append(f"+ {to_add} {land_name}")
-                candidates = list(user_cards_collection.find({"user_id": user_id, "name": land_name}))
+                candidates = await async_user_cards_collection.find({"user_id": user_id, "name": land_name}).to_list(None)
                 added_count = 0
                 
                 for cand in candidates:
@@ -499,7 +494,7 @@ async def auto_balance_lands(item_id: str, user_id: str = Depends(get_current_us
                         final_deck_list.extend([fallback_id] * remaining)
                         logs.append(f"  (Alerte : {remaining} ajoutes depuis le stock infini)")
 
-        items_collection.update_one({"_id": ObjectId(item_id)}, {"$set": {"cards": final_deck_list}})
+        await async_items_collection.update_one({"_id": ObjectId(item_id)}, {"$set": {"cards": final_deck_list}})
         return {"message": "Deck equilibre avec succes", "logs": logs, "new_count": len(final_deck_list)}
 
     except Exception as e:
@@ -575,31 +570,42 @@ async def import_deck_from_text(data: dict = Body(...), user_id: str = Depends(g
             ident["name"] = front_face_name
         identifiers.append(ident)
 
-    found_cards = []
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for i in range(0, len(identifiers), 75):
-            chunk = identifiers[i:i+75]
-            try:
-                resp = await client.post("https://api.scryfall.com/cards/collection", json={"identifiers": chunk})
-                if resp.status_code == 200:
-                    found_cards.extend(resp.json().get("data", []))
-            except Exception as e:
-                print(f"Erreur Scryfall Batch Import: {e}")
-
-    for scryfall_card in found_cards:
-        cleaned = extract_card_fields(scryfall_card)
+    # Catalogue local d'abord, Scryfall uniquement pour les cartes inconnues (cartes deja nettoyees)
+    resolved, resolve_stats = await resolve_identifiers(identifiers)
+    found_cards = list({card["id"]: card for card in resolved.values()}.values())
+
+    inserted = False
+    for cleaned in found_cards:
         card_id = cleaned["id"]
-        if not cards_collection.find_one({"id": card_id}):
-            cleaned["owners"] = [] 
-            cards_collection.insert_one(cleaned)
+        if not await async_cards_collection.find_one({"id": card_id}):
+            await async_cards_collection.insert_one(with_content_hash({**cleaned, "owners": []}))
+            inserted = True
+    if inserted:
+        invalidate_matcher()
 
     deck_main_ids = []
     deck_side_ids = []
     missing_cards = []
+
+    # Noms corriges par le matcher approximatif local et suggestions non appliquees
+    corrections = {m["query"].lower(): m["name"] for m in resolve_stats["fuzzy_matches"]}
+    suggestions = {s["query"].lower(): s for s in resolve_stats["low_confidence"]}
+
+    def front_name(name):
+        front = name.split("//")[0].strip().lower()
+        return corrections.get(front, front).split("//")[0].strip().lower()
+
+    def missing_entry(pc, zone):
+        entry = {"name": pc["name"], "qty": pc["qty"], "zone": zone}
+        suggestion = suggestions.get(pc["name"].split("//")[0].strip().lower())
+        if suggestion:
+            entry["suggestion"] = suggestion["name"]
+            entry["confidence"] = suggestion["confidence"]
+        return entry
     
     for pc in parsed_main:
         matched = False
-        pc_front = pc["name"].split("//")[0].strip().lower()
+        pc_front = front_name(pc["name"])
         for scryfall_card in found_cards:
             c_name = scryfall_card["name"].split("//")[0].strip().lower()
             if pc_front in c_name or c_name in pc_front:
@@ -607,11 +613,11 @@ async def import_deck_from_text(data: dict = Body(...), user_id: str = Depends(g
                 matched = True
                 break
         if not matched:
-            missing_cards.append({"name": pc["name"], "qty": pc["qty"], "zone": "Principal"})
+            missing_cards.append(missing_entry(pc, "Principal"))
 
     for pc in parsed_side:
         matched = False
-        pc_front = pc["name"].split("//")[0].strip().lower()
+        pc_front = front_name(pc["name"])
         for scryfall_card in found_cards:
             c_name = scryfall_card["name"].split("//")[0].strip().lower()
             if pc_front in c_name or c_name in pc_front:
@@ -619,16 +625,11 @@ async def import_deck_from_text(data: dict = Body(...), user_id: str = Depends(g
                 matched = True
                 break
         if not matched:
-            missing_cards.append({"name": pc["name"], "qty": pc["qty"], "zone": "Reserve"})
+            missing_cards.append(missing_entry(pc, "Reserve"))
 
     first_image = None
     if found_cards:
-        if "image_uris" in found_cards[0] and "art_crop" in found_cards[0]["image_uris"]:
-            first_image = found_cards[0]["image_uris"]["art_crop"]
-        elif "card_faces" in found_cards[0] and "image_uris" in found_cards[0]["card_faces"][0] and "art_crop" in found_cards[0]["card_faces"][0]["image_uris"]:
-            first_image = found_cards[0]["card_faces"][0]["image_uris"]["art_crop"]
-        elif "image_uris" in found_cards[0] and "normal" in found_cards[0]["image_uris"]:
-            first_image = found_cards[0]["image_uris"]["normal"]
+        first_image = found_cards[0].get("image_art_crop") or found_cards[0].get("image_normal")
 
     new_item = {
         "user_id": user_id, 
@@ -642,12 +643,13 @@ async def import_deck_from_text(data: dict = Body(...), user_id: str = Depends(g
         "is_constructed": False
     }
     
-    result = items_collection.insert_one(new_item)
+    result = await async_items_collection.insert_one(new_item)
     
     return {
         "message": "Deck importe", 
         "id": str(result.inserted_id),
-        "missing_cards": missing_cards
+        "missing_cards": missing_cards,
+        "local_hit_ratio": resolve_stats["local_hit_ratio"]
     }
 
 
@@ -662,7 +664,7 @@ async def toggle_commander(item_id: str, data: dict = Body(...), user_id: str =
     if not card_id:
         raise HTTPException(status_code=400, detail="L'ID de la carte est manquant.")
 
-    deck = items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
+    deck = await async_items_collection.find_one({"_id": ObjectId(item_id), "user_id": user_id})
     if not deck:
         raise HTTPException(status_code=404, detail="Deck introuvable.")
 
@@ -681,7 +683,7 @@ async def toggle_commander(item_id: str, data: dict = Body(...), user_id: str =
             commanders.remove(card_id)
 
     # On sauvegarde la liste mise à jour
-    items_collection.update_one(
+    await async_items_collection.update_one(
         {"_id": ObjectId(item_id)},
         {"$set": {"commanders": commanders}}
     )
@@ -1,14 +1,16 @@
 from fastapi import APIRouter, HTTPException, Body, Depends
 from bson import ObjectId
-from database import tag_rules_collection, user_cards_collection
+from database import async_tag_rules_collection
 from routes.auth_routes import get_current_user
+from utils.tags_engine import invalidate_user_rules
+from utils.retag_jobs import request_retag, get_retag_job, job_progress
 
 router = APIRouter()
 
 @router.get("/rules")
 async def get_tag_rules(user_id: str = Depends(get_current_user)):
     """Recupere toutes les regles de tags automatiques de l'utilisateur."""
-    rules = list(tag_rules_collection.find({"user_id": user_id}))
+    rules = await async_tag_rules_collection.find({"user_id": user_id}).to_list(None)
     for r in rules:
         r["id"] = str(r["_id"])
         del r["_id"]
@@ -33,35 +35,36 @@ async def create_tag_rule(data: dict = Body(...), user_id: str = Depends(get_cur
         "conditions": conditions
     }
 
-    result = tag_rules_collection.insert_one(new_rule)
-    return {"message": "Regle creee avec succes", "id": str(result.inserted_id)}
+    result = await async_tag_rules_collection.insert_one(new_rule)
+    await invalidate_user_rules(user_id)
+
+    # La nouvelle regle s'applique aussi aux cartes deja dans la collection (job de re-tag en arriere-plan)
+    retag = await request_retag(user_id, [new_rule["tag_name"]])
+    return {"message": "Regle creee avec succes", "id": str(result.inserted_id), "retag": retag}
 
 @router.delete("/rules/{rule_id}")
 async def delete_tag_rule(rule_id: str, user_id: str = Depends(get_current_user)):
-    """Supprime une règle ET retire ce tag de toutes les cartes."""
+    """Supprime une règle ET retire ce tag des cartes (sauf celles qu'une autre règle du même tag vise)."""
     if not ObjectId.is_valid(rule_id):
         raise HTTPException(status_code=400, detail="ID de règle invalide.")
 
-    rule = tag_rules_collection.find_one({"_id": ObjectId(rule_id), "user_id": user_id})
+    rule = await async_tag_rules_collection.find_one({"_id": ObjectId(rule_id), "user_id": user_id})
     if not rule:
         raise HTTPException(status_code=404, detail="Règle introuvable.")
         
     tag_name = rule.get("tag_name")
 
-    tag_rules_collection.delete_one({"_id": ObjectId(rule_id)})
+    await async_tag_rules_collection.delete_one({"_id": ObjectId(rule_id)})
+    await invalidate_user_rules(user_id)
     
-    if tag_name:
-        user_cards_collection.update_many(
-            {"user_id": user_id},
-            {"$pull": {"tags": tag_name}}
-        )
+    retag = await request_retag(user_id, [tag_name])
 
-    return {"message": "Règle supprimée et tags nettoyés sur vos cartes."}
+    return {"message": "Règle supprimée, tags nettoyés sur vos cartes en arrière-plan.", "retag": retag}
 
 
 @router.put("/rules/{rule_id}")
 async def update_tag_rule(rule_id: str, data: dict = Body(...), user_id: str = Depends(get_current_user)):
-    """Met à jour une règle existante et nettoie l'ancien tag s'il a été renommé."""
+    """Met à jour une règle existante et la réapplique à la collection (ancien tag nettoyé s'il a été renommé)."""
     if not ObjectId.is_valid(rule_id):
         raise HTTPException(status_code=400, detail="ID de règle invalide.")
 
@@ -73,7 +76,7 @@ async def update_tag_rule(rule_id: str, data: dict = Body(...), user_id: str = D
     if not tag_name or not conditions:
         raise HTTPException(status_code=400, detail="Le nom du tag et les conditions sont requis.")
 
-    old_rule = tag_rules_collection.find_one({"_id": ObjectId(rule_id), "user_id": user_id})
+    old_rule = await async_tag_rules_collection.find_one({"_id": ObjectId(rule_id), "user_id": user_id})
     if not old_rule:
         raise HTTPException(status_code=404, detail="Règle introuvable.")
 
@@ -87,15 +90,17 @@ async def update_tag_rule(rule_id: str, data: dict = Body(...), user_id: str = D
         "conditions": conditions
     }
 
-    tag_rules_collection.update_one(
+    await async_tag_rules_collection.update_one(
         {"_id": ObjectId(rule_id), "user_id": user_id},
         {"$set": updated_rule}
     )
+    await invalidate_user_rules(user_id)
+
+    retag = await request_retag(user_id, [old_tag_name, new_tag_name])
+    return {"message": "Règle mise à jour avec succès", "retag": retag}
 
-    if old_tag_name and old_tag_name != new_tag_name:
-        user_cards_collection.update_many(
-            {"user_id": user_id},
-            {"$pull": {"tags": old_tag_name}}
-        )
 
-    return {"message": "Règle mise à jour avec succès"}
\ No newline at end of file
+@router.get("/retag/progress")
+async def get_retag_progress(user_id: str = Depends(get_current_user)):
+    """Avancement du re-tag de la collection lance par la derniere modification de regle."""
+    return job_progress(await get_retag_job(user_id))
\ No newline at end of file
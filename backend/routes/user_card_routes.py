@@ -1,18 +1,22 @@
 # routes/user_card_routes.py
 from fastapi import APIRouter, HTTPException, Depends, Request, Body, Query
-from database import user_cards_collection, cards_collection, history_collection, tag_rules_collection
+from database import async_user_cards_collection, async_cards_collection, async_history_collection
 from routes.auth_routes import get_current_user
-from models.card import extract_card_fields
+from models.card import extract_card_fields, with_content_hash
 from bson import ObjectId
 from datetime import datetime
-from typing import List, Dict
-from fastapi.responses import PlainTextResponse, Response
-from utils.import_parser import parse_mtg_line
+from typing import Optional
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from bson.errors import InvalidId
-from utils.tags_engine import get_automated_tags
-import httpx
-import asyncio
+from utils.tags_engine import get_automated_tags, load_user_rules
+from utils.import_jobs import create_job, get_user_job, job_progress, job_status, progress_events
+from utils.search_cache import bump_collection_version
+from utils.import_engine import build_user_card_fields
+from utils.deck_allocator import card_allocations
+from utils.fuzzy_matcher import invalidate_matcher
+import codecs
 import logging
+import os
 import csv
 import io
 import json
@@ -22,213 +26,100 @@ router = APIRouter()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("user_card_routes")
 
-import_progress: Dict[str, dict] = {}
-
-async def fetch_scryfall_batch(identifiers: List[dict]):
-    url = "https://api.scryfall.com/cards/collection"
-    found_cards = []
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        chunk_size = 75
-        for i in range(0, len(identifiers), chunk_size):
-            chunk = identifiers[i:i + chunk_size]
-            try:
-                resp = await client.post(url, json={"identifiers": chunk})
-                if resp.status_code == 200:
-                    data = resp.json()
-                    found_cards.extend(data.get("data", []))
-                elif resp.status_code == 404:
-                    # Scryfall renvoie 404 si absolument toutes les cartes du lot sont introuvables
-                    logger.warning("Scryfall 404: Aucune carte de ce lot n'a ete trouvee.")
-                
-                await asyncio.sleep(0.1) 
-            except Exception as e:
-                logger.error(f"Erreur Scryfall Batch: {e}")
-    return found_cards
-
-async def perform_import(data: List, user_id: str):
-    uid = str(user_id)
-    try:
-        import_progress[uid]["status"] = "processing"
-        
-        parsed_entries = []
-        for entry in data:
-            if isinstance(entry, dict):
-                line_to_parse = f"{entry.get('quantity', 1)} {entry.get('name', '')}"
-                parsed = parse_mtg_line(line_to_parse)
-            else:
-                parsed = parse_mtg_line(str(entry))
-            
-            if parsed:
-                parsed_entries.append(parsed)
-
-        total_entries = len(parsed_entries)
-        import_progress[uid]["total"] = total_entries
-
-        identifiers_to_fetch = []
-        quantity_map = {} 
-
-        for p in parsed_entries:
-            is_foil = p.get("is_foil", False)
-            foil_suffix = "_foil" if is_foil else "_normal"
-            
-            if p["set"] and p["collector_number"]:
-                key = f"{p['set']}:{p['collector_number']}{foil_suffix}".lower()
-                identifiers_to_fetch.append({"set": p["set"], "collector_number": p["collector_number"]})
-            else:
-                key = f"{p['name']}{foil_suffix}".lower()
-                identifiers_to_fetch.append({"name": p["name"]})
-            
-            if key in quantity_map:
-                quantity_map[key]["quantity"] += p["qty"]
-            else:
-                quantity_map[key] = {"quantity": p["qty"], "name": p["name"], "is_foil": is_foil}
-            
-        await asyncio.sleep(0.01)
-
-        fetched_cards = []
-        if identifiers_to_fetch:
-            fetched_cards = await fetch_scryfall_batch(identifiers_to_fetch)
-
-        imported_count = 0
-        cards_found = []
-        cards_not_found = []
-        
-        user_rules = list(tag_rules_collection.find({"user_id": uid}))
-        
-        for idx, scryfall_data in enumerate(fetched_cards):
-            if idx % 5 == 0:
-                await asyncio.sleep(0.02)
-
-            cleaned = extract_card_fields(scryfall_data)
-            card_id = cleaned.get("id")
-            
-            auto_tags = get_automated_tags(cleaned, user_rules)
-            
-            set_code = str(scryfall_data.get("set", "")).lower()
-            cn = str(scryfall_data.get("collector_number", "")).lower()
-            name = str(scryfall_data.get("name", "")).lower()
-            
-            if not cards_collection.find_one({"id": card_id}):
-                cleaned["owners"] = [uid]
-                cards_collection.insert_one(cleaned)
-            else:
-                cards_collection.update_one({"id": card_id}, {"$addToSet": {"owners": uid}})
-
-            for is_foil_check in [True, False]:
-                suffix = "_foil" if is_foil_check else "_normal"
-                key_exact = f"{set_code}:{cn}{suffix}"
-                key_name = f"{name}{suffix}"
-                
-                qty = 0
-                display_name = cleaned.get("name")
-                
-                if key_exact in quantity_map:
-                    qty = quantity_map[key_exact]["quantity"]
-                    display_name = quantity_map[key_exact]["name"]
-                    del quantity_map[key_exact]
-                elif key_name in quantity_map:
-                    qty = quantity_map[key_name]["quantity"]
-                    display_name = quantity_map[key_name]["name"]
-                    del quantity_map[key_name]
-                    
-                if qty > 0:
-                    existing = user_cards_collection.find_one({
-                        "user_id": uid, 
-                        "card_id": card_id,
-                        "is_foil": is_foil_check
-                    })
-                    
-                    if existing:
-                        update_doc = {"$inc": {"count": qty}}
-                        if auto_tags:
-                            update_doc["$addToSet"] = {"tags": {"$each": auto_tags}}
-                        user_cards_collection.update_one({"_id": existing["_id"]}, update_doc)
-                    else:
-                        user_cards_collection.insert_one({
-                            "user_id": uid,
-                            "card_id": card_id,
-                            "count": qty,
-                            "is_foil": is_foil_check,
-                            "name": cleaned.get("name"),
-                            "lang": cleaned.get("lang"),
-                            "oracle_id": cleaned.get("oracle_id"),
-                            "set": cleaned.get("set"),
-                            "set_name": cleaned.get("set_name"),
-                            "collector_number": cleaned.get("collector_number"),
-                            "image_normal": cleaned.get("image_normal"),
-                            "image_art_crop": cleaned.get("image_art_crop"),
-                            "image_small": cleaned.get("image_small"),
-                            "rarity": cleaned.get("rarity"),
-                            "colors": cleaned.get("colors", []),
-                            "type_line": cleaned.get("type_line", ""),
-                            "oracle_text": cleaned.get("oracle_text", ""),
-                            "keywords": cleaned.get("keywords", []),
-                            "cmc": cleaned.get("cmc", 0),
-                            "power": cleaned.get("power", ""),
-                            "toughness": cleaned.get("toughness", ""),
-                            "legalities": cleaned.get("legalities", {}),
-                            "prices": cleaned.get("prices", {}),
-                            "purchase_uris": cleaned.get("purchase_uris", {}),
-                            "tags": auto_tags
-                        })
-                    
-                    cards_found.append({
-                        "id": str(card_id),
-                        "name": f"{display_name} (Foil)" if is_foil_check else display_name,
-                        "found": True,
-                        "quantity": qty
-                    })
-                    
-                    imported_count += 1
-            
-            if imported_count % 2 == 0:
-                import_progress[uid].update({"processed": imported_count, "imported": imported_count})
-
-        for key, info in quantity_map.items():
-            is_foil_tag = " (Foil)" if info.get("is_foil") else ""
-            cards_not_found.append({
-                "id": "unknown",
-                "name": f"{info['name']}{is_foil_tag}",
-                "found": False,
-                "quantity": info["quantity"]
-            })
-
-        total_found = len(cards_found)
-        total_missing = len(cards_not_found)
-        
-        status = "success" if total_missing == 0 else "warning" if total_found > 0 else "error"
-
-        history_entry = {
-            "user_id": uid,
-            "type": "IMPORT",
-            "date": datetime.utcnow(),
-            "details": f"Importation terminee : {total_found} cartes trouvees, {total_missing} introuvables.",
-            "status": status,
-            "cards": cards_found + cards_not_found
+# Taille maximale d'un fichier envoye a /usercards/import/upload
+MAX_UPLOAD_BYTES = int(os.getenv("IMPORT_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+async def iter_upload_lines(request: Request):
+    """
+    Lignes du corps de la requete (texte brut ou multipart, champ "file"), decodees au fil
+    de l'eau : le fichier n'est jamais charge en entier en memoire.
+    """
+    content_type = request.headers.get("content-type", "")
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    size = 0
+
+    async def chunks():
+        if content_type.startswith("multipart/form-data"):
+            # Starlette lit le multipart en flux et bascule le fichier sur disque au-dela de 1 Mo
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Champ 'file' manquant.")
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                yield chunk
+            await upload.close()
+        else:
+            async for chunk in request.stream():
+                yield chunk
+
+    pending = ""
+    async for chunk in chunks():
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Fichier trop volumineux.")
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def import_started(job: dict) -> dict:
+    """Reponse des routes d'import ; pour un contenu deja importe, le resultat precedent."""
+    if job.get("duplicate"):
+        return {
+            "message": "Contenu deja importe",
+            "duplicate": True,
+            "total": job.get("total", 0),
+            "job_id": job["_id"],
+            "created_at": job.get("created_at"),
+            "progress": job_progress(job)
         }
-        
-        history_collection.insert_one(history_entry)
-        import_progress[uid].update({"status": "completed", "processed": total_entries, "imported": imported_count})
-
-    except Exception as e:
-        import_progress[uid].update({"status": "error", "error": str(e)})
-        logger.error(f"Crash Import: {e}")
+    return {"message": "Import lance", "total": job["total"], "job_id": job["_id"]}
 
 @router.post("/usercards/import")
-async def start_import(request: Request, user_id: str = Depends(get_current_user)):
+async def start_import(request: Request, force: bool = Query(False), user_id: str = Depends(get_current_user)):
+    """Import d'une liste JSON. force=true rejoue un contenu deja importe au lieu de renvoyer le resultat precedent."""
     try:
         data = await request.json()
-        uid = str(user_id)
-        import_progress[uid] = {"total": len(data), "processed": 0, "imported": 0, "status": "starting"}
-        asyncio.create_task(perform_import(data, uid))
-        return {"message": "Import lance", "total": len(data)}
+        return import_started(await create_job(str(user_id), data, force=force))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/usercards/import/upload")
+async def start_import_upload(request: Request, force: bool = Query(False), user_id: str = Depends(get_current_user)):
+    """
+    Import d'un fichier de collection (.txt/.csv/.dek), en multipart (champ "file") ou en texte brut.
+    Le corps est lu en flux et range par blocs dans la file d'import ; un worker l'importe
+    ensuite bloc par bloc, avec une memoire bornee quelle que soit la taille du fichier.
+    Un fichier deja importe n'est pas rejoue, sauf avec force=true.
+    """
+    return import_started(await create_job(str(user_id), iter_upload_lines(request), force=force))
+
 @router.get("/usercards/import/progress")
-async def get_progress(user_id: str = Depends(get_current_user)):
-    uid = str(user_id)
-    return import_progress.get(uid, {"status": "idle", "processed": 0, "total": 0})
+async def get_progress(job_id: Optional[str] = None, user_id: str = Depends(get_current_user)):
+    """
+    Progression lue dans import_jobs : la reponse est la meme quel que soit le worker interroge.
+    Un import en attente indique sa position dans la file (queue_position).
+    """
+    return await job_status(await get_user_job(str(user_id), job_id))
+
+@router.get("/usercards/import/{job_id}/events")
+async def stream_import_progress(job_id: str, user_id: str = Depends(get_current_user)):
+    """
+    Progression d'un job en Server-Sent Events ("progress" a chaque bloc, puis "summary").
+    La session n'est verifiee qu'une fois, a l'ouverture du flux.
+    """
+    if not await get_user_job(str(user_id), job_id):
+        raise HTTPException(status_code=404, detail="Import introuvable")
+    return StreamingResponse(
+        progress_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.put("/usercards/{card_id}")
 async def update_user_card_count(card_id: str, body: dict = Body(...), user_id: str = Depends(get_current_user)):
@@ -243,21 +134,37 @@ async def update_user_card_count(card_id: str, body: dict = Body(...), user_id:
             query = {"user_id": uid, "card_id": card_id, "is_foil": is_foil}
         
         if int(new_count) <= 0:
-            user_cards_collection.delete_one(query)
+            await async_user_cards_collection.delete_one(query)
+            await bump_collection_version(uid)
             return {"message": "Supprime"}
         
-        res = user_cards_collection.update_one(query, {"$set": {"count": int(new_count)}})
+        res = await async_user_cards_collection.update_one(query, {"$set": {"count": int(new_count)}})
         
         if res.matched_count == 0 and not ObjectId.is_valid(card_id):
-             user_cards_collection.update_one(
+             await async_user_cards_collection.update_one(
                  {"user_id": uid, "card_id": card_id, "is_foil": is_foil}, 
                  {"$set": {"count": int(new_count)}}
              )
+        await bump_collection_version(uid)
              
         return {"message": "OK"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/usercards/{card_id}/allocations")
+async def get_card_allocations(card_id: str, user_id: str = Depends(get_current_user)):
+    """Decks construits qui reservent des exemplaires de la carte (id Scryfall ou _id d'une ligne UserCards)."""
+    uid = str(user_id)
+    if ObjectId.is_valid(card_id):
+        user_card = await async_user_cards_collection.find_one({"user_id": uid, "_id": ObjectId(card_id)}, {"card_id": 1})
+        if user_card:
+            card_id = user_card["card_id"]
+
+    ledger = await card_allocations(uid, [card_id])
+    if card_id not in ledger:
+        raise HTTPException(status_code=404, detail="Carte introuvable dans votre collection.")
+    return ledger[card_id]
+
 @router.post("/usercards")
 async def add_user_card(request: Request, user_id: str = Depends(get_current_user)):
     try:
@@ -271,16 +178,17 @@ async def add_user_card(request: Request, user_id: str = Depends(get_current_use
         
         cleaned = extract_card_fields(data)
 
-        if not cards_collection.find_one({"id": card_id}):
-            cards_collection.insert_one(cleaned)
+        if not await async_cards_collection.find_one({"id": card_id}):
+            await async_cards_collection.insert_one(with_content_hash(cleaned))
+            invalidate_matcher()
             
-        existing = user_cards_collection.find_one({
+        existing = await async_user_cards_collection.find_one({
             "user_id": uid, 
             "card_id": card_id,
             "is_foil": is_foil
         })
         
-        user_rules = list(tag_rules_collection.find({"user_id": uid}))
+        user_rules = await load_user_rules(uid)
         auto_tags = get_automated_tags(cleaned, user_rules)
         print(f"[Tags] Ajout manuel de {cleaned.get('name')} -> Tags trouvés : {auto_tags}")
         
@@ -288,35 +196,17 @@ async def add_user_card(request: Request, user_id: str = Depends(get_current_use
             update_doc = {"$inc": {"count": 1}}
             if auto_tags:
                 update_doc["$addToSet"] = {"tags": {"$each": auto_tags}}
-            user_cards_collection.update_one({"_id": existing["_id"]}, update_doc)
+            await async_user_cards_collection.update_one({"_id": existing["_id"]}, update_doc)
         else:
-            user_cards_collection.insert_one({
+            await async_user_cards_collection.insert_one({
                 "user_id": uid, 
                 "card_id": card_id, 
                 "count": 1,
                 "is_foil": is_foil,
-                "name": cleaned.get("name"), 
-                "lang": cleaned.get("lang"),
-                "oracle_id": cleaned.get("oracle_id"),
-                "set": cleaned.get("set"),
-                "set_name": cleaned.get("set_name"),
-                "collector_number": cleaned.get("collector_number"),
-                "image_normal": cleaned.get("image_normal"),
-                "image_art_crop": cleaned.get("image_art_crop"),
-                "image_small": cleaned.get("image_small"),
-                "rarity": cleaned.get("rarity"),
-                "colors": cleaned.get("colors", []),
-                "type_line": cleaned.get("type_line", ""),
-                "oracle_text": cleaned.get("oracle_text", ""),
-                "keywords": cleaned.get("keywords", []),
-                "cmc": cleaned.get("cmc", 0),
-                "power": cleaned.get("power", ""),
-                "toughness": cleaned.get("toughness", ""),
-                "legalities": cleaned.get("legalities", {}),
-                "prices": cleaned.get("prices", {}),
-                "purchase_uris": cleaned.get("purchase_uris", {}),
+                **build_user_card_fields(cleaned),
                 "tags": auto_tags
             })
+        await bump_collection_version(uid)
         return {"message": "Ajoute"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -325,8 +215,8 @@ async def add_user_card(request: Request, user_id: str = Depends(get_current_use
 async def export_user_collection(format: str = "txt", user_id: str = Depends(get_current_user)):
     try:
         uid = str(user_id)
-        cursor = user_cards_collection.find({"user_id": uid})
-        cards = list(cursor)
+        cursor = async_user_cards_collection.find({"user_id": uid})
+        cards = await cursor.to_list(None)
         
         if not cards:
             raise HTTPException(status_code=404, detail="Votre collection est vide.")
@@ -398,7 +288,7 @@ async def export_user_collection(format: str = "txt", user_id: str = Depends(get
             "status": "success",
             "cards": [] 
         }
-        history_collection.insert_one(history_entry)
+        await async_history_collection.insert_one(history_entry)
 
         return Response(
             content=content,
@@ -415,7 +305,7 @@ async def export_user_collection(format: str = "txt", user_id: str = Depends(get
 
 @router.get("/me/collection/tags")
 async def get_my_collection_tags(user_id: str = Depends(get_current_user)):
-    tags = user_cards_collection.distinct("tags", {"user_id": user_id})
+    tags = await async_user_cards_collection.distinct("tags", {"user_id": user_id})
     clean_tags = [t for t in tags if t]
     return {"tags": sorted(clean_tags)}
 
@@ -434,10 +324,11 @@ async def add_tag_to_card(card_id: str, data: dict = Body(...), user_id: str = D
     else:
         query["card_id"] = card_id
         
-    result = user_cards_collection.update_many(
+    result = await async_user_cards_collection.update_many(
         query,
         {"$addToSet": {"tags": clean_tag}}
     )
+    await bump_collection_version(user_id)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Carte introuvable dans votre collection.")
@@ -455,10 +346,11 @@ async def remove_tag_from_card(card_id: str, tag: str = Query(...), user_id: str
     else:
         query["card_id"] = card_id
     
-    result = user_cards_collection.update_many(
+    result = await async_user_cards_collection.update_many(
         query,
         {"$pull": {"tags": clean_tag}}
     )
+    await bump_collection_version(user_id)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Carte introuvable dans votre collection.")
@@ -492,7 +384,7 @@ async def swap_card_version(old_card_id: str, data: dict = Body(...), user_id: s
         else:
             old_query = {"user_id": uid, "card_id": old_card_id, "is_foil": is_foil}
 
-        old_uc = user_cards_collection.find_one(old_query)
+        old_uc = await async_user_cards_collection.find_one(old_query)
         if not old_uc:
             raise HTTPException(status_code=404, detail="L'ancienne carte n'est pas dans votre collection.")
 
@@ -502,7 +394,7 @@ async def swap_card_version(old_card_id: str, data: dict = Body(...), user_id: s
             tags_to_transfer = []
 
         # 4. Appliquer le moteur de tags automatiques sur la NOUVELLE version
-        user_rules = list(tag_rules_collection.find({"user_id": uid}))
+        user_rules = await load_user_rules(uid)
         
         # CORRECTION MAJEURE ICI :
         # Si la carte vient de la route "prints", elle est déjà "nettoyée" (elle a "image_normal" au lieu de "image_uris").
@@ -520,24 +412,25 @@ async def swap_card_version(old_card_id: str, data: dict = Body(...), user_id: s
         # 5. Decrementer ou supprimer l'ancienne carte
         current_count = old_uc.get("count", 1)
         if current_count <= quantity:
-            user_cards_collection.delete_one(old_query)
+            await async_user_cards_collection.delete_one(old_query)
         else:
-            user_cards_collection.update_one(old_query, {"$inc": {"count": -quantity}})
+            await async_user_cards_collection.update_one(old_query, {"$inc": {"count": -quantity}})
 
         # 6. Assurer que la nouvelle carte existe dans la base globale
         new_card_data.pop("_id", None)
-        if not cards_collection.find_one({"id": new_card_id}):
+        if not await async_cards_collection.find_one({"id": new_card_id}):
             new_card_data["owners"] = [uid]
-            cards_collection.insert_one(cleaned_new_card)
+            await async_cards_collection.insert_one(with_content_hash(cleaned_new_card))
+            invalidate_matcher()
         else:
-            cards_collection.update_one({"id": new_card_id}, {"$addToSet": {"owners": uid}})
+            await async_cards_collection.update_one({"id": new_card_id}, {"$addToSet": {"owners": uid}})
 
         # 7. Ajouter ou mettre a jour la nouvelle version chez l'utilisateur
         new_query = {"user_id": uid, "card_id": new_card_id, "is_foil": is_foil}
-        new_uc = user_cards_collection.find_one(new_query)
+        new_uc = await async_user_cards_collection.find_one(new_query)
 
         if new_uc:
-            user_cards_collection.update_one(new_query, {
+            await async_user_cards_collection.update_one(new_query, {
                 "$inc": {"count": quantity},
                 "$addToSet": {"tags": {"$each": final_tags}}
             })
@@ -548,29 +441,11 @@ async def swap_card_version(old_card_id: str, data: dict = Body(...), user_id: s
                 "card_id": new_card_id,
                 "count": quantity,
                 "is_foil": is_foil,
-                "name": cleaned_new_card.get("name"),
-                "lang": cleaned_new_card.get("lang"),
-                "oracle_id": cleaned_new_card.get("oracle_id"),
-                "set": cleaned_new_card.get("set"),
-                "set_name": cleaned_new_card.get("set_name"),
-                "collector_number": cleaned_new_card.get("collector_number"),
-                "image_normal": cleaned_new_card.get("image_normal"),
-                "image_art_crop": cleaned_new_card.get("image_art_crop"),
-                "image_small": cleaned_new_card.get("image_small"),
-                "rarity": cleaned_new_card.get("rarity"),
-                "colors": cleaned_new_card.get("colors", []),
-                "type_line": cleaned_new_card.get("type_line", ""),
-                "oracle_text": cleaned_new_card.get("oracle_text", ""),
-                "keywords": cleaned_new_card.get("keywords", []),
-                "cmc": cleaned_new_card.get("cmc", 0),
-                "power": cleaned_new_card.get("power", ""),
-                "toughness": cleaned_new_card.get("toughness", ""),
-                "legalities": cleaned_new_card.get("legalities", {}),
-                "prices": cleaned_new_card.get("prices", {}),
-                "purchase_uris": cleaned_new_card.get("purchase_uris", {}),
+                **build_user_card_fields(cleaned_new_card),
                 "tags": final_tags
             }
-            user_cards_collection.insert_one(user_doc)
+            await async_user_cards_collection.insert_one(user_doc)
+        await bump_collection_version(uid)
 
         print(f"[Tags] Swap vers {cleaned_new_card.get('name')} termine avec tags : {final_tags}")
         return {"message": "Echange reussi", "new_card_id": new_card_id}
@@ -9,6 +9,8 @@ os.environ["MONGO_DB_NAME"] = "All_scans_TEST"
 # Important : faire les imports APRES avoir set la variable d'env
 from main import app
 from routes.auth_routes import get_current_user
+from utils.search_cache import search_cache
+from utils.tags_engine import clear_rules_cache
 
 TEST_USER_ID = "test_user_12345"
 
@@ -34,6 +36,13 @@ def client():
     db.UserCards.delete_many({})
     db.Cards.delete_many({})
     db.Users.delete_many({}) # <--- LIGNE AJOUTÉE CRUCIALE
+    db.import_jobs.delete_many({})
+    db.import_job_chunks.delete_many({})
+    db.collection_versions.delete_many({})
+    db.tag_rules.delete_many({})
+    db.retag_jobs.delete_many({})
+    search_cache.clear()
+    clear_rules_cache()
     
     # 3. Override de l'auth par défaut (pour les tests standards)
     def override_get_current_user():
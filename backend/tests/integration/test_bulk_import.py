@@ -0,0 +1,135 @@
+import pytest
+from database import cards_collection, user_cards_collection, history_collection
+from utils import scryfall_client
+import routes.user_card_routes as user_card_routes
+from utils import import_engine, import_jobs
+
+TEST_USER_ID = "test_user_12345"
+
+LOCAL_CARDS = [
+    {"id": "bolt-m10", "name": "Lightning Bolt", "set": "m10", "collector_number": "146", "lang": "en",
+     "colors": ["R"], "type_line": "Instant", "cmc": 1, "owners": ["someone_else"]},
+    {"id": "opt-xln", "name": "Opt", "set": "xln", "collector_number": "65", "lang": "en",
+     "colors": ["U"], "type_line": "Instant", "cmc": 1},
+]
+
+
+@pytest.fixture
+def no_worker(monkeypatch):
+    """Pas de worker embarque : le test traite lui-meme les jobs."""
+    monkeypatch.setenv("IMPORT_WORKER_ENABLED", "0")
+
+
+async def run_job(lines):
+    job = await import_jobs.create_job(TEST_USER_ID, lines)
+    claimed = await import_jobs.claim_job("test-worker")
+    assert claimed["_id"] == job["_id"]
+    await import_jobs.process_job(claimed, "test-worker")
+    return import_jobs.job_progress(await import_jobs.get_user_job(TEST_USER_ID, job["_id"]))
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_upserts(no_worker, client, monkeypatch):
+    """
+    1. Les quantités s'ajoutent aux lignes existantes (index user_card_foil_unique), foil à part.
+    2. Les nouvelles lignes reçoivent les champs de la carte.
+    3. owners est complété sans écraser les propriétaires existants.
+    4. La progression finale couvre toutes les lignes, trouvées ou non.
+    """
+    cards_collection.insert_many([dict(c) for c in LOCAL_CARDS])
+    user_cards_collection.insert_one({"user_id": TEST_USER_ID, "card_id": "bolt-m10", "is_foil": False, "count": 2, "tags": []})
+
+    async def fake_fetch(identifiers):
+        return []
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+    monkeypatch.setattr(import_engine, "IMPORT_WRITE_WINDOW", 1)
+
+    lines = ["3 Lightning Bolt (M10) 146", "1 Lightning Bolt (M10) 146", "1 Lightning Bolt (M10) 146 *F*", "4 Opt", "1 Carte Inexistante Zzz"]
+    progress = await run_job(lines)
+    assert progress["status"] == "completed"
+    assert progress["processed"] == progress["total"] == 5
+    assert progress["imported"] == 3
+
+    rows = {(r["card_id"], r["is_foil"]): r for r in user_cards_collection.find({"user_id": TEST_USER_ID})}
+    assert rows[("bolt-m10", False)]["count"] == 6
+    assert rows[("bolt-m10", True)]["count"] == 1
+    assert rows[("opt-xln", False)]["count"] == 4
+    assert rows[("opt-xln", False)]["name"] == "Opt"
+    assert rows[("opt-xln", False)]["type_line"] == "Instant"
+
+    bolt = cards_collection.find_one({"id": "bolt-m10"})
+    assert set(bolt["owners"]) == {"someone_else", TEST_USER_ID}
+
+    history = history_collection.find_one({"user_id": TEST_USER_ID, "type": "IMPORT"}, sort=[("date", -1)])
+    assert history["status"] == "warning"
+    assert [c["name"] for c in history["cards"] if not c["found"]] == ["Carte Inexistante Zzz"]
+
+
+@pytest.mark.asyncio
+async def test_lines_naming_the_same_card_are_all_imported(no_worker, client, monkeypatch):
+    """
+    Une ligne set/numéro et une ligne par nom pour la même impression, plus un nom de face
+    ("Fire" pour "Fire // Ice") : toutes les quantités sont écrites, rien n'est introuvable.
+    """
+    cards_collection.insert_many([dict(c) for c in LOCAL_CARDS] + [
+        {"id": "fire-ice", "name": "Fire // Ice", "set": "apc", "collector_number": "128", "lang": "en",
+         "card_faces": [{"name": "Fire"}, {"name": "Ice"}]}
+    ])
+
+    async def fake_fetch(identifiers):
+        return []
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+
+    progress = await run_job(["1 Lightning Bolt (M10) 146", "2 Lightning Bolt", "3 Fire"])
+    assert progress["status"] == "completed"
+
+    rows = {r["card_id"]: r["count"] for r in user_cards_collection.find({"user_id": TEST_USER_ID})}
+    assert rows == {"bolt-m10": 3, "fire-ice": 3}
+    history = history_collection.find_one({"user_id": TEST_USER_ID, "type": "IMPORT"}, sort=[("date", -1)])
+    assert history["status"] == "success"
+    assert sorted((c["id"], c["quantity"]) for c in history["cards"]) == [("bolt-m10", 3), ("fire-ice", 3)]
+
+
+def wait_for_import(client):
+    import time
+    for _ in range(200):
+        progress = client.get("/usercards/import/progress").json()
+        if progress["status"] not in ["starting", "processing"]:
+            return progress
+        time.sleep(0.05)
+    raise AssertionError("Import toujours en cours")
+
+
+@pytest.mark.parametrize("mode", ["multipart", "text"])
+def test_upload_import(client, monkeypatch, mode):
+    """Le fichier est envoyé tel quel (multipart ou texte brut) et importé en flux."""
+    cards_collection.insert_many([dict(c) for c in LOCAL_CARDS])
+
+    async def fake_fetch(identifiers):
+        return []
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+
+    content = "﻿2 Lightning Bolt (M10) 146\r\n\r\n4 Opt\n1 Opt\n"
+    if mode == "multipart":
+        res = client.post("/usercards/import/upload", files={"file": ("collection.txt", content.encode("utf-8"), "text/plain")})
+    else:
+        res = client.post("/usercards/import/upload", content=content.encode("utf-8"), headers={"Content-Type": "text/plain"})
+
+    assert res.status_code == 200
+    assert res.json()["total"] == 3
+
+    progress = wait_for_import(client)
+    assert progress["status"] == "completed"
+    assert progress["processed"] == 3
+
+    rows = {r["card_id"]: r["count"] for r in user_cards_collection.find({"user_id": TEST_USER_ID, "is_foil": False})}
+    assert rows == {"bolt-m10": 2, "opt-xln": 5}
+
+
+def test_upload_too_large(client, monkeypatch):
+    monkeypatch.setattr(user_card_routes, "MAX_UPLOAD_BYTES", 10)
+    res = client.post("/usercards/import/upload", content=b"4 Lightning Bolt\n" * 5, headers={"Content-Type": "text/plain"})
+    assert res.status_code == 413
@@ -0,0 +1,128 @@
+import pytest
+from database import cards_collection
+from utils import scryfall_client
+from utils.card_resolver import resolve_identifiers
+
+# Catalogue local (cartes déjà nettoyées)
+LOCAL_CARDS = [
+    {"id": "bolt-lea", "name": "Lightning Bolt", "set": "lea", "collector_number": "161", "lang": "en", "released_at": "1993-08-05"},
+    {"id": "bolt-m10", "name": "Lightning Bolt", "set": "m10", "collector_number": "146", "lang": "en", "released_at": "2009-07-17"},
+    {"id": "fire-ice", "name": "Fire // Ice", "set": "apc", "collector_number": "128", "lang": "en", "released_at": "2001-06-04",
+     "card_faces": [{"name": "Fire"}, {"name": "Ice"}]},
+]
+
+
+@pytest.mark.asyncio
+async def test_local_first_resolution(client, monkeypatch):
+    """
+    1. Les identifiants set/numéro et nom sont résolus depuis Cards, sans réseau.
+    2. Un nom d'une face ("Fire") retrouve la carte double.
+    3. Seule la carte absente du catalogue part chez Scryfall.
+    """
+    cards_collection.insert_many([dict(c) for c in LOCAL_CARDS])
+
+    remote_calls = []
+
+    async def fake_fetch(identifiers):
+        remote_calls.append(identifiers)
+        return [{"id": "opt-xln", "name": "Opt", "set": "xln", "collector_number": "65"}]
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+
+    resolved, stats = await resolve_identifiers([
+        {"set": "lea", "collector_number": "161"},
+        {"name": "lightning bolt"},
+        {"name": "Fire"},
+        {"name": "Opt"},
+        {"name": "Opt"},
+    ])
+
+    # Chaque identifiant est rendu sous sa propre clé ; "lightning bolt" (sans set) -> impression la plus récente
+    assert {key: card["id"] for key, card in resolved.items()} == {
+        "lea:161": "bolt-lea", "lightning bolt|": "bolt-m10", "fire|": "fire-ice", "opt|": "opt-xln"
+    }
+
+    assert remote_calls == [[{"name": "Opt"}]]
+    assert stats["identifiers"] == 4
+    assert stats["local"] == 3
+    assert stats["remote"] == 1
+    assert stats["local_hit_ratio"] == 0.75
+
+
+@pytest.mark.asyncio
+async def test_fuzzy_names_resolved_locally(client, monkeypatch):
+    """
+    Les fautes de frappe sont corrigées par le matcher local sans appel réseau ;
+    les correspondances incertaines sont seulement signalées.
+    """
+    from utils.fuzzy_matcher import invalidate_matcher
+
+    cards_collection.insert_many([dict(c) for c in LOCAL_CARDS])
+    invalidate_matcher()
+
+    remote_calls = []
+
+    async def fake_fetch(identifiers):
+        remote_calls.append(identifiers)
+        return []
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+
+    resolved, stats = await resolve_identifiers([{"name": "Lightnig Bolt"}, {"name": "Lightning"}])
+
+    assert {key: card["id"] for key, card in resolved.items()} == {"lightnig bolt|": "bolt-m10"}
+    assert stats["fuzzy_matches"] == [{"query": "Lightnig Bolt", "name": "Lightning Bolt", "confidence": 0.929}]
+    assert [s["name"] for s in stats["low_confidence"]] == ["Lightning Bolt"]
+    # Seule la correspondance incertaine part encore chez Scryfall
+    # Scryfall est interroge avant toute correction approximative
+    assert remote_calls == [[{"name": "Lightnig Bolt"}, {"name": "Lightning"}]]
+    invalidate_matcher()
+
+
+@pytest.mark.asyncio
+async def test_remote_exact_name_wins_over_fuzzy_local(client, monkeypatch):
+    """Carte absente d'un catalogue local partiel : resolue chez Scryfall, pas remplacee par un nom voisin local."""
+    from utils.fuzzy_matcher import invalidate_matcher
+
+    cards_collection.insert_many([dict(c) for c in LOCAL_CARDS])
+    invalidate_matcher()
+
+    async def fake_fetch(identifiers):
+        return [{"id": "bolt-ice", "name": "Lightning Bolts", "set": "ice", "collector_number": "1"}]
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+
+    resolved, stats = await resolve_identifiers([{"name": "Lightning Bolts"}])
+
+    assert resolved["lightning bolts|"]["id"] == "bolt-ice"
+    assert stats["fuzzy_matches"] == []
+    assert (stats["local"], stats["remote"], stats["not_found"]) == (0, 1, 0)
+    invalidate_matcher()
+
+
+@pytest.mark.asyncio
+async def test_prints_read_only_requested_pairs(client, monkeypatch):
+    """Deux sets et deux numéros demandés : seuls les couples demandés sont lus, pas leur produit croisé."""
+    cards_collection.insert_many([dict(c) for c in LOCAL_CARDS] + [
+        {"id": "lea-146", "name": "Other", "set": "lea", "collector_number": "146"},
+        {"id": "m10-161", "name": "Another", "set": "m10", "collector_number": "161"},
+    ])
+
+    async def fake_fetch(identifiers):
+        return []
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+
+    from utils import card_resolver
+    read = []
+    real_match = card_resolver._match
+
+    def recording_match(wanted, docs):
+        read.extend(d["id"] for d in docs)
+        return real_match(wanted, docs)
+
+    monkeypatch.setattr(card_resolver, "_match", recording_match)
+    resolved, _ = await resolve_identifiers([{"set": "lea", "collector_number": "161"}, {"set": "M10", "collector_number": "146"}])
+
+    assert sorted(read) == ["bolt-lea", "bolt-m10"]
+    assert {key: card["id"] for key, card in resolved.items()} == {"lea:161": "bolt-lea", "m10:146": "bolt-m10"}
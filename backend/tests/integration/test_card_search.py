@@ -0,0 +1,234 @@
+import asyncio
+import pytest
+from database import db, cards_collection, user_cards_collection
+from utils.card_sync import sync_user_cards, resync_all_user_cards
+from utils.import_engine import build_user_card_fields
+from utils.search_cache import bump_collection_version, search_cache
+
+TEST_USER_ID = "test_user_12345"
+
+
+def make_card(i, **fields):
+    card = {
+        "id": f"search-{i}", "name": f"Search Card {i}", "set": "srh", "set_name": "Search Set",
+        "collector_number": str(i), "colors": ["R"] if i % 2 == 0 else ["U"],
+        "type_line": "Creature — Goblin" if i % 2 == 0 else "Instant", "rarity": "common",
+        "cmc": i % 4, "prices": {"eur": float(i)}, "legalities": {"modern": "legal"}
+    }
+    card.update(fields)
+    return card
+
+
+@pytest.fixture
+def collection(client):
+    cards = [make_card(i) for i in range(6)]
+    cards_collection.insert_many([dict(c) for c in cards])
+    user_cards_collection.insert_many([{
+        "user_id": TEST_USER_ID, "card_id": c["id"], "is_foil": False, "count": i + 1, "tags": [],
+        **build_user_card_fields(c)
+    } for i, c in enumerate(cards)])
+    return cards
+
+
+def test_search_reads_denormalized_fields(client, collection):
+    """Filtres, tri et champs renvoyes viennent des lignes UserCards, sans jointure vers Cards."""
+    cards_collection.delete_many({})
+
+    res = client.get("/cards/search", params={"colors": "R", "type_line": "Goblin", "sort_by": "price", "sort_dir": -1})
+    assert res.status_code == 200
+    data = res.json()
+    assert [c["id"] for c in data["cards"]] == ["search-4", "search-2", "search-0"]
+    assert data["cards"][0]["name"] == "Search Card 4"
+    assert data["cards"][0]["prices"]["eur"] == 4.0
+    # Le total compte les cartes filtrees, pas toute la collection
+    assert data["total"] == 3
+
+
+def test_card_changes_are_copied_to_user_cards(client, collection):
+    """Une carte modifiee dans le catalogue est rafraichie dans toutes les collections qui la contiennent."""
+    user_cards_collection.insert_one({"user_id": "other-user", "card_id": "search-1", "is_foil": True, "count": 1, "name": "Search Card 1"})
+
+    updated = make_card(1, name="Renamed Card", prices={"eur": 99.0})
+    cards_collection.update_one({"id": "search-1"}, {"$set": updated})
+    assert sync_user_cards([updated]) == 2
+
+    for row in user_cards_collection.find({"card_id": "search-1"}):
+        assert row["name"] == "Renamed Card"
+        assert row["prices"]["eur"] == 99.0
+
+    res = client.get("/cards/search", params={"sort_by": "price", "sort_dir": -1, "limit": 1})
+    assert res.json()["cards"][0]["name"] == "Renamed Card"
+
+
+def test_resync_backfills_missing_copies(client, collection):
+    """Lignes creees avant la denormalisation : la migration recopie les champs depuis Cards."""
+    user_cards_collection.insert_one({"user_id": TEST_USER_ID, "card_id": "legacy-1", "is_foil": False, "count": 1, "tags": []})
+    cards_collection.insert_one(make_card(7, id="legacy-1", name="Legacy Card", owners=[TEST_USER_ID]))
+
+    resync_all_user_cards(db)
+
+    row = user_cards_collection.find_one({"card_id": "legacy-1"})
+    assert row["name"] == "Legacy Card"
+    assert row["colors"] == ["U"]
+    assert "owners" not in row
+    assert client.get("/cards/search", params={"name": "legacy"}).json()["total"] == 1
+
+
+def test_search_total_is_capped_and_reused_while_scrolling(client, collection, monkeypatch):
+    """
+    1. Au-dela de SEARCH_COUNT_LIMIT, le total est une borne basse signalee comme estimee.
+    2. Les pages suivantes reprennent le total compte a la premiere page.
+    3. Une modification de la collection (version) invalide le total, pages suivantes comprises.
+    """
+    from routes import card_routes
+    monkeypatch.setattr(card_routes, "SEARCH_COUNT_LIMIT", 4)
+
+    first = client.get("/cards/search", params={"limit": 2}).json()
+    assert (first["total"], first["total_estimated"]) == (4, True)
+
+    monkeypatch.setattr(card_routes, "SEARCH_COUNT_LIMIT", 100)
+    second = client.get("/cards/search", params={"limit": 2, "page": 2}).json()
+    assert len(second["cards"]) == 2
+    assert (second["total"], second["total_estimated"]) == (4, True)
+
+    user_cards_collection.insert_one({"user_id": TEST_USER_ID, "card_id": "extra", "is_foil": False, "count": 1, "name": "Extra"})
+    asyncio.run(bump_collection_version(TEST_USER_ID))
+    after_import = client.get("/cards/search", params={"limit": 2, "page": 3}).json()
+    assert (after_import["total"], after_import["total_estimated"]) == (7, False)
+
+
+@pytest.mark.parametrize("sort_by,sort_field", [("name", "name"), ("count", "count"), ("price", "prices.eur"), ("set", "set_name")])
+@pytest.mark.parametrize("sort_dir", [1, -1])
+def test_cursor_walks_every_sort_without_gaps(client, sort_by, sort_field, sort_dir):
+    """Defilement par curseur : chaque carte une seule fois, dans l'ordre du tri, egalites et valeurs nulles comprises."""
+    rows = []
+    for i in range(23):
+        card = make_card(i, name=f"Card {i % 5}", set_name=["Alpha", "Beta", None][i % 3],
+                         prices={"eur": None if i % 4 == 0 else float(i % 6)})
+        rows.append({"user_id": TEST_USER_ID, "card_id": card["id"], "is_foil": False, "count": i % 3 + 1, "tags": [],
+                     **build_user_card_fields(card)})
+    user_cards_collection.insert_many(rows)
+
+    def sort_key(row):
+        value = row
+        for part in sort_field.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        return (value is not None, value if value is not None else 0, row["_id"])
+
+    expected = [str(r["_id"]) for r in sorted(user_cards_collection.find({"user_id": TEST_USER_ID}), key=sort_key, reverse=sort_dir == -1)]
+
+    seen, cursor = [], None
+    while True:
+        params = {"sort_by": sort_by, "sort_dir": sort_dir, "limit": 5}
+        if cursor:
+            params["cursor"] = cursor
+        res = client.get("/cards/search", params=params)
+        assert res.status_code == 200
+        data = res.json()
+        seen += [c["_id"] for c in data["cards"]]
+        assert data["total"] == 23
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == expected
+
+
+def test_cursor_from_another_sort_is_rejected(client, collection):
+    first = client.get("/cards/search", params={"sort_by": "price", "limit": 2}).json()
+    assert client.get("/cards/search", params={"sort_by": "name", "cursor": first["next_cursor"]}).status_code == 400
+    assert client.get("/cards/search", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_repeated_search_is_served_from_cache_until_collection_changes(client, collection):
+    """Meme recherche (ordre des parametres indifferent) : reponse en cache tant que la collection ne change pas."""
+    params = {"colors": "R", "sort_by": "price", "sort_dir": -1}
+    first = client.get("/cards/search", params=params).json()
+    assert search_cache.stats()["misses"] == 1
+
+    # Ecriture directe, sans passer par une route : invisible tant que la version n'a pas bouge
+    user_cards_collection.delete_many({"card_id": "search-4"})
+    again = client.get("/cards/search", params=dict(reversed(list(params.items())))).json()
+    assert again == first
+    assert search_cache.stats()["hits"] == 1
+
+    card_id = first["cards"][0]["_id"]
+    assert client.put(f"/usercards/{card_id}", json={"count": 9}).status_code == 200
+    fresh = client.get("/cards/search", params=params).json()
+    assert [c["id"] for c in fresh["cards"]] == ["search-2", "search-0"]
+
+    stats = client.get("/cards/search/cache-stats").json()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+@pytest.mark.parametrize("action", ["add_tag", "remove_tag", "delete", "swap"])
+def test_mutating_routes_invalidate_cached_searches(client, collection, action):
+    params = {"tags": "combo"} if action == "remove_tag" else {}
+    if action == "remove_tag":
+        user_cards_collection.update_many({"user_id": TEST_USER_ID}, {"$set": {"tags": ["combo"]}})
+    before = client.get("/cards/search", params=params).json()
+
+    if action == "add_tag":
+        res = client.post("/search-1/tags", json={"tag": "combo"})
+    elif action == "remove_tag":
+        res = client.delete("/search-1/tags", params={"tag": "combo"})
+    elif action == "delete":
+        res = client.delete("/cards/search-1", params={"is_foil": False})
+    else:
+        res = client.post("/usercards/search-1/swap", json={"new_card": make_card(9, image_normal="x"), "quantity": 1})
+    assert res.status_code == 200
+
+    after = client.get("/cards/search", params=params).json()
+    assert after != before
+    assert search_cache.stats()["hits"] == 0
+
+
+@pytest.fixture
+def stat_collection(client):
+    specs = [(["R"], "2", "2"), (["R", "G"], "4", "*"), ([], "0", "1"), (["U"], "*", "1+*"), (["G"], "-1", "5"), (["W", "U", "B"], "", "")]
+    rows = []
+    for i, (colors, power, toughness) in enumerate(specs):
+        card = make_card(i, colors=colors, power=power, toughness=toughness)
+        rows.append({"user_id": TEST_USER_ID, "card_id": card["id"], "is_foil": False, "count": 1, "tags": [],
+                     **build_user_card_fields(card)})
+    user_cards_collection.insert_many(rows)
+
+
+@pytest.mark.parametrize("params,expected", [
+    ({"colors": "R"}, [0]),
+    ({"colors": "R,G"}, [1]),
+    ({"colors": "R,G", "color_mode": "subset"}, [0, 1, 4]),
+    ({"colors": "C"}, [2]),
+    ({"colors": "R,X"}, []),
+    ({"colors": "W,U,B,R,G", "color_mode": "subset"}, [0, 1, 3, 4, 5]),
+    ({"power": "2", "power_op": ">="}, [0, 1]),
+    ({"power": "0", "power_op": "<"}, [4]),
+    ({"power": "*"}, [3]),
+    ({"toughness": "1", "toughness_op": "<="}, [2]),
+    ({"toughness": "1+*"}, [3]),
+])
+def test_color_and_stat_filters_use_precomputed_fields(client, stat_collection, params, expected):
+    """Couleurs : masque 5 bits (exact / inclus) ; force et endurance numeriques, ou texte pour "*"."""
+    res = client.get("/cards/search", params={**params, "sort_by": "price"})
+    assert res.status_code == 200
+    assert [c["id"] for c in res.json()["cards"]] == [f"search-{i}" for i in expected]
+
+
+def test_search_field_backfill(client):
+    """Migration 9 : champs calcules sur les cartes existantes, empreinte comprise, puis recopies dans UserCards."""
+    from migrations import migration_009_card_search_fields
+    from models.card import card_content_hash, extract_card_fields
+
+    fresh = extract_card_fields({"id": "old-1", "name": "Old", "colors": ["B"], "color_identity": ["B"], "power": "3", "toughness": "3"})
+    legacy = {k: v for k, v in fresh.items() if k not in ("color_mask", "identity_mask", "power_num", "toughness_num")}
+    legacy["content_hash"] = card_content_hash(legacy)
+    cards_collection.insert_one(dict(legacy))
+    user_cards_collection.insert_one({"user_id": TEST_USER_ID, "card_id": "old-1", "is_foil": False, "count": 1, "colors": ["B"]})
+
+    migration_009_card_search_fields(db)
+
+    card = cards_collection.find_one({"id": "old-1"})
+    assert (card["color_mask"], card["power_num"]) == (4, 3.0)
+    assert card["content_hash"] == card_content_hash(fresh)
+    assert user_cards_collection.find_one({"card_id": "old-1"})["color_mask"] == 4
+    assert client.get("/cards/search", params={"colors": "B"}).json()["total"] == 1
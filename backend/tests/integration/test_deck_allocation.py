@@ -0,0 +1,209 @@
+import asyncio
+from database import items_collection, cards_collection, user_cards_collection
+from routes import item_routes
+
+TEST_USER_ID = "test_user_12345"
+
+
+def own(card_id, name, count, assigned=0, is_foil=False, **fields):
+    user_cards_collection.insert_one({
+        "user_id": TEST_USER_ID, "card_id": card_id, "name": name, "is_foil": is_foil,
+        "count": count, "assigned_count": assigned, "tags": [], **fields
+    })
+
+
+def make_deck(name, cards, sideboard=None, **fields):
+    return str(items_collection.insert_one({
+        "user_id": TEST_USER_ID, "type": "deck", "nom": name, "cards": cards, "sideboard": sideboard or [], **fields
+    }).inserted_id)
+
+
+def row(card_id):
+    return user_cards_collection.find_one({"user_id": TEST_USER_ID, "card_id": card_id})
+
+
+def build(deck_id, constructed=True):
+    return asyncio.run(item_routes.update_item(deck_id, {"is_constructed": constructed}, user_id=TEST_USER_ID))
+
+
+def test_build_and_unbuild_deck(client):
+    """
+    1. Chaque carte prend sur sa ligne, un manque est comble par une autre impression (swap).
+    2. Chaque ligne reservee note la part du deck ; le demontage rend exactement ces lignes.
+    """
+    cards_collection.insert_many([{"id": "bolt-a", "name": "Lightning Bolt"}, {"id": "elf-a", "name": "Llanowar Elves"}])
+    own("bolt-a", "Lightning Bolt", 1)
+    own("bolt-b", "Lightning Bolt", 3, assigned=1)
+    own("elf-a", "Llanowar Elves", 2)
+    deck_id = make_deck("Burn", ["bolt-a", "bolt-a", "bolt-a", "elf-a"], ["elf-a"])
+
+    res = client.put(f"/items/{deck_id}", json={"is_constructed": True})
+    assert res.status_code == 200
+
+    deck = items_collection.find_one({"nom": "Burn"})
+    assert deck["is_constructed"] is True
+    assert "building_until" not in deck
+    assert sorted(deck["cards"]) == ["bolt-a", "bolt-b", "bolt-b", "elf-a"]
+    assert [(row(c)["assigned_count"], row(c)["allocations"]) for c in ["bolt-a", "bolt-b", "elf-a"]] == [
+        (1, [{"deck_id": deck_id, "qty": 1}]), (3, [{"deck_id": deck_id, "qty": 2}]), (2, [{"deck_id": deck_id, "qty": 2}])
+    ]
+
+    assert client.put(f"/items/{deck_id}", json={"is_constructed": False}).status_code == 200
+    assert [(row(c)["assigned_count"], row(c)["allocations"]) for c in ["bolt-a", "bolt-b", "elf-a"]] == [(0, []), (1, []), (0, [])]
+    assert items_collection.find_one({"nom": "Burn"})["is_constructed"] is False
+
+
+def test_shortage_reports_decks_holding_the_card(client):
+    cards_collection.insert_one({"id": "sol-ring", "name": "Sol Ring"})
+    own("sol-ring", "Sol Ring", 1)
+    first = make_deck("Premier", ["sol-ring"])
+    second = make_deck("Second", ["sol-ring", "sol-ring"])
+    build(first)
+
+    res = client.put(f"/items/{second}", json={"is_constructed": True})
+    assert res.status_code == 400
+    assert res.json()["detail"]["missing_cards"] == [
+        {"name": "Sol Ring", "required": 2, "available": 0, "reason": "not_in_collection", "used_in": ["Premier (x1)"]}
+    ]
+    assert row("sol-ring")["assigned_count"] == 1
+    assert "building_until" not in items_collection.find_one({"nom": "Second"})
+
+
+def test_concurrent_builds_cannot_overcommit(client, monkeypatch):
+    """
+    Course : le deck A lit la collection, le deck B se construit avant que A n'ecrive. Les
+    reservations de A sont refusees par leur garde, rien n'est reserve a moitie, et la nouvelle
+    repartition signale le manque.
+    """
+    cards_collection.insert_one({"id": "bolt-a", "name": "Lightning Bolt"})
+    own("bolt-a", "Lightning Bolt", 4)
+    own("bolt-b", "Lightning Bolt", 1)
+    deck_a = make_deck("A", ["bolt-a"] * 3 + ["bolt-b"])
+    deck_b = make_deck("B", ["bolt-a"] * 3)
+
+    original_load = item_routes.load_allocation_rows
+    loads = []
+
+    async def racing_load(uid, card_ids, names):
+        rows = await original_load(uid, card_ids, names)
+        loads.append(len(rows))
+        if len(loads) == 1:
+            await item_routes.update_item(deck_b, {"is_constructed": True}, user_id=TEST_USER_ID)
+        return rows
+
+    monkeypatch.setattr(item_routes, "load_allocation_rows", racing_load)
+    try:
+        build(deck_a)
+        raise AssertionError("le deck A n'aurait pas du etre construit")
+    except item_routes.HTTPException as e:
+        assert e.status_code == 400
+        assert e.detail["missing_cards"][0]["used_in"] == ["B (x3)"]
+
+    assert [row(c)["assigned_count"] for c in ["bolt-a", "bolt-b"]] == [3, 0]
+    assert row("bolt-a")["allocations"] == [{"deck_id": deck_b, "qty": 3}]
+    assert not items_collection.find_one({"nom": "A"}).get("is_constructed")
+    assert items_collection.find_one({"nom": "B"})["is_constructed"] is True
+
+
+def test_deck_already_being_built_is_rejected(client):
+    """Double envoi : le bail de construction pris par la premiere demande bloque la seconde."""
+    from datetime import datetime, timedelta
+    own("bolt-a", "Lightning Bolt", 4)
+    deck_id = make_deck("A", ["bolt-a"], building_until=datetime.utcnow() + timedelta(seconds=30))
+
+    assert client.put(f"/items/{deck_id}", json={"is_constructed": True}).status_code == 409
+    assert row("bolt-a")["assigned_count"] == 0
+
+    # Bail expire : construction interrompue, ses reservations orphelines sont rendues
+    items_collection.update_one({"nom": "A"}, {"$set": {"building_until": datetime.utcnow() - timedelta(seconds=1)}})
+    user_cards_collection.update_one({"card_id": "bolt-a"}, {"$set": {"assigned_count": 1, "allocations": [{"deck_id": deck_id, "qty": 1}]}})
+    assert client.put(f"/items/{deck_id}", json={"is_constructed": True}).status_code == 200
+    assert row("bolt-a")["assigned_count"] == 1
+
+
+def test_build_cannot_slip_into_an_unbuild(client, monkeypatch):
+    """
+    Le demontage prend le bail de construction avant de rendre les cartes et ne repasse le deck
+    a "non construit" qu'ensuite : une construction lancee pendant ce temps ne reserve rien (le
+    deck est encore construit), au lieu de reserver des cartes que le demontage rendrait aussitot.
+    """
+    own("bolt-a", "Lightning Bolt", 4)
+    deck_id = make_deck("A", ["bolt-a"] * 2)
+    build(deck_id)
+
+    original_release = item_routes.release_allocation
+    attempts = []
+
+    async def racing_release(uid, deck):
+        try:
+            await item_routes.update_item(deck_id, {"is_constructed": True}, user_id=TEST_USER_ID)
+        except item_routes.HTTPException as e:
+            attempts.append(e.status_code)
+        return await original_release(uid, deck)
+
+    monkeypatch.setattr(item_routes, "release_allocation", racing_release)
+    build(deck_id, constructed=False)
+
+    assert attempts == [400]
+    deck = items_collection.find_one({"nom": "A"})
+    assert deck["is_constructed"] is False
+    assert "building_until" not in deck
+    assert (row("bolt-a")["assigned_count"], row("bolt-a")["allocations"]) == (0, [])
+
+    # Demontage concurrent (bail encore tenu) : refuse, rien n'est rendu deux fois
+    build(deck_id)
+    from datetime import datetime, timedelta
+    items_collection.update_one({"nom": "A"}, {"$set": {"building_until": datetime.utcnow() + timedelta(seconds=30)}})
+    assert client.put(f"/items/{deck_id}", json={"is_constructed": False}).status_code == 409
+    assert row("bolt-a")["assigned_count"] == 2
+
+
+def test_legacy_deck_unbuild_frees_by_card_id(client):
+    """Deck construit avant le marquage des reservations : rendu carte par carte comme auparavant."""
+    own("bolt-a", "Lightning Bolt", 4, assigned=3)
+    deck_id = make_deck("Ancien", ["bolt-a", "bolt-a"], is_constructed=True)
+
+    assert client.put(f"/items/{deck_id}", json={"is_constructed": False}).status_code == 200
+    assert row("bolt-a")["assigned_count"] == 1
+
+
+def test_allocation_ledger_endpoint(client):
+    """Registre : decks qui reservent la carte, toutes lignes confondues, tenu a jour au demontage et a la suppression."""
+    own("bolt-a", "Lightning Bolt", 4)
+    own("bolt-a", "Lightning Bolt", 1, is_foil=True)
+    burn = make_deck("Burn", ["bolt-a"] * 3)
+    storm = make_deck("Storm", ["bolt-a"])
+    build(burn)
+    build(storm)
+
+    res = client.get("/usercards/bolt-a/allocations")
+    assert res.status_code == 200
+    assert res.json() == {"card_id": "bolt-a", "count": 5, "assigned_count": 4, "available": 1, "decks": [
+        {"deck_id": burn, "nom": "Burn", "qty": 3}, {"deck_id": storm, "nom": "Storm", "qty": 1}
+    ]}
+    row_id = str(row("bolt-a")["_id"])
+    assert client.get(f"/usercards/{row_id}/allocations").json()["assigned_count"] == 4
+    assert client.get("/usercards/unknown/allocations").status_code == 404
+
+    build(burn, constructed=False)
+    assert client.delete(f"/items/{storm}").status_code == 200
+    ledger = client.get("/usercards/bolt-a/allocations").json()
+    assert (ledger["assigned_count"], ledger["decks"]) == (0, [])
+
+
+def test_ledger_backfill_for_decks_built_before_tracking(client):
+    """Migration 12 : decks deja construits inscrits au registre, puis demontes par leurs reservations."""
+    from migrations import migration_012_allocation_ledger
+    from database import db
+    own("bolt-a", "Lightning Bolt", 4, assigned=3)
+    deck_id = make_deck("Ancien", ["bolt-a", "bolt-a"], ["bolt-a"], is_constructed=True)
+
+    migration_012_allocation_ledger(db)
+    migration_012_allocation_ledger(db)
+
+    assert row("bolt-a")["allocations"] == [{"deck_id": deck_id, "qty": 3}]
+    assert items_collection.find_one({"nom": "Ancien"})["tracked_allocations"] is True
+    assert client.get("/usercards/bolt-a/allocations").json()["decks"][0]["nom"] == "Ancien"
+
+    build(deck_id, constructed=False)
+    assert (row("bolt-a")["assigned_count"], row("bolt-a")["allocations"]) == (0, [])
@@ -0,0 +1,313 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime, timedelta
+from database import cards_collection, user_cards_collection, history_collection, import_jobs_collection, import_job_chunks_collection
+from utils import scryfall_client, import_engine, import_jobs
+
+TEST_USER_ID = "test_user_12345"
+
+
+@pytest.fixture
+def no_worker(monkeypatch):
+    """Pas de worker embarque : le test joue lui-meme le role des workers."""
+    monkeypatch.setenv("IMPORT_WORKER_ENABLED", "0")
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    import_jobs_collection.delete_many({})
+    import_job_chunks_collection.delete_many({})
+    cards_collection.insert_many([{
+        "id": f"job-{i}", "name": f"Job Card {i}", "set": "job", "collector_number": str(i), "lang": "en"
+    } for i in range(4)])
+
+    async def fake_fetch(identifiers):
+        return []
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+    monkeypatch.setattr(import_engine, "IMPORT_WRITE_WINDOW", 1)
+
+
+@pytest.mark.asyncio
+async def test_resume_after_worker_crash(no_worker, client, catalog, monkeypatch):
+    """
+    1. Le worker A meurt apres deux blocs (bail non renouvele).
+    2. Le bail expire : le worker B reprend au bloc 2, sans rejouer les blocs deja enregistres.
+    3. Une seule entree d'historique, les blocs sont supprimes a la fin.
+    """
+    job = await import_jobs.create_job(TEST_USER_ID, [f"1 Job Card {i} (JOB) {i}" for i in range(4)])
+    assert job["chunks"] == 4
+
+    real_import_lines = import_jobs.import_lines
+    calls = []
+
+    async def crashing_import_lines(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 3:
+            raise asyncio.CancelledError()  # le processus disparait en plein bloc
+        await real_import_lines(*args, **kwargs)
+
+    monkeypatch.setattr(import_jobs, "import_lines", crashing_import_lines)
+    claimed = await import_jobs.claim_job("worker-a")
+    with pytest.raises(asyncio.CancelledError):
+        await import_jobs.process_job(claimed, "worker-a")
+    monkeypatch.setattr(import_jobs, "import_lines", real_import_lines)
+
+    state = import_jobs_collection.find_one({"_id": job["_id"]})
+    assert state["status"] == "processing"
+    assert state["next_chunk"] == 2
+    assert state["processed"] == 2
+    # Checkpoint : compteurs et point de reprise sur le job, resume de chaque bloc sur le bloc
+    assert "summary" not in state
+    chunks = {c["seq"]: c for c in import_job_chunks_collection.find({"job_id": job["_id"]})}
+    assert [chunks[seq]["summary"]["found"][0][0] for seq in [0, 1]] == ["job-0", "job-1"]
+    assert "summary" not in chunks[2]
+
+    # Bail encore valide : personne ne peut reprendre le job
+    assert await import_jobs.claim_job("worker-b") is None
+
+    import_jobs_collection.update_one({"_id": job["_id"]}, {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    claimed = await import_jobs.claim_job("worker-b")
+    assert claimed["_id"] == job["_id"]
+    assert claimed["attempts"] == 2
+    await import_jobs.process_job(claimed, "worker-b")
+
+    # L'ancien worker ne peut plus ecrire de checkpoint
+    assert not await import_jobs._finish(claimed, "worker-a", {"status": "error"})
+
+    progress = import_jobs.job_progress(import_jobs_collection.find_one({"_id": job["_id"]}))
+    assert progress["status"] == "completed"
+    assert progress["processed"] == progress["total"] == 4
+    assert progress["imported"] == 4
+
+    counts = {r["card_id"]: r["count"] for r in user_cards_collection.find({"user_id": TEST_USER_ID})}
+    assert counts == {f"job-{i}": 1 for i in range(4)}
+    assert history_collection.count_documents({"job_id": job["_id"]}) == 1
+    # Le resume final reprend les blocs traites par le worker A
+    history = history_collection.find_one({"job_id": job["_id"]})
+    assert sorted(c["id"] for c in history["cards"]) == [f"job-{i}" for i in range(4)]
+    assert import_job_chunks_collection.count_documents({"job_id": job["_id"]}) == 0
+
+
+@pytest.mark.asyncio
+async def test_replayed_chunk_does_not_double_counts(no_worker, client, catalog, monkeypatch):
+    """
+    Le worker A meurt apres les ecritures du bloc 1 mais avant son checkpoint : le worker B
+    rejoue le bloc, ses lignes deja incrementees ne le sont pas une seconde fois.
+    """
+    user_cards_collection.insert_one({"user_id": TEST_USER_ID, "card_id": "job-1", "is_foil": False, "count": 5, "tags": []})
+    job = await import_jobs.create_job(TEST_USER_ID, ["2 Job Card 0 (JOB) 0", "3 Job Card 1 (JOB) 1", "1 Job Card 2 (JOB) 2", "1 Job Card 3 (JOB) 3"])
+
+    real_import_lines = import_jobs.import_lines
+    calls = []
+
+    async def crash_after_writes(*args, **kwargs):
+        calls.append(1)
+        await real_import_lines(*args, **kwargs)
+        if len(calls) == 2:
+            raise asyncio.CancelledError()  # le processus disparait avant le checkpoint
+
+    monkeypatch.setattr(import_jobs, "import_lines", crash_after_writes)
+    claimed = await import_jobs.claim_job("worker-a")
+    with pytest.raises(asyncio.CancelledError):
+        await import_jobs.process_job(claimed, "worker-a")
+    monkeypatch.setattr(import_jobs, "import_lines", real_import_lines)
+    assert import_jobs_collection.find_one({"_id": job["_id"]})["next_chunk"] == 1
+
+    import_jobs_collection.update_one({"_id": job["_id"]}, {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    claimed = await import_jobs.claim_job("worker-b")
+    await import_jobs.process_job(claimed, "worker-b")
+
+    assert import_jobs_collection.find_one({"_id": job["_id"]})["status"] == "completed"
+    rows = list(user_cards_collection.find({"user_id": TEST_USER_ID}))
+    assert {r["card_id"]: r["count"] for r in rows} == {"job-0": 2, "job-1": 8, "job-2": 1, "job-3": 1}
+    # Marques de bloc retirees a la fin du job
+    assert not any("import_marks" in r and r["import_marks"] for r in rows)
+
+
+@pytest.mark.asyncio
+async def test_poison_job_is_abandoned(no_worker, client, catalog):
+    job = await import_jobs.create_job(TEST_USER_ID, ["1 Job Card 0 (JOB) 0"])
+    import_jobs_collection.update_one({"_id": job["_id"]}, {"$set": {"attempts": import_jobs.MAX_ATTEMPTS}})
+
+    claimed = await import_jobs.claim_job("worker-a")
+    await import_jobs.process_job(claimed, "worker-a")
+
+    assert import_jobs_collection.find_one({"_id": job["_id"]})["status"] == "error"
+
+
+def test_progress_is_read_from_the_collection(no_worker, client, catalog):
+    """N'importe quelle instance de l'API renvoie la progression du dernier job de l'utilisateur."""
+    assert client.get("/usercards/import/progress").json()["status"] == "idle"
+
+    res = client.post("/usercards/import", json=["1 Job Card 0 (JOB) 0", "2 Job Card 1 (JOB) 1", "  "])
+    job_id = res.json()["job_id"]
+    assert res.json()["total"] == 2
+
+    import_jobs_collection.update_one({"_id": job_id}, {"$set": {"status": "processing", "processed": 1}})
+    progress = client.get("/usercards/import/progress").json()
+    assert progress == {"job_id": job_id, "status": "processing", "total": 2, "processed": 1, "imported": 0, "not_found": 0, "local_hit_ratio": 0.0}
+    assert client.get("/usercards/import/progress", params={"job_id": job_id}).json()["processed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_scheduler_caps(no_worker, client, catalog, monkeypatch):
+    """Au plus MAX_ACTIVE_JOBS imports en cours, et MAX_ACTIVE_JOBS_PER_USER par utilisateur."""
+    monkeypatch.setattr(import_jobs, "MAX_ACTIVE_JOBS", 2)
+    monkeypatch.setattr(import_jobs, "MAX_ACTIVE_JOBS_PER_USER", 1)
+    jobs = {}
+    for name, uid in [("a1", "user-a"), ("a2", "user-a"), ("b1", "user-b"), ("c1", "user-c")]:
+        jobs[name] = await import_jobs.create_job(uid, [f"1 Job Card 0 (JOB) 0 {name}"])
+        await asyncio.sleep(0.002)
+
+    first = await import_jobs.claim_job("worker-1")
+    assert first["_id"] == jobs["a1"]["_id"]
+    # a2 attend la fin de a1 : b1 passe devant
+    assert (await import_jobs.claim_job("worker-2"))["_id"] == jobs["b1"]["_id"]
+    # Deux imports en cours : plus de place pour c1
+    assert await import_jobs.claim_job("worker-3") is None
+
+    await import_jobs.process_job(first, "worker-1")
+    assert (await import_jobs.claim_job("worker-3"))["_id"] == jobs["a2"]["_id"]
+
+
+@pytest.mark.asyncio
+async def test_round_robin_between_users(no_worker, client, catalog, monkeypatch):
+    """
+    Un gros import avance par tranches d'un bloc : apres chaque tranche, son utilisateur repasse
+    derriere les autres avec tous ses imports en attente. Les petits imports passent entre deux tranches.
+    """
+    monkeypatch.setattr(import_jobs, "SLICE_CHUNKS", 1)
+    big = await import_jobs.create_job("user-a", [f"1 Job Card {i} (JOB) {i}" for i in range(3)])
+    await asyncio.sleep(0.002)
+    other = await import_jobs.create_job("user-a", ["1 Job Card 3 (JOB) 3"])
+    await asyncio.sleep(0.002)
+    small = await import_jobs.create_job("user-b", ["1 Job Card 0 (JOB) 0"])
+    names = {big["_id"]: "big", other["_id"]: "other", small["_id"]: "small"}
+
+    # Position dans la file, dans l'ordre de service
+    assert (await import_jobs.job_status(small))["queue_position"] == 3
+
+    order = []
+    while True:
+        await asyncio.sleep(0.002)
+        job = await import_jobs.claim_job("worker-a")
+        if job is None:
+            break
+        order.append(names[job["_id"]])
+        await import_jobs.process_job(job, "worker-a")
+
+    assert order == ["big", "small", "big", "big", "other"]
+    big_state = import_jobs_collection.find_one({"_id": big["_id"]})
+    assert big_state["status"] == "completed"
+    assert big_state["processed"] == 3
+    assert big_state["attempts"] == 1
+    assert history_collection.count_documents({"job_id": big["_id"]}) == 1
+
+
+def test_progress_reports_queue_position(no_worker, client, catalog):
+    client.post("/usercards/import", json=["1 Job Card 0 (JOB) 0"])
+    job_id = client.post("/usercards/import", json=["1 Job Card 1 (JOB) 1"]).json()["job_id"]
+
+    progress = client.get("/usercards/import/progress", params={"job_id": job_id}).json()
+    assert progress["status"] == "queued"
+    assert progress["queue_position"] == 2
+
+
+def test_fingerprint_is_normalised():
+    """Ordre des lignes, casse, espaces et lignes vides ne changent pas l'empreinte ; le contenu, si."""
+    def fingerprint(lines):
+        fp = import_jobs.ImportFingerprint()
+        for line in lines:
+            fp.update(line)
+        return fp.hexdigest()
+
+    reference = fingerprint(["4 Lightning Bolt", "1 Sol Ring (C21) 263"])
+    assert fingerprint(["1 sol ring  (C21) 263", "", "  4 Lightning   Bolt "]) == reference
+    assert fingerprint([{"quantity": 4, "name": "Lightning Bolt"}, "1 Sol Ring (C21) 263"]) == reference
+    assert fingerprint(["3 Lightning Bolt", "1 Sol Ring (C21) 263"]) != reference
+    assert fingerprint(["4 Lightning Bolt", "4 Lightning Bolt", "1 Sol Ring (C21) 263"]) != reference
+
+
+@pytest.mark.asyncio
+async def test_duplicate_import_returns_previous_result(no_worker, client, catalog):
+    """
+    1. Un contenu deja importe est signale sans creer de job : le resultat precedent est renvoye.
+    2. force=true l'importe quand meme.
+    3. L'empreinte est conservee sur le job et dans l'historique.
+    """
+    lines = ["1 Job Card 0 (JOB) 0", "2 Job Card 1 (JOB) 1"]
+    first = client.post("/usercards/import", json=lines).json()
+    await import_jobs.process_job(await import_jobs.claim_job("worker-a"), "worker-a")
+
+    again = client.post("/usercards/import", json=list(reversed(lines))).json()
+    assert again["duplicate"] is True
+    assert again["job_id"] == first["job_id"]
+    assert again["progress"]["status"] == "completed"
+    assert again["progress"]["history_id"]
+    assert import_jobs_collection.count_documents({"user_id": TEST_USER_ID}) == 1
+
+    uploaded = client.post("/usercards/import/upload", content="\n".join(lines).encode(), headers={"Content-Type": "text/plain"}).json()
+    assert uploaded["duplicate"] is True
+    assert import_jobs_collection.count_documents({"user_id": TEST_USER_ID}) == 1
+    assert import_job_chunks_collection.count_documents({}) == 0
+
+    forced = client.post("/usercards/import", json=lines, params={"force": "true"}).json()
+    assert "duplicate" not in forced
+    await import_jobs.process_job(await import_jobs.claim_job("worker-a"), "worker-a")
+
+    counts = {r["card_id"]: r["count"] for r in user_cards_collection.find({"user_id": TEST_USER_ID})}
+    assert counts == {"job-0": 2, "job-1": 4}
+    fingerprint = import_jobs_collection.find_one({"_id": first["job_id"]})["fingerprint"]
+    assert history_collection.find_one({"job_id": first["job_id"]})["fingerprint"] == fingerprint
+
+
+@pytest.mark.asyncio
+async def test_reverted_import_can_be_imported_again(no_worker, client, catalog):
+    lines = ["1 Job Card 2 (JOB) 2"]
+    first = client.post("/usercards/import", json=lines).json()
+    await import_jobs.process_job(await import_jobs.claim_job("worker-a"), "worker-a")
+    history_id = import_jobs_collection.find_one({"_id": first["job_id"]})["history_id"]
+
+    assert client.post(f"/history/{history_id}/revert").status_code == 200
+    again = client.post("/usercards/import", json=lines).json()
+    assert "duplicate" not in again
+    assert again["job_id"] != first["job_id"]
+
+
+def parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_progress_events_stream(client, catalog):
+    """
+    Le flux SSE pousse un evenement par bloc (deltas cumulables) puis un resume final,
+    avec le worker embarque de l'application.
+    """
+    lines = [f"1 Job Card {i} (JOB) {i}" for i in range(4)] + ["1 Carte Inconnue Zzz"]
+    job_id = client.post("/usercards/import", json=lines).json()["job_id"]
+
+    res = client.get(f"/usercards/import/{job_id}/events")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(res.text)
+    progress = [data for name, data in events if name == "progress"]
+    name, summary = events[-1]
+
+    assert name == "summary"
+    assert summary["status"] == "completed"
+    assert summary["processed"] == summary["total"] == 5
+    assert summary["imported"] == 4
+    assert summary["not_found"] == 1
+    assert summary["history_id"]
+    assert sum(p["delta"]["processed"] for p in progress) == 5
+    assert sum(p["delta"]["imported"] for p in progress) == 4
+
+    assert client.get("/usercards/import/inconnu/events").status_code == 404
@@ -0,0 +1,54 @@
+import pytest
+from database import db
+from migrations import run_migrations, check_index_drift, get_applied_versions, MIGRATIONS, MIGRATIONS_COLLECTION
+
+
+def test_migrations_are_idempotent_and_fix_drift(client):
+    """
+    1. Le démarrage de l'app (lifespan) a déjà appliqué toutes les migrations.
+    2. On simule une base "sale" : suivi effacé + index chaud supprimé.
+    3. La dérive est détectée, puis corrigée par un nouveau passage.
+    4. Un troisième passage ne fait plus rien.
+    """
+    run_migrations(db)
+    assert get_applied_versions(db) == {v for v, _, _ in MIGRATIONS}
+
+    # --- Base sale ---
+    db[MIGRATIONS_COLLECTION].delete_many({})
+    db["Users"].drop_index("users_session_token")
+
+    drift = check_index_drift(db)
+    assert {"collection": "Users", "index": "users_session_token", "problem": "missing"} in drift
+
+    # --- Réparation ---
+    applied = run_migrations(db)
+    assert applied == [v for v, _, _ in MIGRATIONS]
+    assert check_index_drift(db) == []
+
+    # --- Idempotence ---
+    assert run_migrations(db) == []
+
+
+def test_migrations_create_their_own_pinned_indexes(client, monkeypatch):
+    """
+    Les migrations ne lisent pas EXPECTED_INDEXES : un index ajoute a la declaration n'est pas
+    cree en rejouant les migrations livrees, il est signale comme derive.
+    Rejouees sur une base vide, elles aboutissent exactement aux index declares.
+    """
+    import migrations
+    from pymongo import ASCENDING, IndexModel
+
+    for collection_name in migrations.EXPECTED_INDEXES:
+        db[collection_name].drop_indexes()
+    db[MIGRATIONS_COLLECTION].delete_many({})
+
+    extra = IndexModel([("rarity", ASCENDING)], name="user_cards_rarity")
+    monkeypatch.setitem(migrations.EXPECTED_INDEXES, "UserCards", migrations.EXPECTED_INDEXES["UserCards"] + [extra])
+    run_migrations(db)
+
+    assert "user_cards_rarity" not in db["UserCards"].index_information()
+    assert check_index_drift(db) == [{"collection": "UserCards", "index": "user_cards_rarity", "problem": "missing"}]
+
+    for collection_name, models in migrations.EXPECTED_INDEXES.items():
+        existing = set(db[collection_name].index_information()) - {"_id_"}
+        assert existing == {m.document["name"] for m in models} - {"user_cards_rarity"}
@@ -0,0 +1,249 @@
+import asyncio
+import pytest
+import random
+from datetime import datetime
+from database import db, user_cards_collection
+from utils import retag_jobs, tags_engine
+from utils.import_engine import build_user_card_fields
+from utils.tags_engine import load_user_rules, condition_to_mongo_filter, rule_to_mongo_filter, evaluate_condition, get_automated_tags
+
+TEST_USER_ID = "test_user_12345"
+
+
+def scryfall_card(i, type_line):
+    return {"id": f"rule-card-{i}", "name": f"Rule Card {i}", "set": "tst", "collector_number": str(i),
+            "type_line": type_line, "colors": ["R"], "cmc": 1, "prices": {"eur": "1.0"}}
+
+
+def tags_of(card_id):
+    return user_cards_collection.find_one({"user_id": TEST_USER_ID, "card_id": card_id})["tags"]
+
+
+def test_compiled_rules_are_reused_until_a_rule_changes(client):
+    """Les regles compilees sont gardees entre deux cartes et recompilees apres chaque modification."""
+    res = client.post("/tags/rules", json={"tag_name": "Burn", "conditions": [{"field": "type_line", "operator": "contains", "value": "instant"}]})
+    rule_id = res.json()["id"]
+
+    client.post("/usercards", json=scryfall_card(1, "Instant"))
+    assert tags_of("rule-card-1") == ["burn"]
+    assert asyncio.run(load_user_rules(TEST_USER_ID)) is asyncio.run(load_user_rules(TEST_USER_ID))
+
+    client.put(f"/tags/rules/{rule_id}", json={"tag_name": "Burn", "conditions": [{"field": "type_line", "operator": "contains", "value": "goblin"}]})
+    client.post("/usercards", json=scryfall_card(2, "Instant"))
+    client.post("/usercards", json=scryfall_card(3, "Creature — Goblin"))
+    assert tags_of("rule-card-2") == []
+    assert tags_of("rule-card-3") == ["burn"]
+
+    client.delete(f"/tags/rules/{rule_id}")
+    client.post("/usercards", json=scryfall_card(4, "Creature — Goblin"))
+    assert tags_of("rule-card-4") == []
+
+
+TEXT_VALUES = ["goblin", "Creature", "", "none", "on", "draw a", "(x)", "Card 1"]
+NUMERIC_VALUES = ["0", "1", "2.5", "-1", "x", "nan", ""]
+FIELD_VALUES = {
+    "type_line": TEXT_VALUES, "oracle_text": TEXT_VALUES, "name": TEXT_VALUES, "set": ["m10", "NEO", "", "none"],
+    "cmc": NUMERIC_VALUES, "power": NUMERIC_VALUES, "toughness": NUMERIC_VALUES, "price": NUMERIC_VALUES + ["12"],
+    "color_exact": ["R", "R,G", "C", "u, b", "", "X"], "color_approx": ["R,G", "W,U,B", "C", "g", "", "R,X"],
+    "unknown": ["x"],
+}
+OPERATORS = ["contains", "not_contains", "equals", "is_empty", "==", ">", "<", "!="]
+
+
+def random_row(rng, i):
+    card = {
+        "id": f"equiv-{i}", "name": rng.choice([f"Card {i}", None, "", "Nonesuch"]),
+        "type_line": rng.choice(["Creature — Goblin", "Instant", "", None, "Legendary Creature (X)"]),
+        "oracle_text": rng.choice(["Draw a card.", "", None, "none"]),
+        "set": rng.choice(["m10", "neo", "", None]),
+        "cmc": rng.choice([0, 1, 2.5, 5, None, ""]),
+        "power": rng.choice(["2", "*", "1+*", "-1", "0", "", None]),
+        "toughness": rng.choice(["1", "3", "*", ""]),
+        "prices": rng.choice([{"eur": 0.5}, {"eur": None, "usd": 12.0}, {}, {"eur": 0.0, "usd": 0.0}, {"eur": 2.5, "usd": 1.0}]),
+        "colors": rng.sample(["W", "U", "B", "R", "G"], rng.randint(0, 3)),
+    }
+    row = {"user_id": TEST_USER_ID, "card_id": card["id"], "is_foil": False, "count": 1, "tags": [], **build_user_card_fields(card)}
+    # Lignes anciennes : certains champs absents (lus comme "" ou 0 par evaluate_condition)
+    for field in rng.sample(["name", "type_line", "oracle_text", "cmc", "power", "prices"], rng.randint(0, 2)):
+        row.pop(field)
+        if field == "power":
+            row["power_num"] = None
+    return row
+
+
+def test_rule_filters_match_python_evaluation(client):
+    """Chaque condition traduite selectionne exactement les lignes que evaluate_condition accepte."""
+    rng = random.Random(7)
+    user_cards_collection.insert_many([random_row(rng, i) for i in range(150)])
+    rows = list(user_cards_collection.find({"user_id": TEST_USER_ID}))
+
+    checked = 0
+    for field, values in FIELD_VALUES.items():
+        for value in values:
+            for operator in OPERATORS:
+                condition = {"field": field, "operator": operator, "value": value}
+                mongo_filter = condition_to_mongo_filter(condition)
+                assert mongo_filter is not None
+                selected = {r["_id"] for r in user_cards_collection.find({"$and": [{"user_id": TEST_USER_ID}, mongo_filter]}, {"_id": 1})}
+                expected = {r["_id"] for r in rows if evaluate_condition(r, condition)}
+                assert selected == expected, condition
+                checked += 1
+
+    # Regles AND / OR : combinaison des filtres de leurs conditions
+    for logic in ["AND", "OR"]:
+        rule = {"logic": logic, "conditions": [{"field": "type_line", "operator": "contains", "value": "creature"},
+                                               {"field": "price", "operator": ">", "value": "1"}]}
+        selected = {r["_id"] for r in user_cards_collection.find({"$and": [{"user_id": TEST_USER_ID}, rule_to_mongo_filter(rule)]}, {"_id": 1})}
+        assert selected == {r["_id"] for r in rows if get_automated_tags(r, [{**rule, "tag_name": "t"}])}
+    assert checked > 500
+
+
+@pytest.fixture
+def retag_queue(monkeypatch):
+    """Pas de worker de re-tag embarque ni de delai de regroupement : le test traite lui-meme les jobs."""
+    monkeypatch.setenv("RETAG_WORKER_ENABLED", "0")
+    monkeypatch.setattr(retag_jobs, "RETAG_DELAY_SECONDS", 0)
+
+
+def run_retag():
+    """Traite le job de re-tag en attente ; renvoie les tags qu'il a couverts (None si rien a faire)."""
+    async def run():
+        job = await retag_jobs.claim_retag_job("test-worker")
+        if job:
+            await retag_jobs.process_retag_job(job, "test-worker")
+        return job and job["tags"]
+    return asyncio.run(run())
+
+
+def test_rule_changes_retag_existing_cards(retag_queue, client):
+    """Creation, modification et suppression d'une regle retaguent la collection existante en arriere-plan."""
+    rows = [random_row(random.Random(i), i) for i in range(3)]
+    for row, type_line in zip(rows, ["Instant", "Creature — Goblin", "Instant"]):
+        row.update(type_line=type_line, tags=["manual"])
+    user_cards_collection.insert_many(rows)
+
+    res = client.post("/tags/rules", json={"tag_name": "Spell", "conditions": [{"field": "type_line", "operator": "contains", "value": "instant"}]})
+    assert res.json()["retag"]["status"] == "queued"
+    assert run_retag() == ["spell"]
+    assert [tags_of(f"equiv-{i}") for i in range(3)] == [["manual", "spell"], ["manual"], ["manual", "spell"]]
+    progress = client.get("/tags/retag/progress").json()
+    assert (progress["status"], progress["processed"], progress["total"], progress["modified"]) == ("completed", 3, 3, 2)
+    assert progress["modes"] == {"spell": "mongo"}
+
+    rule_id = res.json()["id"]
+    client.put(f"/tags/rules/{rule_id}", json={"tag_name": "Spell", "logic": "OR", "conditions": [
+        {"field": "type_line", "operator": "contains", "value": "goblin"},
+        {"field": "date_added", "operator": ">", "value": "2020-01-01"}]})
+    run_retag()
+    # Condition de date : evaluee en Python sur les cartes du catalogue (absentes ici : la ligne sert de carte)
+    mode = "python" if tags_engine.np is None else "vector"
+    assert client.get("/tags/retag/progress").json()["modes"] == {"spell": mode}
+    assert [tags_of(f"equiv-{i}") for i in range(3)] == [["manual"], ["manual", "spell"], ["manual"]]
+
+    client.delete(f"/tags/rules/{rule_id}")
+    run_retag()
+    assert [tags_of(f"equiv-{i}") for i in range(3)] == [["manual"]] * 3
+
+
+def test_rules_without_numpy_fall_back_to_compiled_evaluation(retag_queue, client, monkeypatch):
+    """Sans NumPy, les regles non traduisibles sont evaluees carte par carte, avec le meme resultat."""
+    monkeypatch.setattr(tags_engine, "np", None)
+    rows = [random_row(random.Random(i), i) for i in range(3)]
+    for row, type_line in zip(rows, ["Instant", "Creature — Goblin", "Instant"]):
+        row["type_line"] = type_line
+    user_cards_collection.insert_many(rows)
+
+    client.post("/tags/rules", json={"tag_name": "gob", "logic": "OR", "conditions": [
+        {"field": "type_line", "operator": "contains", "value": "goblin"},
+        {"field": "date_added", "operator": ">", "value": "2020-01-01"}]})
+    run_retag()
+    assert client.get("/tags/retag/progress").json()["modes"] == {"gob": "python"}
+    assert tags_of("equiv-1") == ["gob"]
+
+
+def test_rapid_rule_edits_are_coalesced_into_one_pass(retag_queue, client, monkeypatch):
+    """
+    1. Modifications rapprochees : un seul job, qui couvre tous les tags touches.
+    2. Modification pendant une passe : mise en attente, une seconde passe suit la premiere.
+    3. La collection est parcourue par lots, progression enregistree apres chaque lot.
+    """
+    monkeypatch.setattr(tags_engine, "RETAG_BATCH_SIZE", 2)
+    user_cards_collection.insert_many([random_row(random.Random(i), i) for i in range(5)])
+
+    rule = {"conditions": [{"field": "type_line", "operator": "contains", "value": "e"}]}
+    first = client.post("/tags/rules", json={"tag_name": "a", **rule}).json()["id"]
+    client.post("/tags/rules", json={"tag_name": "b", **rule})
+    client.put(f"/tags/rules/{first}", json={"tag_name": "c", **rule})
+    assert db["retag_jobs"].count_documents({}) == 1
+
+    checkpoints = []
+    original_update = retag_jobs.async_retag_jobs_collection.update_one
+
+    async def spy_update(query, update, *args, **kwargs):
+        if "processed" in update.get("$set", {}):
+            checkpoints.append(update["$set"]["processed"])
+            if len(checkpoints) == 1:
+                # Regle modifiee pendant la passe
+                await retag_jobs.request_retag(TEST_USER_ID, ["d"])
+        return await original_update(query, update, *args, **kwargs)
+
+    monkeypatch.setattr(retag_jobs.async_retag_jobs_collection, "update_one", spy_update)
+    assert run_retag() == ["a", "b", "c"]
+    assert checkpoints[:3] == [2, 4, 5]
+    assert client.get("/tags/retag/progress").json()["status"] == "queued"
+    assert run_retag() == ["d"]
+    assert run_retag() is None
+    assert client.get("/tags/retag/progress").json()["status"] == "completed"
+
+    for row in user_cards_collection.find():
+        assert row["tags"] == (["b", "c"] if evaluate_condition(row, rule["conditions"][0]) else [])
+
+
+def test_failed_retag_keeps_its_tags_and_is_retried(retag_queue, client, monkeypatch):
+    """
+    1. Passe en echec : le job garde ses tags et repart dans la file apres un delai.
+    2. Tentatives epuisees avec des tags arrives pendant la passe : nouvelle passe aussitot.
+    3. Tentatives epuisees sans tag en attente : erreur, tags conserves pour la prochaine demande.
+    """
+    from database import retag_jobs_collection
+    rows = [random_row(random.Random(i), i) for i in range(2)]
+    for row in rows:
+        row["type_line"] = "Instant"
+    user_cards_collection.insert_many(rows)
+
+    real_retag = retag_jobs.retag_collection
+    failures = []
+
+    async def flaky_retag(user_id, tag_names, on_batch=None):
+        if failures:
+            if failures.pop() == "edit":
+                # Regle modifiee pendant la passe
+                retag_jobs_collection.update_one({}, {"$addToSet": {"pending_tags": "other"}})
+            raise RuntimeError("Mongo indisponible")
+        return await real_retag(user_id, tag_names, on_batch)
+
+    monkeypatch.setattr(retag_jobs, "retag_collection", flaky_retag)
+    client.post("/tags/rules", json={"tag_name": "Spell", "conditions": [{"field": "type_line", "operator": "contains", "value": "instant"}]})
+
+    failures.append(1)
+    assert run_retag() == ["spell"]
+    job = retag_jobs_collection.find_one({})
+    assert (job["status"], job["tags"], job["error"]) == ("queued", ["spell"], "Mongo indisponible")
+    assert run_retag() is None  # delai de nouvel essai
+    retag_jobs_collection.update_one({}, {"$set": {"scheduled_at": datetime.utcnow()}})
+    assert run_retag() == ["spell"]
+    assert [tags_of(f"equiv-{i}") for i in range(2)] == [["spell"], ["spell"]]
+    assert client.get("/tags/retag/progress").json()["status"] == "completed"
+
+    retag_jobs_collection.update_one({}, {"$set": {"status": "queued", "scheduled_at": datetime.utcnow(), "tags": ["spell"],
+                                                   "attempts": retag_jobs.MAX_ATTEMPTS - 1}})
+    failures.append("edit")
+    assert run_retag() == ["spell"]
+    job = retag_jobs_collection.find_one({})
+    assert (job["status"], job["attempts"], job["tags"], job["pending_tags"]) == ("queued", 0, ["spell"], ["other"])
+
+    retag_jobs_collection.update_one({}, {"$set": {"attempts": retag_jobs.MAX_ATTEMPTS - 1}})
+    failures.append(1)
+    assert run_retag() == ["spell", "other"]
+    job = retag_jobs_collection.find_one({})
+    assert (job["status"], job["tags"]) == ("error", ["spell", "other"])
@@ -0,0 +1,110 @@
+import pytest
+import time
+import asyncio
+import statistics
+import httpx
+from database import user_cards_collection, cards_collection
+from models.card import color_mask
+from utils import import_jobs
+from utils import scryfall_client
+
+# Configuration
+TEST_USER_ID = "test_user_12345"
+NUM_COLLECTION_CARDS = 2000
+NUM_IMPORT_CARDS = 1500
+SEARCH_PARAMS = {"colors": "R", "type_line": "Goblin", "page": 1, "limit": 50}
+
+
+def generate_fake_scryfall(count, prefix):
+    """Génère de fausses réponses Scryfall (format brut)."""
+    return [{
+        "id": f"{prefix}-{i}",
+        "name": f"{prefix} Card {i}",
+        "set": "tst",
+        "collector_number": str(i),
+        "colors": ["R"] if i % 2 == 0 else ["U"],
+        "type_line": "Creature — Goblin" if i % 2 == 0 else "Instant",
+        "rarity": "common",
+        "cmc": i % 5,
+        "prices": {"eur": "0.10"}
+    } for i in range(count)]
+
+
+async def measure_search(ac, samples):
+    durations = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        res = await ac.get("/cards/search", params=SEARCH_PARAMS)
+        durations.append(time.perf_counter() - start)
+        assert res.status_code == 200
+    return durations
+
+
+@pytest.fixture
+def no_worker(monkeypatch):
+    """Le worker embarque de l'app est remplace par un worker lance dans la boucle du test."""
+    monkeypatch.setenv("IMPORT_WORKER_ENABLED", "0")
+
+
+@pytest.mark.asyncio
+async def test_search_latency_during_import(no_worker, client, monkeypatch):
+    """
+    Benchmark de concurrence :
+    1. On mesure la latence de /cards/search à vide.
+    2. On lance un import de 1500 cartes (Scryfall simulé) en tâche de fond.
+    3. On re-mesure la latence pendant l'import : elle doit rester stable
+       puisque plus aucun appel Mongo ne bloque la boucle d'évènements.
+    """
+    from main import app
+
+    # 1. PEUPLEMENT : cartes globales + collection de l'utilisateur
+    base_cards = generate_fake_scryfall(NUM_COLLECTION_CARDS, "base")
+    cards_collection.insert_many([dict(c) for c in base_cards])
+    user_cards_collection.insert_many([{
+        "user_id": TEST_USER_ID, "card_id": c["id"], "name": c["name"],
+        "colors": c["colors"], "color_mask": color_mask(c["colors"]), "type_line": c["type_line"], "count": 1, "is_foil": False
+    } for c in base_cards])
+
+    # 2. Scryfall simulé : l'import ne dépend que de Mongo
+    import_cards = generate_fake_scryfall(NUM_IMPORT_CARDS, "import")
+
+    async def fake_fetch(identifiers):
+        return import_cards
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        baseline = await measure_search(ac, 10)
+
+        lines = [f"1 import Card {i} (tst) {i}" for i in range(NUM_IMPORT_CARDS)]
+        res = await ac.post("/usercards/import", json=lines)
+        assert res.status_code == 200
+        job_id = res.json()["job_id"]
+
+        # Le worker tourne dans la meme boucle que les requetes de recherche
+        stop = asyncio.Event()
+        worker = asyncio.create_task(import_jobs.run_worker(stop, "bench-worker"))
+
+        during = []
+        while (await ac.get("/usercards/import/progress", params={"job_id": job_id})).json()["status"] in ["queued", "processing"]:
+            during.extend(await measure_search(ac, 1))
+            await asyncio.sleep(0)
+
+        stop.set()
+        import_jobs.wake_worker()
+        await worker
+        final_status = (await ac.get("/usercards/import/progress", params={"job_id": job_id})).json()["status"]
+
+    baseline_median = statistics.median(baseline)
+    print(f"\n   -> Recherche à vide (médiane) : {baseline_median:.4f}s")
+
+    assert final_status == "completed"
+    assert during, "L'import s'est terminé avant la première recherche concurrente"
+
+    during_median = statistics.median(during)
+    print(f"   -> Recherche pendant l'import (médiane, {len(during)} requêtes) : {during_median:.4f}s")
+
+    # La latence peut augmenter légèrement (la base travaille), mais pas de blocage de la boucle
+    assert during_median < baseline_median * 3 + 0.05, \
+        f"ALERTE : la recherche est bloquée par l'import ({during_median:.4f}s vs {baseline_median:.4f}s)"
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from database import AsyncCollection, AsyncCursor, items_collection, cards_collection, user_cards_collection
+from routes import item_routes
+
+TEST_USER_ID = "test_user_12345"
+COMMANDER_SIZE = 100
+# Une carte sur cinq n'est possedee que dans une autre impression (swap a la construction)
+SWAP_EVERY = 5
+
+
+def populate(size, prefix):
+    cards, rows, deck = [], [], []
+    for i in range(size):
+        card_id = f"{prefix}-{i}"
+        name = f"{prefix} Card {i}"
+        cards.append({"id": card_id, "name": name})
+        deck.append(card_id)
+        if i % SWAP_EVERY == 0:
+            rows.append({"user_id": TEST_USER_ID, "card_id": f"{card_id}-alt", "name": name, "is_foil": False, "count": 1, "assigned_count": 0})
+        else:
+            rows.append({"user_id": TEST_USER_ID, "card_id": card_id, "name": name, "is_foil": False, "count": 2, "assigned_count": 0})
+    cards_collection.insert_many(cards)
+    user_cards_collection.insert_many(rows)
+    return str(items_collection.insert_one({"user_id": TEST_USER_ID, "type": "deck", "nom": prefix, "cards": deck, "sideboard": []}).inserted_id)
+
+
+def count_round_trips(monkeypatch):
+    """Compte les allers-retours vers Mongo de la couche asynchrone."""
+    calls = []
+    original_call = AsyncCollection._call
+    original_to_list = AsyncCursor.to_list
+
+    async def counted_call(self, method, *args, **kwargs):
+        calls.append(method)
+        return await original_call(self, method, *args, **kwargs)
+
+    async def counted_to_list(self, length=None):
+        calls.append("find")
+        return await original_to_list(self, length)
+
+    monkeypatch.setattr(AsyncCollection, "_call", counted_call)
+    monkeypatch.setattr(AsyncCursor, "to_list", counted_to_list)
+    return calls
+
+
+def timed_build(deck_id, calls, constructed=True):
+    calls.clear()
+    start = time.perf_counter()
+    asyncio.run(item_routes.update_item(deck_id, {"is_constructed": constructed}, user_id=TEST_USER_ID))
+    return time.perf_counter() - start, len(calls)
+
+
+def test_commander_build_round_trips_do_not_grow_with_deck_size(client, monkeypatch):
+    """
+    Deck Commander de 100 cartes (20 swaps) : construction et demontage en un nombre
+    d'allers-retours fixe, le meme que pour un deck de 10 cartes.
+    """
+    small = populate(10, "small")
+    commander = populate(COMMANDER_SIZE, "cmdr")
+    calls = count_round_trips(monkeypatch)
+
+    _, small_trips = timed_build(small, calls)
+    duration, build_trips = timed_build(commander, calls)
+    unbuild_duration, unbuild_trips = timed_build(commander, calls, constructed=False)
+
+    print(f"\n   -> construction 100 cartes : {duration * 1000:.1f} ms, {build_trips} allers-retours "
+          f"(10 cartes : {small_trips}) ; demontage : {unbuild_duration * 1000:.1f} ms, {unbuild_trips} allers-retours")
+    assert build_trips == small_trips
+    # Lectures item/catalogue/collection, bail, reservations, historique, ecriture du deck
+    assert build_trips <= 10
+    assert unbuild_trips <= 6
+
+    deck = items_collection.find_one({"nom": "cmdr"})
+    assert deck["is_constructed"] is False
+    assert user_cards_collection.count_documents({"user_id": TEST_USER_ID, "assigned_count": {"$ne": 0}, "card_id": {"$regex": "^cmdr"}}) == 0
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import tracemalloc
+import pytest
+from database import cards_collection, user_cards_collection
+from utils import scryfall_client
+from utils import import_jobs
+
+TEST_USER_ID = "test_user_12345"
+DISTINCT_CARDS = 200
+
+
+def write_dump(lines_count):
+    """Fichier de collection : les memes cartes reviennent en boucle (cas d'un export brut)."""
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    with os.fdopen(fd, "w", encoding="utf-8") as fp:
+        for i in range(lines_count):
+            n = i % DISTINCT_CARDS
+            fp.write(f"1 Memory Card {n} (MEM) {n}\n")
+    return path
+
+
+async def measure_peak(lines_count):
+    """Pic memoire de l'import complet : mise en file du fichier lu en flux, puis traitement du job."""
+    user_cards_collection.delete_many({"user_id": TEST_USER_ID})
+    path = write_dump(lines_count)
+
+    # Mise en file : on ne compte que la memoire transitoire (ce qui reste alloue a la fin est
+    # le stockage des blocs, cote serveur avec un vrai MongoDB)
+    tracemalloc.start()
+    with open(path, "r", encoding="utf-8") as fp:
+        job = await import_jobs.create_job(TEST_USER_ID, fp)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    enqueue_peak = peak - current
+
+    tracemalloc.start()
+    # Un gros import est traite en plusieurs tranches (ordonnanceur)
+    while claimed := await import_jobs.claim_job("memory-worker"):
+        await import_jobs.process_job(claimed, "memory-worker")
+    _, process_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    os.remove(path)
+
+    progress = import_jobs.job_progress(await import_jobs.get_user_job(TEST_USER_ID, job["_id"]))
+    assert progress["status"] == "completed"
+    assert progress["processed"] == lines_count
+    return max(enqueue_peak, process_peak)
+
+
+@pytest.fixture
+def no_worker(monkeypatch):
+    monkeypatch.setenv("IMPORT_WORKER_ENABLED", "0")
+
+
+@pytest.mark.asyncio
+async def test_streaming_import_memory_is_bounded(no_worker, client, monkeypatch):
+    """
+    Le pic memoire d'un import en flux depend de la fenetre, pas de la taille du fichier :
+    10x plus de lignes ne doit pas multiplier le pic. (Materialiser 40k lignes analysees,
+    comme l'ancien perform_import, couterait a lui seul plus de 15 Mo.)
+    """
+    cards_collection.insert_many([{
+        "id": f"mem-{i}", "name": f"Memory Card {i}", "set": "mem", "collector_number": str(i), "lang": "en"
+    } for i in range(DISTINCT_CARDS)])
+
+    async def fake_fetch(identifiers):
+        return []
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+
+    await measure_peak(1000)  # echauffement : caches et allocations ponctuelles hors mesure
+    small_peak = await measure_peak(4000)
+    large_peak = await measure_peak(40000)
+    print(f"\n   -> Pic memoire 4k lignes : {small_peak / 1e6:.1f} Mo, 40k lignes : {large_peak / 1e6:.1f} Mo")
+
+    assert user_cards_collection.find_one({"user_id": TEST_USER_ID, "card_id": "mem-0"})["count"] == 40000 // DISTINCT_CARDS
+    assert large_peak < small_peak * 2
+    assert large_peak < 10 * 1024 * 1024
@@ -54,6 +54,72 @@ def test_parsing_performance(raw_text):
     print(f"   -> 1000x '{raw_text}': {duration:.4f}s")
     assert duration < 0.1 # Doit être quasi immédiat
 
+def legacy_parse_mtg_line(line):
+    """Ancien parse_mtg_line : motifs texte recompiles/recherches en cache a chaque appel (référence du benchmark)."""
+    import re
+
+    line = line.strip()
+    if not line:
+        return None
+    is_foil = is_sideboard = is_commander = False
+    if re.match(r"^SB:\s+", line, re.IGNORECASE):
+        is_sideboard = True
+        line = re.sub(r"^SB:\s+", "", line, flags=re.IGNORECASE).strip()
+    elif re.match(r"^CMDR:\s+", line, re.IGNORECASE):
+        is_commander = True
+        line = re.sub(r"^CMDR:\s+", "", line, flags=re.IGNORECASE).strip()
+    line = re.sub(r"\s*\((?:Principal|Mainboard|Sideboard|Reserve|CMDR|Commander)\)$", "", line, flags=re.IGNORECASE).strip()
+    if re.search(r"\*[FE]\*$", line, re.IGNORECASE) or re.search(r"\bFoil\b", line, re.IGNORECASE):
+        is_foil = True
+        line = re.sub(r"\*[FE]\*$", "", line, flags=re.IGNORECASE).strip()
+        line = re.sub(r"\bFoil\b", "", line, flags=re.IGNORECASE).strip()
+    flags = {"is_foil": is_foil, "is_sideboard": is_sideboard, "is_commander": is_commander}
+    match_full = re.match(r"^(\d+)[xX]?\s+(.+?)\s+[\(\[]([a-zA-Z0-9]{2,5})[\)\]](?:\s+(\d+[a-zA-Z]*))?$", line)
+    if match_full:
+        return {"qty": int(match_full.group(1)), "name": match_full.group(2).strip(), "set": match_full.group(3).lower(),
+                "collector_number": match_full.group(4) if match_full.group(4) else None, **flags}
+    match_simple = re.match(r"^(\d+)[xX]?\s+(.+)$", line)
+    if match_simple:
+        return {"qty": int(match_simple.group(1)), "name": match_simple.group(2).strip(), "set": None, "collector_number": None, **flags}
+    return {"qty": 1, "name": line, "set": None, "collector_number": None, **flags}
+
+
+def test_parse_lines_100k():
+    """
+    Micro-benchmark du parsing par lot sur 100 000 lignes d'export typiques
+    (Arena/Moxfield avec set et numéro, quantités simples, foils, sideboard).
+    """
+    from utils.import_parser import parse_lines
+
+    def line(i):
+        kind = i % 20
+        if kind < 10:
+            return f"{i % 4 + 1} Card Name {i} (M{i % 90:02d}) {i % 300}"
+        if kind < 17:
+            return f"{i % 4 + 1}x Card Name {i}"
+        if kind < 19:
+            return f"{i % 4 + 1} Card Name {i} (LEA) {i % 300} *F*"
+        return f"SB: {i % 4 + 1} Card Name {i}"
+
+    lines = [line(i) for i in range(100000)]
+
+    def best_of(func, runs=3):
+        durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = func()
+            durations.append(time.perf_counter() - start)
+        return min(durations), result
+
+    legacy_duration, expected = best_of(lambda: [legacy_parse_mtg_line(raw) for raw in lines])
+    batch_duration, parsed = best_of(lambda: parse_lines(lines))
+
+    print(f"\n   -> 100k lignes, parse_mtg_line d'origine : {legacy_duration:.3f}s")
+    print(f"   -> 100k lignes, parse_lines : {batch_duration:.3f}s (x{legacy_duration / batch_duration:.1f})")
+
+    assert parsed == expected
+    assert batch_duration * 2.5 < legacy_duration
+
 @pytest.mark.asyncio
 async def test_concurrent_batch_performance():
     """Test de charge : 5 requêtes simultanées."""
@@ -73,4 +139,81 @@ async def test_concurrent_batch_performance():
 
     duration = time.time() - start_time
     print(f"   -> Batch 5 cartes: {duration:.4f}s")
-    assert duration < 2.0
\ No newline at end of file
+    assert duration < 2.0
+
+async def legacy_import_writes(fetched_cards, quantities, uid):
+    """Ancienne phase d'écriture de perform_import : 4 à 6 allers-retours par carte (référence du benchmark)."""
+    from database import async_cards_collection, async_user_cards_collection
+
+    for cleaned in fetched_cards:
+        card_id = cleaned["id"]
+        if not await async_cards_collection.find_one({"id": card_id}):
+            await async_cards_collection.insert_one({**cleaned, "owners": [uid]})
+        else:
+            await async_cards_collection.update_one({"id": card_id}, {"$addToSet": {"owners": uid}})
+
+        for is_foil in [True, False]:
+            qty = quantities.get((card_id, is_foil), 0)
+            if qty <= 0:
+                continue
+            query = {"user_id": uid, "card_id": card_id, "is_foil": is_foil}
+            existing = await async_user_cards_collection.find_one(query)
+            if existing:
+                await async_user_cards_collection.update_one({"_id": existing["_id"]}, {"$inc": {"count": qty}})
+            else:
+                await async_user_cards_collection.insert_one({**query, "count": qty, "name": cleaned["name"], "tags": []})
+
+
+@pytest.fixture
+def no_worker(monkeypatch):
+    monkeypatch.setenv("IMPORT_WORKER_ENABLED", "0")
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_10k_cards(no_worker, client, monkeypatch):
+    """
+    Import de 10 000 cartes (catalogue local, sans réseau) :
+    ancienne écriture carte par carte contre écriture groupée par bulk_write.
+    """
+    from database import cards_collection, user_cards_collection
+    from utils import scryfall_client
+    from utils import import_engine, import_jobs
+
+    uid = "test_user_12345"
+    count = 10000
+    catalog = [{
+        "id": f"bulk-{i}", "name": f"Bulk Card {i}", "set": "blk", "collector_number": str(i),
+        "lang": "en", "type_line": "Instant", "colors": ["R"], "cmc": 1
+    } for i in range(count)]
+    cards_collection.insert_many([dict(c) for c in catalog])
+
+    async def fake_fetch(identifiers):
+        return []
+
+    monkeypatch.setattr(scryfall_client, "fetch_collection", fake_fetch)
+    lines = [f"2 Bulk Card {i} (BLK) {i}" + (" *F*" if i % 10 == 0 else "") for i in range(count)]
+
+    # AVANT : une requête par lecture/écriture
+    quantities = {(f"bulk-{i}", i % 10 == 0): 2 for i in range(count)}
+    start = time.perf_counter()
+    await legacy_import_writes(catalog, quantities, uid)
+    legacy_duration = time.perf_counter() - start
+
+    user_cards_collection.delete_many({"user_id": uid})
+    cards_collection.update_many({}, {"$unset": {"owners": ""}})
+
+    # APRES : job d'import complet (mise en file, parsing, résolution, écritures groupées)
+    start = time.perf_counter()
+    job = await import_jobs.create_job(uid, lines)
+    while claimed := await import_jobs.claim_job("bench-worker"):
+        await import_jobs.process_job(claimed, "bench-worker")
+    bulk_duration = time.perf_counter() - start
+    progress = import_jobs.job_progress(await import_jobs.get_user_job(uid, job["_id"]))
+
+    print(f"\n   -> {count} cartes, écriture carte par carte : {legacy_duration:.2f}s")
+    print(f"   -> {count} cartes, bulk_write par fenêtres de {import_engine.IMPORT_WRITE_WINDOW} : {bulk_duration:.2f}s")
+
+    assert progress["status"] == "completed"
+    assert progress["imported"] == count
+    assert user_cards_collection.count_documents({"user_id": uid}) == count
+    assert bulk_duration < legacy_duration
@@ -1,6 +1,7 @@
 import pytest
 import time
 from database import user_cards_collection
+from models.card import color_mask
 from bson import ObjectId
 
 # Configuration
@@ -19,6 +20,7 @@ def generate_fake_cards(count):
             "card_id": f"fake-card-{i}",
             "name": f"Card Number {i}",
             "colors": color,
+            "color_mask": color_mask(color),
             "type_line": type_line,
             "rarity": "common",
             "cmc": i % 5,
@@ -70,4 +72,65 @@ def test_search_speed_large_collection(client):
 
     # 4. ASSERTION DE PERFORMANCE
     assert duration < MAX_ALLOWED_TIME_SECONDS, \
-        f"ALERTE : La recherche est trop lente ! ({duration:.4f}s > {MAX_ALLOWED_TIME_SECONDS}s)"
\ No newline at end of file
+        f"ALERTE : La recherche est trop lente ! ({duration:.4f}s > {MAX_ALLOWED_TIME_SECONDS}s)"
+
+NUM_PAGINATION_CARDS = 20000
+PAGE_SIZE = 60
+BENCH_PAGES = [1, 10, 100, 300]
+
+
+def legacy_search_page(query, page):
+    """Ancienne page de /cards/search : tout le resultat filtre traverse le $facet, a chaque page."""
+    return list(user_cards_collection.aggregate([
+        {"$match": query},
+        {"$sort": {"name": 1}},
+        {"$facet": {
+            "metadata": [{"$count": "total"}],
+            "data": [{"$skip": (page - 1) * PAGE_SIZE}, {"$limit": PAGE_SIZE}]
+        }}
+    ]))
+
+
+def search_page(query, page):
+    """Page seule (tri + limite sur l'index) et total compte a part, comme /cards/search."""
+    data = list(user_cards_collection.aggregate([
+        {"$match": query},
+        {"$sort": {"name": 1}},
+        {"$skip": (page - 1) * PAGE_SIZE},
+        {"$limit": PAGE_SIZE}
+    ]))
+    return data, user_cards_collection.count_documents(query, limit=10000)
+
+
+def test_pagination_does_not_materialise_collection(client):
+    """
+    Benchmark de pagination sur 20 000 cartes :
+    1. Chaque page ne lit que skip + limit entrées de l'index (user_id, name), sans tri en mémoire.
+    2. L'ancien $facet relisait toute la collection filtrée à chaque page.
+    """
+    user_cards_collection.insert_many([{
+        "user_id": "test_user_12345", "card_id": f"page-card-{i}", "name": f"Card {i:05d}",
+        "count": 1, "is_foil": False, "tags": []
+    } for i in range(NUM_PAGINATION_CARDS)])
+    query = {"user_id": "test_user_12345"}
+
+    legacy_durations, durations = [], []
+    for page in BENCH_PAGES:
+        start = time.perf_counter()
+        legacy_search_page(query, page)
+        legacy_durations.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        data, total = search_page(query, page)
+        durations.append(time.perf_counter() - start)
+
+        assert total == 10000
+        assert data[0]["name"] == f"Card {(page - 1) * PAGE_SIZE:05d}"
+
+        skip = (page - 1) * PAGE_SIZE
+        stats = user_cards_collection.find(query).sort("name", 1).skip(skip).limit(PAGE_SIZE).explain()["executionStats"]
+        assert stats["totalDocsExamined"] <= skip + PAGE_SIZE
+
+    print(f"\n   -> Pages {BENCH_PAGES}, $facet : {sum(legacy_durations):.4f}s")
+    print(f"   -> Pages {BENCH_PAGES}, page + comptage : {sum(durations):.4f}s")
+    assert sum(durations) < sum(legacy_durations)
@@ -0,0 +1,99 @@
+import random
+import time
+import pytest
+from utils.tags_engine import CollectionSnapshot, CompiledRuleSet, get_automated_tags
+
+NUM_RULES = 50
+NUM_CARDS = 100_000
+
+
+def generate_rules(rng):
+    """Regles variees : texte, nombres, couleurs, dates ; logique AND / OR."""
+    templates = [
+        ("type_line", "contains", ["creature", "instant", "goblin", "legendary"]),
+        ("oracle_text", "contains", ["draw", "damage", "counter"]),
+        ("name", "not_contains", ["bolt", "elf"]),
+        ("set", "equals", ["neo", "m10", "dmu"]),
+        ("cmc", ">", ["2", "4"]),
+        ("cmc", "==", ["1", "3"]),
+        ("power", "<", ["2", "5"]),
+        ("price", ">", ["1", "20"]),
+        ("color_exact", "==", ["R", "U,B", "C"]),
+        ("color_approx", "==", ["R,G", "W,U,B"]),
+        ("date_added", ">", ["2020-01-01", "2022-06-15"]),
+        ("date_added", "<", ["2015-01-01"]),
+    ]
+    rules = []
+    for i in range(NUM_RULES):
+        conditions = []
+        for field, operator, values in rng.sample(templates, rng.randint(1, 3)):
+            conditions.append({"field": field, "operator": operator, "value": rng.choice(values)})
+        rules.append({"tag_name": f"tag-{i % 40}", "logic": rng.choice(["AND", "OR"]), "conditions": conditions})
+    return rules
+
+
+def generate_cards(rng):
+    dates = [f"{y}-{m:02d}-15" for y in range(2005, 2025) for m in (1, 6)]
+    return [{
+        "name": f"Card {i}",
+        "type_line": rng.choice(["Creature — Goblin", "Instant", "Legendary Creature — Elf", "Sorcery", "Artifact"]),
+        "oracle_text": rng.choice(["Draw a card.", "Deal 3 damage to any target.", "Counter target spell.", ""]),
+        "set": rng.choice(["neo", "m10", "dmu", "lea"]),
+        "cmc": rng.randint(0, 7),
+        "power": rng.choice(["1", "2", "4", "*", ""]),
+        "prices": {"eur": rng.choice([0.1, 2.5, 30.0, None])},
+        "colors": rng.sample(["W", "U", "B", "R", "G"], rng.randint(0, 2)),
+        "released_at": rng.choice(dates),
+    } for i in range(NUM_CARDS)]
+
+
+def test_compiled_rules_50_rules_100k_cards():
+    """
+    50 regles x 100 000 cartes : les regles compilees donnent exactement les memes tags
+    que l'interpretation condition par condition, au moins deux fois plus vite.
+    """
+    rng = random.Random(42)
+    rules = generate_rules(rng)
+    cards = generate_cards(rng)
+
+    start = time.perf_counter()
+    interpreted = [get_automated_tags(card, rules) for card in cards]
+    interpreted_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled_rules = CompiledRuleSet(rules)
+    compiled = [compiled_rules.tags_for(card) for card in cards]
+    compiled_duration = time.perf_counter() - start
+
+    print(f"\n   -> interprete : {interpreted_duration:.2f}s, compile : {compiled_duration:.2f}s "
+          f"(x{interpreted_duration / compiled_duration:.1f})")
+    assert compiled == interpreted
+    assert compiled_duration * 2 < interpreted_duration
+
+
+def test_vectorized_rules_50_rules_100k_cards():
+    """
+    Meme charge, evaluee en colonnes : l'instantane est construit une fois pour les 50 regles.
+    Les cartes retenues par tag sont les memes que carte par carte.
+    """
+    pytest.importorskip("numpy")
+    rng = random.Random(42)
+    rules = generate_rules(rng)
+    cards = generate_cards(rng)
+
+    start = time.perf_counter()
+    compiled_rules = CompiledRuleSet(rules)
+    compiled = [compiled_rules.tags_for(card) for card in cards]
+    compiled_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshot = CollectionSnapshot(cards)
+    build_duration = time.perf_counter() - start
+    masks = snapshot.tag_masks(rules)
+    vector_duration = time.perf_counter() - start
+
+    print(f"\n   -> compile : {compiled_duration:.2f}s, vectorise : {vector_duration:.2f}s "
+          f"(dont instantane {build_duration:.2f}s)")
+    for tag_name, mask in masks.items():
+        assert [i for i, tags in enumerate(compiled) if tag_name in tags] == mask.nonzero()[0].tolist()
+    assert vector_duration * 3 < compiled_duration
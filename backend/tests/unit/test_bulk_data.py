@@ -0,0 +1,36 @@
+import io
+import json
+import pytest
+from utils.bulk_data import iter_json_array
+
+CARDS = [
+    {"id": "a1", "name": "Fire // Ice", "cmc": 4, "prices": {"eur": "0.25"}},
+    {"id": "b2", "name": "Sol Ring", "oracle_text": "{T}: Add {C}{C}.", "keywords": []},
+    {"id": "c3", "name": "Jötun Grunt", "card_faces": [{"name": "x"}, {"name": "y"}]},
+]
+
+
+class TestBulkData:
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+    def test_objects_split_across_chunks(self, chunk_size):
+        """Les objets coupés entre deux lectures doivent être reconstitués."""
+        fp = io.StringIO(json.dumps(CARDS, indent=2, ensure_ascii=False))
+        assert list(iter_json_array(fp, chunk_size=chunk_size)) == CARDS
+
+    def test_scryfall_line_format(self):
+        """Format des fichiers Scryfall : un objet par ligne."""
+        text = "[\n" + ",\n".join(json.dumps(c) for c in CARDS) + "\n]\n"
+        assert list(iter_json_array(io.StringIO(text), chunk_size=16)) == CARDS
+
+    def test_empty_array(self):
+        assert list(iter_json_array(io.StringIO("  [ ]  "))) == []
+
+    def test_truncated_file_raises(self):
+        fp = io.StringIO(json.dumps(CARDS)[:-20])
+        with pytest.raises(ValueError):
+            list(iter_json_array(fp, chunk_size=8))
+
+    def test_not_an_array_raises(self):
+        with pytest.raises(ValueError):
+            list(iter_json_array(io.StringIO('{"id": "a1"}')))
@@ -0,0 +1,30 @@
+from collections import Counter
+from utils.deck_allocator import plan_allocation
+
+
+def row(row_id, card_id, name, count, assigned=0):
+    return {"_id": row_id, "card_id": card_id, "name": name, "count": count, "assigned_count": assigned}
+
+
+def test_each_card_takes_its_own_row_first():
+    """L'impression B sert d'abord au deck pour elle-meme, seul son reste comble le manque de A."""
+    rows = [row(1, "bolt-a", "Bolt", 1), row(2, "bolt-b", "Bolt", 3)]
+    plan = plan_allocation(Counter({"bolt-a": 2, "bolt-b": 2}), rows, {})
+
+    assert plan["missing"] == []
+    assert sorted((l["_id"], l["qty"]) for l in plan["locks"]) == [(1, 1), (2, 1), (2, 2)]
+    assert plan["swaps"] == [{"old_id": "bolt-a", "qty_to_swap": 1, "new_cards": [{"_id": 2, "id": "bolt-b", "name": "Bolt", "qty": 1}]}]
+
+
+def test_an_alternative_is_never_promised_twice():
+    """Deux impressions en manque ne se partagent pas les memes exemplaires d'une troisieme."""
+    rows = [row(1, "bolt-a", "Bolt", 0), row(2, "bolt-b", "Bolt", 0), row(3, "bolt-c", "Bolt", 2, assigned=1)]
+    plan = plan_allocation(Counter({"bolt-a": 1, "bolt-b": 1}), rows, {})
+
+    assert [l["_id"] for l in plan["locks"]] == [3]
+    assert plan["missing"] == [{"id": "bolt-b", "name": "Bolt", "required": 1, "available": 0}]
+
+
+def test_unknown_card_uses_catalog_name():
+    plan = plan_allocation(Counter({"ring": 1}), [], {"ring": {"id": "ring", "name": "Sol Ring"}})
+    assert plan["missing"] == [{"id": "ring", "name": "Sol Ring", "required": 1, "available": 0}]
@@ -1,5 +1,5 @@
 import pytest
-from models.card import extract_card_fields
+from models.card import extract_card_fields, card_content_hash, with_content_hash, color_mask, stat_number
 
 # Données simulées (Mock) d'une réponse Scryfall brute
 SCRYFALL_MOCK_DATA = {
@@ -71,4 +71,50 @@ class TestExtraction:
         result = extract_card_fields(broken_data)
         
         # Doit ne pas planter et mettre None ou une string vide
-        assert result.get("image_normal") is None
\ No newline at end of file
+        assert result.get("image_normal") is None
+
+    def test_content_hash_is_stable(self):
+        """Le hash ne dépend ni de l'ordre des clés ni des champs internes (owners)"""
+        result = extract_card_fields(SCRYFALL_MOCK_DATA)
+        reordered = dict(reversed(list(result.items())))
+        reordered["owners"] = ["user-1"]
+
+        assert card_content_hash(result) == card_content_hash(reordered)
+
+    def test_content_hash_detects_price_change(self):
+        """Une variation de prix doit changer le hash (sinon la synchro l'ignorerait)"""
+        before = extract_card_fields(SCRYFALL_MOCK_DATA)
+        after = extract_card_fields({**SCRYFALL_MOCK_DATA, "prices": {"eur": "9999.99"}})
+
+        assert card_content_hash(before) != card_content_hash(after)
+
+    def test_content_hash_recomputed_on_write(self):
+        """Une carte rafraichie hors synchro repart avec le hash de son nouveau contenu, pas l'ancien"""
+        stale = with_content_hash(extract_card_fields(SCRYFALL_MOCK_DATA))["content_hash"]
+        refreshed = with_content_hash({**extract_card_fields({**SCRYFALL_MOCK_DATA, "prices": {"eur": "9999.99"}}), "content_hash": stale})
+
+        assert refreshed["content_hash"] != stale
+        assert refreshed["content_hash"] == card_content_hash(refreshed)
+
+    def test_color_masks_and_numeric_stats(self):
+        """Masques 5 bits (W=1, U=2, B=4, R=8, G=16) et force/endurance numeriques"""
+        result = extract_card_fields({**SCRYFALL_MOCK_DATA, "colors": ["R", "G"], "color_identity": ["W", "R", "G"],
+                                      "power": "3", "toughness": "1+*"})
+
+        assert result["color_mask"] == 24
+        assert result["identity_mask"] == 25
+        assert result["power_num"] == 3.0
+        assert result["toughness_num"] is None
+        # Incolore : masque nul, pas de force
+        lotus = extract_card_fields(SCRYFALL_MOCK_DATA)
+        assert (lotus["color_mask"], lotus["power_num"]) == (0, None)
+
+    @pytest.mark.parametrize("value,expected", [("0", 0.0), ("-1", -1.0), ("2.5", 2.5), ("*", None), ("?", None),
+                                                ("∞", None), ("inf", None), ("", None), (None, None)])
+    def test_stat_number(self, value, expected):
+        assert stat_number(value) == expected
+
+    def test_unknown_colors_are_ignored(self):
+        assert color_mask(["W", "U", "B", "R", "G"]) == 31
+        assert color_mask(["X", "U"]) == 2
+        assert color_mask(None) == 0
@@ -0,0 +1,60 @@
+import random
+import time
+from utils.fuzzy_matcher import FuzzyMatcher, normalize_name, levenshtein, ACCEPT_THRESHOLD, SUGGEST_THRESHOLD
+
+NAMES = ["Lightning Bolt", "Black Lotus", "Sheoldred, the Apocalypse", "Counterspell", "Fire // Ice", "Jötun Grunt"]
+FACES = {"Fire // Ice": ["Fire", "Ice"]}
+
+
+class TestFuzzyMatcher:
+
+    def setup_method(self):
+        self.matcher = FuzzyMatcher(NAMES, FACES)
+
+    def test_normalize_name(self):
+        assert normalize_name("Fire/Ice") == normalize_name("Fire // Ice") == "fire // ice"
+        assert normalize_name("Sheoldred the Apocalypse") == normalize_name("Sheoldred, the Apocalypse")
+        assert normalize_name("Jotun Grunt") == normalize_name("Jötun Grunt")
+
+    def test_levenshtein_cutoff(self):
+        assert levenshtein("kitten", "sitting") == 3
+        assert levenshtein("kitten", "sitting", max_dist=1) == 2
+
+    def test_exact_and_formatting_variants(self):
+        """Ponctuation, accents et format des cartes scindées : correspondance exacte."""
+        assert self.matcher.match("Fire/Ice") == ("Fire // Ice", 1.0)
+        assert self.matcher.match("sheoldred the apocalypse") == ("Sheoldred, the Apocalypse", 1.0)
+        assert self.matcher.match("Jotun Grunt") == ("Jötun Grunt", 1.0)
+
+    def test_face_name_returns_full_card(self):
+        assert self.matcher.match("Ice") == ("Fire // Ice", 1.0)
+
+    def test_typos_accepted(self):
+        for query, expected in [("Lightnig Bolt", "Lightning Bolt"), ("Blak Lotus", "Black Lotus"), ("Counterspel", "Counterspell")]:
+            name, confidence = self.matcher.match(query)
+            assert name == expected
+            assert confidence >= ACCEPT_THRESHOLD
+
+    def test_low_confidence_and_no_match(self):
+        """Un nom partiel reste une simple suggestion ; un nom sans rapport ne renvoie rien."""
+        name, confidence = self.matcher.match("Lightning")
+        assert name == "Lightning Bolt"
+        assert SUGGEST_THRESHOLD <= confidence < ACCEPT_THRESHOLD
+        assert self.matcher.match("Xyzzy Foo") is None
+
+    def test_throughput_on_large_catalog(self):
+        """Plusieurs milliers de lignes par seconde sur un catalogue de taille réelle (~30k noms)."""
+        rng = random.Random(42)
+        syllables = ["ka", "ra", "tho", "mel", "dor", "an", "gri", "vel", "sha", "tor", "lin", "eth", "um", "bra", "zed"]
+        word = lambda: "".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))).capitalize()
+        names = NAMES + [" ".join(word() for _ in range(rng.randint(1, 3))) for _ in range(30000)]
+        matcher = FuzzyMatcher(names, FACES)
+
+        queries = ["Lightnig Bolt", "Blak Lotus", "Sheoldred teh Apocalypse", "Counterspel", "Lightning Bolt"] * 400
+        start = time.perf_counter()
+        results = [matcher.match(q) for q in queries]
+        rate = len(queries) / (time.perf_counter() - start)
+        print(f"\n   -> {rate:.0f} lignes/s")
+
+        assert all(r is not None for r in results)
+        assert rate > 1000
@@ -1,5 +1,6 @@
 import pytest
-from utils.import_parser import parse_mtg_line
+from utils import import_parser
+from utils.import_parser import parse_mtg_line, parse_lines
 
 class TestParsing:
 
@@ -52,4 +53,41 @@ class TestParsing:
     def test_empty_line(self):
         """Test: Ligne vide ou espaces"""
         assert parse_mtg_line("") is None
-        assert parse_mtg_line("   ") is None
\ No newline at end of file
+        assert parse_mtg_line("   ") is None
+
+    def test_prefixes_zone_and_foil(self):
+        """Test: 'SB: 2 Duress (M19) 94 *F* (Sideboard)'"""
+        result = parse_mtg_line("SB: 2 Duress (M19) 94 *F* (Sideboard)")
+
+        assert result["is_sideboard"] is True
+        assert result["is_foil"] is True
+        assert result["collector_number"] == "94"
+
+        result = parse_mtg_line("CMDR: 1 Atraxa, Praetors' Voice Foil (Commander)")
+
+        assert result["is_commander"] is True
+        assert result["is_foil"] is True
+        assert result["name"] == "Atraxa, Praetors' Voice"
+
+
+class TestParseLines:
+
+    LINES = [
+        "4 Lightning Bolt", "4x Lightning Bolt", "2 Crystal Grotto (WOE) 254", "1 Black Lotus [LEA]",
+        "SB: 3 Duress", "sb:  1 Negate (RIX) 44 *F*", "CMDR: 1 Atraxa, Praetors' Voice (Commander)",
+        "1 Sol Ring Foil", "2 Opt *E*", "Sol Ring", "", "   ", "4\tShock", "4   (abc)", "1 Fire // Ice (MH2) 290",
+        "\u017fB: 1 Opt", "3 Card FO\u0131L", "  10X Mountain (Principal)  ",
+    ]
+
+    def test_same_output_as_line_parser(self):
+        assert parse_lines(self.LINES) == [parse_mtg_line(line) for line in self.LINES]
+
+    def test_accepts_any_iterable(self):
+        assert parse_lines(iter(self.LINES)) == parse_lines(self.LINES)
+
+    def test_multiprocessing_same_output(self, monkeypatch):
+        monkeypatch.setattr(import_parser, "MULTIPROCESS_MIN_LINES", 10)
+        monkeypatch.setattr(import_parser, "MULTIPROCESS_CHUNK_SIZE", 4)
+        lines = self.LINES * 3
+
+        assert parse_lines(lines, processes=2) == [parse_mtg_line(line) for line in lines]
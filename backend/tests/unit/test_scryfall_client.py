@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+import httpx
+from utils import scryfall_client
+from utils.scryfall_client import TokenBucket
+
+
+class TestScryfallClient:
+
+    def test_token_bucket_burst_then_throttle(self):
+        """Les 10 premiers jetons sont immédiats, le suivant doit attendre ~1/10 s."""
+        bucket = TokenBucket(rate=10.0, capacity=10)
+        delays = [bucket.reserve() for _ in range(11)]
+
+        assert all(d == 0.0 for d in delays[:10])
+        assert delays[10] == pytest.approx(0.1, abs=0.01)
+
+    @pytest.mark.asyncio
+    async def test_retry_on_429_then_success(self, monkeypatch):
+        """Un 429 est rejoué (en respectant Retry-After), puis la réponse 200 est renvoyée."""
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            if len(calls) == 1:
+                return httpx.Response(429, headers={"Retry-After": "0"})
+            return httpx.Response(200, json={"data": [{"id": "abc"}]})
+
+        mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(scryfall_client, "get_client", lambda: mock_client)
+        retries_before = scryfall_client.stats["retries"]
+
+        cards = await scryfall_client.fetch_collection([{"name": "Black Lotus"}])
+
+        assert cards == [{"id": "abc"}]
+        assert calls == ["/cards/collection", "/cards/collection"]
+        assert scryfall_client.stats["retries"] == retries_before + 1
+
+    def test_retry_after_is_clamped(self):
+        """Un Retry-After demesure (ou negatif) est ramene dans [0, MAX_RETRY_AFTER]."""
+        assert scryfall_client._retry_delay(httpx.Response(429, headers={"Retry-After": "3600"}), 0) == scryfall_client.MAX_RETRY_AFTER
+        assert scryfall_client._retry_delay(httpx.Response(429, headers={"Retry-After": "-5"}), 0) == 0.0
+        assert scryfall_client._retry_delay(httpx.Response(429, headers={"Retry-After": "2"}), 0) == 2.0
+
+    def test_client_of_previous_loop_is_closed(self, monkeypatch):
+        """Une nouvelle boucle d'evenements recree le client et ferme celui de la boucle precedente."""
+        monkeypatch.setattr(scryfall_client, "_client", None)
+        monkeypatch.setattr(scryfall_client, "_client_loop", None)
+
+        async def current_client():
+            client = scryfall_client.get_client()
+            await asyncio.sleep(0)
+            return client
+
+        first = asyncio.run(current_client())
+        assert not first.is_closed
+
+        async def next_loop():
+            client = await current_client()
+            await scryfall_client.close_client()
+            return client
+
+        second = asyncio.run(next_loop())
+        assert second is not first
+        assert first.is_closed and second.is_closed
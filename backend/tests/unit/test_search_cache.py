@@ -0,0 +1,22 @@
+from utils.search_cache import SearchResultCache
+
+
+class TestSearchResultCache:
+
+    def test_key_ignores_order_and_absent_params(self):
+        a = SearchResultCache.make_key("u1", 3, {"name": "bolt", "tags": None, "page": 1})
+        b = SearchResultCache.make_key("u1", 3, {"page": 1, "name": "bolt"})
+        assert a == b
+        assert a != SearchResultCache.make_key("u1", 4, {"page": 1, "name": "bolt"})
+        assert a != SearchResultCache.make_key("u2", 3, {"page": 1, "name": "bolt"})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = SearchResultCache(max_size=2)
+        cache.put("a", {"cards": []})
+        cache.put("b", {"cards": []})
+        assert cache.get("a") is not None
+        cache.put("c", {"cards": []})
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None and cache.get("c") is not None
+        assert cache.stats() == {"size": 2, "max_size": 2, "hits": 3, "misses": 1, "hit_rate": 0.75}
@@ -0,0 +1,94 @@
+import random
+import pytest
+from utils.tags_engine import CollectionSnapshot, CompiledRuleSet, evaluate_condition, get_automated_tags
+
+TYPES = ["Creature — Goblin", "Instant", "Legendary Creature — Elf", "Artifact", "Sorcery", ""]
+CONDITION_VALUES = {
+    "type_line": ["goblin", "Creature", "instant", "", "ELF"],
+    "oracle_text": ["draw", "damage", ""],
+    "name": ["bolt", "Card 1", "card 12"],
+    "set": ["m10", "NEO", ""],
+    "cmc": ["0", "2", "3.5", "x", ""],
+    "power": ["2", "*", "-1"],
+    "toughness": ["1", "3"],
+    "price": ["0.5", "10", "abc"],
+    "color_exact": ["R", "R,G", "C", "u, b", ""],
+    "color_approx": ["R,G", "W,U,B", "C", "g"],
+    "date_added": ["2020-01-01", "2023-06-15", "2020-1-5", "bad-date", ""],
+    "unknown": ["x"],
+}
+OPERATORS = ["contains", "not_contains", "equals", "is_empty", "==", ">", "<", "!="]
+
+
+def random_card(rng, i):
+    return {
+        "name": f"Card {i}",
+        "type_line": rng.choice(TYPES),
+        "oracle_text": rng.choice(["Draw a card.", "Deal 3 damage.", "", None]),
+        "set": rng.choice(["m10", "neo", "dmu"]),
+        "cmc": rng.choice([0, 1, 2, 3.5, 5, None, ""]),
+        "power": rng.choice(["2", "*", "1+*", "-1", "", None]),
+        "toughness": rng.choice(["1", "3", "*", ""]),
+        "prices": rng.choice([{"eur": 0.5}, {"eur": None, "usd": 12.0}, {}, {"eur": 10.0}]),
+        "colors": rng.sample(["W", "U", "B", "R", "G"], rng.randint(0, 3)),
+        "released_at": rng.choice(["2019-12-31", "2020-01-01", "2023-06-15", "2020-01-05", "", None, "nope"]),
+    }
+
+
+def random_rule(rng, i):
+    conditions = []
+    for _ in range(rng.randint(0, 3)):
+        field = rng.choice(list(CONDITION_VALUES))
+        conditions.append({"field": field, "operator": rng.choice(OPERATORS), "value": rng.choice(CONDITION_VALUES[field])})
+    return {"tag_name": rng.choice([f" Tag{i % 7} ", "", "shared"]), "logic": rng.choice(["AND", "OR", None]), "conditions": conditions}
+
+
+class TestCompiledRules:
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_same_tags_as_interpreted_rules(self, seed):
+        """Regles compilees : memes tags, dans le meme ordre, que l'evaluation regle par regle."""
+        rng = random.Random(seed)
+        rules = [random_rule(rng, i) for i in range(30)]
+        compiled = CompiledRuleSet(rules)
+
+        for i in range(300):
+            card = random_card(rng, i)
+            assert get_automated_tags(card, compiled) == get_automated_tags(card, rules)
+
+    def test_unexpected_rule_values_fall_back_to_interpretation(self):
+        """Valeurs de regle non textuelles : meme resultat que evaluate_condition."""
+        card = {"colors": ["R"], "released_at": "2020-01-01", "name": "None"}
+        for condition in [{"field": "name", "operator": "equals", "value": None},
+                          {"field": "cmc", "operator": ">", "value": None}]:
+            compiled = CompiledRuleSet([{"tag_name": "t", "conditions": [condition]}])
+            assert compiled.tags_for(card) == get_automated_tags(card, compiled.source)
+        with pytest.raises(AttributeError):
+            evaluate_condition(card, {"field": "color_exact", "operator": "==", "value": 3})
+        with pytest.raises(AttributeError):
+            CompiledRuleSet([{"tag_name": "t", "conditions": [{"field": "color_exact", "value": 3}]}]).tags_for(card)
+
+    def test_tag_names(self):
+        compiled = CompiledRuleSet([
+            {"tag_name": " Burn ", "conditions": [{"field": "cmc", "operator": "<", "value": "2"}]},
+            {"tag_name": "burn", "conditions": [{"field": "cmc", "operator": ">", "value": "5"}]},
+            {"tag_name": "empty", "conditions": []},
+        ])
+        assert compiled.tag_names == ["burn"]
+        assert len(compiled) == 3
+
+
+class TestCollectionSnapshot:
+
+    @pytest.mark.parametrize("seed", range(3))
+    def test_masks_match_compiled_rules(self, seed):
+        """Masques par tag (toutes les cartes d'un coup) : memes cartes que l'evaluation carte par carte."""
+        pytest.importorskip("numpy")
+        rng = random.Random(seed)
+        rules = [random_rule(rng, i) for i in range(40)]
+        cards = [random_card(rng, i) for i in range(500)]
+
+        masks = CollectionSnapshot(cards).tag_masks(rules)
+        compiled = CompiledRuleSet(rules)
+        for i, card in enumerate(cards):
+            assert {tag for tag, mask in masks.items() if mask[i]} == set(compiled.tags_for(card))
@@ -0,0 +1,66 @@
+import json
+
+READ_CHUNK_SIZE = 1 << 20  # 1 Mo
+
+
+def iter_json_array(fp, chunk_size: int = READ_CHUNK_SIZE):
+    """
+    Parcourt un tableau JSON de premier niveau ("[ {...}, {...} ]") objet par objet.
+    Seul un tampon de quelques Mo reste en memoire, quelle que soit la taille du fichier :
+    indispensable pour les exports Scryfall "default_cards"/"all_cards" (plusieurs Go).
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    while True:
+        # Saut des separateurs ("[", ",", espaces)
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            fill()
+
+        if pos >= len(buf):
+            if started:
+                raise ValueError("Tableau JSON tronque (']' manquant)")
+            return
+
+        char = buf[pos]
+        if not started:
+            if char != "[":
+                raise ValueError("Le fichier doit contenir un tableau JSON")
+            started = True
+            pos += 1
+            continue
+        if char == "]":
+            return
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Objet coupe par la fin du tampon : on lit la suite et on recommence
+            if eof:
+                raise
+            fill()
+            continue
+
+        # Un objet valide peut se terminer pile en fin de tampon (nombre coupe, ex "12|3") :
+        # on ne l'accepte que si un separateur le suit ou si le fichier est fini.
+        if end >= len(buf) and not eof:
+            fill()
+            continue
+
+        pos = end
+        yield obj
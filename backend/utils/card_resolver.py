@@ -0,0 +1,155 @@
+from database import async_cards_collection
+from models.card import extract_card_fields
+from utils import scryfall_client
+from utils.fuzzy_matcher import get_matcher, ACCEPT_THRESHOLD
+
+# Comparaison des noms insensible a la casse (meme collation que l'index Cards "cards_name")
+NAME_COLLATION = {"locale": "en", "strength": 2}
+PROJECTION = {"_id": 0, "owners": 0, "content_hash": 0}
+
+
+def identifier_key(ident: dict) -> str:
+    if ident.get("set") and ident.get("collector_number"):
+        return f"{ident['set']}:{ident['collector_number']}".lower()
+    return f"{ident.get('name', '')}|{ident.get('set') or ''}".lower()
+
+
+def _preferred(current, candidate):
+    """Entre deux impressions candidates, garde l'anglaise puis la plus recente (comme Scryfall)."""
+    if current is None:
+        return candidate
+    rank = lambda c: (c.get("lang") == "en", c.get("released_at") or "")
+    return candidate if rank(candidate) > rank(current) else current
+
+
+def _card_keys(doc: dict) -> set:
+    """Cles d'identifiant auxquelles une carte repond : set/numero, nom complet ou nom d'une face (avec ou sans set)."""
+    set_code = str(doc.get("set", "")).lower()
+    keys = {f"{set_code}:{doc.get('collector_number')}".lower()}
+    names = {str(doc.get("name", "")).lower()}
+    names.update(str(face.get("name", "")).lower() for face in (doc.get("card_faces") or []))
+    for name in names:
+        keys.update((f"{name}|", f"{name}|{set_code}"))
+    return keys
+
+
+def _match(wanted: dict, docs: list) -> dict:
+    """Rattache chaque carte aux identifiants demandes auxquels elle repond (impression preferee)."""
+    resolved = {}
+    for doc in docs:
+        for key in _card_keys(doc):
+            if key in wanted:
+                resolved[key] = _preferred(resolved.get(key), doc)
+    return resolved
+
+
+async def _resolve_prints(wanted: dict) -> dict:
+    """
+    wanted : {"set:cn": identifiant}. Une seule requete : les numeros sont groupes par set,
+    seuls les couples (set, numero) demandes sont lus.
+    """
+    if not wanted:
+        return {}
+    numbers_by_set = {}
+    for ident in wanted.values():
+        numbers_by_set.setdefault(ident["set"].lower(), set()).add(str(ident["collector_number"]))
+    docs = await async_cards_collection.find(
+        {"$or": [{"set": set_code, "collector_number": {"$in": sorted(numbers)}} for set_code, numbers in numbers_by_set.items()]},
+        PROJECTION
+    ).to_list(None)
+    return _match(wanted, docs)
+
+
+async def _resolve_names(wanted: dict) -> dict:
+    """wanted : {"nom|set": identifiant}. Accepte le nom complet ou celui d'une face ("Fire" pour "Fire // Ice")."""
+    if not wanted:
+        return {}
+    names = list({ident["name"] for ident in wanted.values()})
+    docs = await async_cards_collection.find(
+        {"$or": [{"name": {"$in": names}}, {"card_faces.name": {"$in": names}}]},
+        PROJECTION,
+        collation=NAME_COLLATION
+    ).to_list(None)
+    return _match(wanted, docs)
+
+
+async def _fuzzy_resolve(misses: dict):
+    """
+    Rattrape les noms mal orthographies ("Lightnig Bolt", "Fire/Ice") via le matcher local.
+    Renvoie (cartes resolues par cle d'origine, corrections appliquees, suggestions a faible confiance).
+    """
+    matcher = await get_matcher()
+    renamed, matched, low_confidence = {}, [], []
+    for key, ident in misses.items():
+        result = matcher.match(ident["name"])
+        if result is None:
+            continue
+        canonical, confidence = result
+        entry = {"query": ident["name"], "name": canonical, "confidence": confidence}
+        if confidence >= ACCEPT_THRESHOLD:
+            renamed[key] = {**ident, "name": canonical}
+            matched.append(entry)
+        else:
+            low_confidence.append(entry)
+
+    by_canonical = await _resolve_names({identifier_key(i): i for i in renamed.values()})
+    resolved = {}
+    for key, ident in renamed.items():
+        card = by_canonical.get(identifier_key(ident))
+        if card is not None:
+            resolved[key] = card
+    matched = [m for m, key in zip(matched, renamed) if key in resolved]
+    return resolved, matched, low_confidence
+
+
+async def resolve_identifiers(identifiers: list):
+    """
+    Resout des identifiants au format Scryfall /cards/collection ({"set", "collector_number"}
+    ou {"name"[, "set"]}) en interrogeant d'abord le catalogue local Cards. Seuls les
+    identifiants absents en local partent chez Scryfall. Les noms introuvables tels quels,
+    en local comme chez Scryfall, passent ensuite par le matcher approximatif local
+    (utils/fuzzy_matcher.py).
+
+    Renvoie (carte nettoyee par cle d'identifiant, statistiques de resolution) : chaque
+    identifiant est retrouve par sa propre cle (identifier_key), meme si plusieurs identifiants
+    designent la meme impression. Les statistiques listent les corrections appliquees
+    ("fuzzy_matches") et les suggestions trop incertaines pour etre appliquees
+    ("low_confidence"), chacune {"query", "name", "confidence"}.
+    """
+    unique = {}
+    for ident in identifiers:
+        unique.setdefault(identifier_key(ident), ident)
+
+    prints = {k: i for k, i in unique.items() if i.get("set") and i.get("collector_number")}
+    names = {k: i for k, i in unique.items() if k not in prints and i.get("name")}
+
+    resolved = await _resolve_prints(prints)
+    resolved.update(await _resolve_names(names))
+    local = len(resolved)
+
+    misses = {key: ident for key, ident in unique.items() if key not in resolved}
+    remote_cards = []
+    if misses:
+        remote_cards = [extract_card_fields(c) for c in await scryfall_client.fetch_collection(list(misses.values()))]
+        resolved.update(_match(misses, [c for c in remote_cards if c.get("id")]))
+
+    # Matcher approximatif en dernier recours : un nom absent d'un catalogue local partiel mais
+    # connu de Scryfall n'est pas remplace par une carte locale au nom voisin
+    fuzzy_matches, low_confidence = [], []
+    name_misses = {k: i for k, i in names.items() if k not in resolved}
+    if name_misses:
+        fuzzy_resolved, fuzzy_matches, low_confidence = await _fuzzy_resolve(name_misses)
+        resolved.update(fuzzy_resolved)
+        local += len(fuzzy_resolved)
+
+    total = len(unique)
+    stats = {
+        "identifiers": total,
+        "local": local,
+        "remote": len(remote_cards),
+        "not_found": len(unique) - len(resolved),
+        "local_hit_ratio": round(local / total, 3) if total else 0.0,
+        "fuzzy_matches": fuzzy_matches,
+        "low_confidence": low_confidence,
+    }
+    return {key: card for key, card in resolved.items() if card.get("id")}, stats
@@ -0,0 +1,61 @@
+from database import user_cards_collection, async_user_cards_collection
+from utils.import_engine import build_user_card_fields
+from utils.search_cache import bump_all_collection_versions, async_bump_all_collection_versions
+from pymongo import UpdateMany
+
+# Les lignes UserCards portent une copie des champs de la carte (nom, couleurs, type, prix...)
+# pour que /cards/search filtre et trie sans jointure vers Cards. Toute ecriture qui modifie
+# une carte existante du catalogue doit donc rafraichir ces copies.
+SYNC_BATCH_SIZE = 500
+
+
+def user_card_sync_operations(cards) -> list:
+    """Une mise a jour par carte, appliquee a toutes les lignes UserCards qui la referencent."""
+    return [
+        UpdateMany({"card_id": card["id"]}, {"$set": build_user_card_fields(card)})
+        for card in cards if card.get("id")
+    ]
+
+
+def sync_user_cards(cards, user_cards=None) -> int:
+    """Version synchrone (scripts, migrations). Renvoie le nombre de lignes UserCards modifiees."""
+    user_cards = user_cards if user_cards is not None else user_cards_collection
+    operations = user_card_sync_operations(cards)
+    if not operations:
+        return 0
+    modified = user_cards.bulk_write(operations, ordered=False).modified_count
+    if modified:
+        # Lignes de plusieurs utilisateurs touchees : toutes les recherches en cache sont perimees
+        bump_all_collection_versions(user_cards.database["collection_versions"])
+    return modified
+
+
+async def async_sync_user_cards(cards) -> int:
+    operations = user_card_sync_operations(cards)
+    if not operations:
+        return 0
+    modified = (await async_user_cards_collection.bulk_write(operations, ordered=False)).modified_count
+    if modified:
+        await async_bump_all_collection_versions()
+    return modified
+
+
+def resync_all_user_cards(database, batch_size: int = SYNC_BATCH_SIZE) -> int:
+    """Recopie les champs de toutes les cartes possedees dans UserCards (migration, reparation)."""
+    modified = 0
+    batch = []
+
+    def flush():
+        nonlocal modified
+        cards = list(database["Cards"].find({"id": {"$in": batch}}, {"_id": 0, "owners": 0}))
+        modified += sync_user_cards(cards, database["UserCards"])
+        batch.clear()
+
+    for doc in database["UserCards"].aggregate([{"$group": {"_id": "$card_id"}}], allowDiskUse=True):
+        if doc["_id"]:
+            batch.append(doc["_id"])
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return modified
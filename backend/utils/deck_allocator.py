@@ -0,0 +1,211 @@
+from database import async_user_cards_collection, async_items_collection
+from pymongo import UpdateOne
+from bson import ObjectId
+from collections import Counter, defaultdict
+
+# --- Construction d'un deck : reservation des exemplaires de la collection ---
+# Les lignes UserCards utiles (cartes du deck et autres impressions du meme nom) sont lues en
+# une requete, la repartition est calculee en memoire, puis toutes les reservations partent
+# dans un seul bulk_write. Chaque ecriture est gardee (assigned_count + quantite <= count) et
+# note la part du deck dans la ligne (allocations : [{deck_id, qty}]) : si une construction
+# concurrente a pris des exemplaires entre la lecture et l'ecriture, les reservations deja
+# passees sont retrouvees et annulees, et la repartition est recalculee.
+# Ces marques forment le registre des reservations, (user_id, card_id) -> [(deck_id, qty)],
+# tenu a jour dans la meme ecriture que assigned_count a chaque construction / demontage :
+# "ou est utilisee cette carte" se lit sur les lignes de la carte, sans parcourir les decks.
+ALLOCATION_ATTEMPTS = 3
+
+
+def allocation_guard(row_id, deck_id: str, qty: int) -> dict:
+    """Ligne encore assez disponible, et pas deja reservee pour ce deck."""
+    return {
+        "_id": row_id,
+        "allocations.deck_id": {"$ne": deck_id},
+        "$expr": {"$lte": [
+            {"$add": [{"$ifNull": ["$assigned_count", 0]}, qty]},
+            {"$ifNull": ["$count", 0]}
+        ]}
+    }
+
+
+async def load_allocation_rows(uid: str, card_ids: list, names: list) -> list:
+    """Lignes UserCards des cartes du deck et de leurs autres impressions (meme nom), ordre naturel."""
+    return await async_user_cards_collection.find({"user_id": uid, "$or": [
+        {"card_id": {"$in": card_ids}},
+        {"name": {"$in": names}}
+    ]}).to_list(None)
+
+
+def plan_allocation(card_counts: Counter, rows: list, global_cards: dict) -> dict:
+    """
+    Repartition en memoire des exemplaires requis (card_counts : card_id -> quantite) :
+    1. chaque carte prend d'abord sur sa propre ligne (la premiere trouvee pour son card_id) ;
+    2. un manque est comble par les autres impressions du meme nom, dans l'ordre de la
+       collection (le deck est alors modifie : swaps) ;
+    3. sinon la carte est signalee manquante, avec ce qui reste disponible toutes impressions
+       confondues.
+    Les disponibilites sont partagees entre les cartes : une ligne n'est jamais promise deux fois.
+    """
+    primary = {}
+    by_name = defaultdict(list)
+    for row in rows:
+        primary.setdefault(row.get("card_id"), row)
+        if row.get("name"):
+            by_name[row["name"]].append(row)
+    remaining = {row["_id"]: row.get("count", 0) - row.get("assigned_count", 0) for row in rows}
+
+    locks = []
+    swaps = []
+    missing = []
+    shortages = []
+    for cid, required_qty in card_counts.items():
+        user_card = primary.get(cid)
+        global_card = global_cards.get(cid)
+        card_name = cid
+        if user_card and "name" in user_card:
+            card_name = user_card["name"]
+        elif global_card and "name" in global_card:
+            card_name = global_card["name"]
+
+        available = max(remaining[user_card["_id"]], 0) if user_card else 0
+        take = min(required_qty, available)
+        if take > 0:
+            remaining[user_card["_id"]] -= take
+            locks.append({"_id": user_card["_id"], "qty": take, "name": card_name, "id": cid})
+        if take < required_qty:
+            shortages.append((cid, card_name, required_qty, take))
+
+    for cid, card_name, required_qty, taken in shortages:
+        shortage = required_qty - taken
+        alternatives = [r for r in by_name.get(card_name, []) if r.get("card_id") != cid]
+        found_alternatives = []
+        current_shortage = shortage
+        for alt in alternatives:
+            if current_shortage <= 0:
+                break
+            alt_avail = remaining[alt["_id"]]
+            if alt_avail > 0:
+                take = min(current_shortage, alt_avail)
+                found_alternatives.append({"_id": alt["_id"], "id": alt["card_id"], "name": alt.get("name", card_name), "qty": take})
+                current_shortage -= take
+
+        if current_shortage == 0:
+            for alt in found_alternatives:
+                remaining[alt["_id"]] -= alt["qty"]
+            locks.extend(found_alternatives)
+            swaps.append({"old_id": cid, "qty_to_swap": shortage, "new_cards": found_alternatives})
+        else:
+            alt_available = sum(max(remaining[alt["_id"]], 0) for alt in alternatives)
+            missing.append({"id": cid, "name": card_name, "required": required_qty, "available": taken + alt_available})
+
+    return {"locks": locks, "swaps": swaps, "missing": missing}
+
+
+async def apply_allocation(uid: str, deck_id: str, locks: list) -> bool:
+    """
+    Ecrit toutes les reservations en un bulk_write. Si une ecriture est refusee par sa garde
+    (exemplaires pris entre-temps), celles qui sont passees sont annulees : False.
+    """
+    per_row = defaultdict(int)
+    for lock in locks:
+        per_row[lock["_id"]] += lock["qty"]
+    if not per_row:
+        return True
+
+    operations = [
+        UpdateOne(allocation_guard(row_id, deck_id, qty), {
+            "$inc": {"assigned_count": qty},
+            "$push": {"allocations": {"deck_id": deck_id, "qty": qty}}
+        })
+        for row_id, qty in per_row.items()
+    ]
+    result = await async_user_cards_collection.bulk_write(operations, ordered=False)
+    if result.matched_count == len(operations):
+        return True
+    await release_allocation(uid, deck_id)
+    return False
+
+
+async def release_allocation(uid: str, deck_id: str) -> list:
+    """Rend les exemplaires reserves pour le deck (lignes marquees) ; renvoie les lignes liberees."""
+    rows = await async_user_cards_collection.find(
+        {"user_id": uid, "allocations.deck_id": deck_id}, {"card_id": 1, "name": 1, "allocations": 1}
+    ).to_list(None)
+    operations = []
+    released = []
+    for row in rows:
+        qty = sum(a.get("qty", 0) for a in row.get("allocations", []) if a.get("deck_id") == deck_id)
+        operations.append(UpdateOne(
+            {"_id": row["_id"], "allocations.deck_id": deck_id},
+            {"$inc": {"assigned_count": -qty}, "$pull": {"allocations": {"deck_id": deck_id}}}
+        ))
+        released.append({"id": row.get("card_id"), "name": row.get("name", "Carte inconnue"), "qty": qty})
+    if operations:
+        await async_user_cards_collection.bulk_write(operations, ordered=False)
+    return released
+
+
+async def release_legacy_allocation(uid: str, card_counts: Counter) -> list:
+    """
+    Deck construit avant le marquage des reservations : comme auparavant, chaque carte est
+    rendue sur la premiere ligne de son card_id (si elle a des exemplaires reserves).
+    """
+    rows = await async_user_cards_collection.find(
+        {"user_id": uid, "card_id": {"$in": list(card_counts)}}, {"card_id": 1, "name": 1, "assigned_count": 1}
+    ).to_list(None)
+    primary = {}
+    for row in rows:
+        primary.setdefault(row.get("card_id"), row)
+
+    operations = []
+    released = []
+    for cid, qty_to_free in card_counts.items():
+        user_card = primary.get(cid)
+        if user_card and user_card.get("assigned_count", 0) > 0:
+            operations.append(UpdateOne({"_id": user_card["_id"]}, {"$inc": {"assigned_count": -qty_to_free}}))
+            released.append({"id": cid, "name": user_card.get("name", "Carte inconnue"), "qty": qty_to_free})
+    if operations:
+        await async_user_cards_collection.bulk_write(operations, ordered=False)
+    return released
+
+
+async def card_allocations(uid: str, card_ids: list) -> dict:
+    """
+    Registre des reservations : card_id -> exemplaires possedes, reserves, et decks construits
+    qui les reservent (toutes lignes de la carte, foil compris). Une lecture indexee
+    (user_id, card_id) dans UserCards, puis les noms des decks par _id.
+    """
+    rows = await async_user_cards_collection.find(
+        {"user_id": uid, "card_id": {"$in": card_ids}}, {"card_id": 1, "count": 1, "assigned_count": 1, "allocations": 1}
+    ).to_list(None)
+    deck_ids = {a["deck_id"] for row in rows for a in row.get("allocations", [])}
+    names = {}
+    if deck_ids:
+        names = {str(d["_id"]): d.get("nom", "Deck inconnu") for d in await async_items_collection.find(
+            {"_id": {"$in": [ObjectId(d) for d in deck_ids if ObjectId.is_valid(d)]}, "user_id": uid}, {"nom": 1}
+        ).to_list(None)}
+
+    ledger = {}
+    for row in rows:
+        entry = ledger.setdefault(row["card_id"], {"card_id": row["card_id"], "count": 0, "assigned_count": 0, "decks": {}})
+        entry["count"] += row.get("count", 0)
+        entry["assigned_count"] += row.get("assigned_count", 0)
+        for allocation in row.get("allocations", []):
+            deck = entry["decks"].setdefault(allocation["deck_id"], {
+                "deck_id": allocation["deck_id"], "nom": names.get(allocation["deck_id"], "Deck inconnu"), "qty": 0
+            })
+            deck["qty"] += allocation.get("qty", 0)
+    for entry in ledger.values():
+        entry["available"] = entry["count"] - entry["assigned_count"]
+        entry["decks"] = list(entry["decks"].values())
+    return ledger
+
+
+async def decks_using_cards(uid: str, card_ids: list, exclude_deck_id: str = None) -> dict:
+    """card_id -> ["Nom du deck (xN)", ...] : decks construits qui en reservent des exemplaires (registre)."""
+    used_in = defaultdict(list)
+    if not card_ids:
+        return used_in
+    for cid, entry in (await card_allocations(uid, card_ids)).items():
+        used_in[cid] = [f"{d['nom']} (x{d['qty']})" for d in entry["decks"] if d["deck_id"] != exclude_deck_id and d["qty"] > 0]
+    return used_in
@@ -0,0 +1,155 @@
+from collections import Counter
+import asyncio
+import re
+import time
+import unicodedata
+
+# Seuils de confiance (similarite d'edition entre 0 et 1)
+ACCEPT_THRESHOLD = 0.85    # correspondance appliquee automatiquement
+SUGGEST_THRESHOLD = 0.6    # correspondance seulement proposee (signalee dans l'historique)
+MAX_CANDIDATES = 15
+# Un trigramme present dans plus de 5% des noms (" th", "the"...) ne discrimine presque rien :
+# on l'ignore des qu'il reste des trigrammes plus rares dans la requete.
+COMMON_GRAM_RATIO = 0.05
+CACHE_TTL_SECONDS = 600
+
+
+def normalize_name(name: str) -> str:
+    """
+    Forme canonique d'un nom de carte pour la comparaison :
+    minuscules, sans accents ni ponctuation, separateur de cartes scindees unifie ("Fire/Ice" -> "fire // ice").
+    """
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join(ch for ch in name if not unicodedata.combining(ch)).lower()
+    name = re.sub(r"\s*/{1,2}\s*", " // ", name)
+    name = re.sub(r"[-_]", " ", name)
+    name = re.sub(r"[^a-z0-9/ ]+", "", name)
+    return re.sub(r"\s+", " ", name).strip()
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein(a: str, b: str, max_dist: int = None) -> int:
+    """Distance d'edition. Avec max_dist, abandonne des qu'elle est depassee (renvoie max_dist + 1)."""
+    if len(a) < len(b):
+        a, b = b, a
+    if max_dist is not None and len(a) - len(b) > max_dist:
+        return max_dist + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb)
+            ))
+        if max_dist is not None and min(current) > max_dist:
+            return max_dist + 1
+        previous = current
+    return previous[-1]
+
+
+class FuzzyMatcher:
+    """
+    Index en memoire des noms du catalogue : table exacte sur le nom normalise,
+    puis index de trigrammes pour preselectionner des candidats re-classes par distance d'edition.
+    Les noms de faces ("Fire") renvoient vers le nom complet de la carte ("Fire // Ice").
+    """
+
+    def __init__(self, names, faces=None):
+        self.exact = {}
+        self.keys = []
+        self.canonical = []
+        self.gram_sizes = []
+        self.postings = {}
+
+        entries = [(n, n) for n in names if n]
+        for full_name, face_names in (faces or {}).items():
+            entries.extend((face, full_name) for face in face_names if face)
+
+        for alias, full_name in entries:
+            key = normalize_name(alias)
+            if not key or key in self.exact:
+                continue
+            self.exact[key] = full_name
+            idx = len(self.keys)
+            self.keys.append(key)
+            self.canonical.append(full_name)
+            grams = trigrams(key)
+            self.gram_sizes.append(len(grams))
+            for g in grams:
+                self.postings.setdefault(g, []).append(idx)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def match(self, query: str):
+        """Renvoie (nom canonique, confiance) ou None si aucun candidat n'atteint SUGGEST_THRESHOLD."""
+        key = normalize_name(query)
+        if not key:
+            return None
+        if key in self.exact:
+            return self.exact[key], 1.0
+
+        grams = trigrams(key)
+        postings = [self.postings[g] for g in grams if g in self.postings]
+        common_limit = max(50, int(len(self.keys) * COMMON_GRAM_RATIO))
+        rare = [p for p in postings if len(p) <= common_limit]
+        counts = Counter()
+        for posting in (rare or postings):
+            counts.update(posting)
+
+        # Re-classement par distance d'edition ; un candidat ne peut gagner que s'il fait
+        # mieux que le meilleur courant, ce qui borne le calcul de distance.
+        best = None
+        best_similarity = SUGGEST_THRESHOLD
+        for idx, shared in counts.most_common(MAX_CANDIDATES):
+            dice = 2 * shared / (len(grams) + self.gram_sizes[idx])
+            candidate = self.keys[idx]
+            longest = max(len(key), len(candidate))
+            max_dist = int(longest * (1 - best_similarity))
+            dist = levenshtein(key, candidate, max_dist)
+            if dist > max_dist:
+                continue
+            similarity = 1 - dist / longest
+            score = (similarity, dice)
+            if best is None or score > best[0]:
+                best = (score, idx)
+                best_similarity = similarity
+
+        if best is None:
+            return None
+        return self.canonical[best[1]], round(best[0][0], 3)
+
+
+_matcher = None
+_built_at = 0.0
+
+
+async def get_matcher() -> FuzzyMatcher:
+    """Matcher construit a partir des noms du catalogue Cards, mis en cache quelques minutes."""
+    global _matcher, _built_at
+    if _matcher is not None and time.monotonic() - _built_at < CACHE_TTL_SECONDS:
+        return _matcher
+
+    from database import async_cards_collection
+
+    names = await async_cards_collection.distinct("name")
+    faces_docs = await async_cards_collection.aggregate([
+        {"$match": {"card_faces.name": {"$exists": True}}},
+        {"$group": {"_id": "$name", "faces": {"$first": "$card_faces.name"}}}
+    ]).to_list(None)
+    faces = {d["_id"]: d.get("faces") or [] for d in faces_docs if d.get("_id")}
+
+    _matcher = await asyncio.to_thread(FuzzyMatcher, names, faces)
+    _built_at = time.monotonic()
+    return _matcher
+
+
+def invalidate_matcher():
+    global _matcher
+    _matcher = None
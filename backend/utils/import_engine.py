@@ -0,0 +1,300 @@
+from database import async_user_cards_collection, async_cards_collection
+from utils.import_parser import parse_lines
+from utils.tags_engine import get_automated_tags
+from utils.card_resolver import resolve_identifiers, identifier_key
+from utils.search_cache import bump_collection_version
+from utils.fuzzy_matcher import invalidate_matcher
+from models.card import card_search_fields, with_content_hash
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime
+import os
+
+# Nombre de lignes traitees par fenetre : resolution puis deux bulk_write (Cards, UserCards).
+# La memoire d'un import est bornee par cette fenetre, quelle que soit la taille du fichier.
+IMPORT_WRITE_WINDOW = int(os.getenv("IMPORT_WRITE_WINDOW", "500"))
+
+USER_CARD_FIELDS = [
+    "name", "lang", "oracle_id", "set", "set_name", "collector_number",
+    "image_normal", "image_art_crop", "image_small", "rarity"
+]
+USER_CARD_DEFAULTS = {
+    "colors": list, "type_line": str, "oracle_text": str, "keywords": list, "cmc": int,
+    "power": str, "toughness": str, "legalities": dict, "prices": dict, "purchase_uris": dict
+}
+
+
+async def bulk_upsert(collection, operations: list, guarded: bool = False):
+    """
+    bulk_write non ordonne d'upserts. Si un import concurrent a cree la meme ligne entre-temps
+    (doublon sur un index unique), les operations concernees sont rejouees : elles deviennent
+    de simples mises a jour.
+    guarded : les filtres excluent les lignes deja ecrites par ce bloc (marque import_marks) ;
+    un doublon a la reprise signifie alors que l'ecriture a deja ete appliquee, elle est ignoree.
+    """
+    try:
+        await collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        try:
+            await collection.bulk_write([operations[err["index"]] for err in errors], ordered=False)
+        except BulkWriteError as replay_error:
+            replay_errors = replay_error.details.get("writeErrors", [])
+            if not guarded or any(err.get("code") != 11000 for err in replay_errors):
+                raise
+
+
+def import_mark_field(job_id: str) -> str:
+    """Champ UserCards du dernier bloc du job applique a la ligne (import_marks.<job_id> : seq)."""
+    return f"import_marks.{job_id}"
+
+
+def build_user_card_fields(cleaned: dict) -> dict:
+    """Champs de carte copies dans une nouvelle ligne UserCards (hors user_id/card_id/is_foil/count/tags)."""
+    fields = {k: cleaned.get(k) for k in USER_CARD_FIELDS}
+    fields.update({k: cleaned.get(k, default()) for k, default in USER_CARD_DEFAULTS.items()})
+    # Recalcules plutot que copies : une carte du catalogue anterieure a ces champs en a aussi
+    fields.update(card_search_fields(cleaned))
+    return fields
+
+
+def import_entry_text(entry) -> str:
+    """Une entree d'import est soit une ligne brute, soit {"quantity", "name"} (format du front)."""
+    if isinstance(entry, dict):
+        return f"{entry.get('quantity', 1)} {entry.get('name', '')}"
+    return str(entry)
+
+
+class ImportSummary:
+    """
+    Resultat cumule d'un import, fenetre apres fenetre. Les lignes sont regroupees par carte
+    (et par foil) : la taille du resume depend du nombre de cartes distinctes, pas du nombre de lignes.
+    """
+
+    def __init__(self):
+        self.found = {}
+        self.not_found = {}
+        self.fuzzy_matches = {}
+        self.low_confidence = {}
+        self.identifiers = 0
+        self.local = 0
+        self.processed = 0
+        self.imported = 0
+
+    def to_state(self) -> dict:
+        """Etat serialisable (checkpoint d'un job d'import). Les cles sont stockees en paires :
+        un nom de carte peut contenir des points, interdits dans les cles de document."""
+        return {
+            "found": [[k[0], k[1], v] for k, v in self.found.items()],
+            "not_found": list(self.not_found.items()),
+            "fuzzy_matches": list(self.fuzzy_matches.items()),
+            "low_confidence": list(self.low_confidence.items()),
+            "identifiers": self.identifiers,
+            "local": self.local,
+            "processed": self.processed,
+            "imported": self.imported,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict = None):
+        summary = cls()
+        if state:
+            summary.found = {(card_id, is_foil): entry for card_id, is_foil, entry in state.get("found", [])}
+            summary.not_found = dict(state.get("not_found", []))
+            summary.fuzzy_matches = dict(state.get("fuzzy_matches", []))
+            summary.low_confidence = dict(state.get("low_confidence", []))
+            for field in ["identifiers", "local", "processed", "imported"]:
+                setattr(summary, field, state.get(field, 0))
+        return summary
+
+    @property
+    def local_hit_ratio(self) -> float:
+        return round(self.local / self.identifiers, 3) if self.identifiers else 0.0
+
+    def add_found(self, entry: dict, is_foil: bool):
+        key = (entry["id"], is_foil)
+        if key in self.found:
+            self.found[key]["quantity"] += entry["quantity"]
+        else:
+            self.found[key] = entry
+            self.imported += 1
+
+    def add_not_found(self, key: str, entry: dict):
+        if key in self.not_found:
+            self.not_found[key]["quantity"] += entry["quantity"]
+        else:
+            self.not_found[key] = entry
+
+    def merge(self, other: "ImportSummary"):
+        """Ajoute le resume d'une fenetre (bloc d'un job) au resume cumule."""
+        for (_, is_foil), entry in other.found.items():
+            self.add_found(dict(entry), is_foil)
+        for key, entry in other.not_found.items():
+            self.add_not_found(key, dict(entry))
+        for key, match in other.fuzzy_matches.items():
+            self.fuzzy_matches.setdefault(key, match)
+        for key, suggestion in other.low_confidence.items():
+            self.low_confidence.setdefault(key, suggestion)
+        for field in ["identifiers", "local", "processed"]:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+    def to_history(self, uid: str) -> dict:
+        cards_found = list(self.found.values())
+        cards_not_found = list(self.not_found.values())
+        total_found = len(cards_found)
+        total_missing = len(cards_not_found)
+
+        status = "success" if total_missing == 0 else "warning" if total_found > 0 else "error"
+
+        return {
+            "user_id": uid,
+            "type": "IMPORT",
+            "date": datetime.utcnow(),
+            "details": f"Importation terminee : {total_found} cartes trouvees, {total_missing} introuvables.",
+            "status": status,
+            "cards": cards_found + cards_not_found,
+            "local_hit_ratio": self.local_hit_ratio,
+            "fuzzy_matches": list(self.fuzzy_matches.values()),
+            "low_confidence": list(self.low_confidence.values())
+        }
+
+
+async def import_lines(lines: list, uid: str, user_rules: list, summary: ImportSummary, mark: tuple = None):
+    """Analyse puis importe une fenetre de lignes brutes ; toutes comptent dans la progression."""
+    parsed_entries = [p for p in parse_lines(map(import_entry_text, lines)) if p]
+    if parsed_entries:
+        await import_window(parsed_entries, uid, user_rules, summary, mark)
+    summary.processed += len(lines)
+
+
+async def import_window(parsed_entries: list, uid: str, user_rules: list, summary: ImportSummary, mark: tuple = None):
+    """
+    Resout puis ecrit une fenetre de lignes analysees (2 bulk_write au plus).
+    mark : (job_id, seq) du bloc d'un job d'import. Chaque ligne UserCards ecrite note le bloc
+    (import_marks.<job_id>) dans la meme ecriture que son increment, et les lignes qui portent
+    deja ce bloc (ou un suivant) sont exclues : un bloc rejoue apres un crash n'ajoute pas ses
+    quantites une seconde fois.
+    """
+    identifiers_to_fetch = []
+    quantity_map = {}
+
+    for p in parsed_entries:
+        is_foil = p.get("is_foil", False)
+
+        if p["set"] and p["collector_number"]:
+            ident = {"set": p["set"], "collector_number": p["collector_number"]}
+        else:
+            ident = {"name": p["name"]}
+        identifiers_to_fetch.append(ident)
+
+        # Chaque ligne garde la cle de son identifiant : deux lignes qui designent la meme
+        # impression (set/numero et nom, nom d'une face...) sont ecrites toutes les deux
+        key = (identifier_key(ident), is_foil)
+        if key in quantity_map:
+            quantity_map[key]["quantity"] += p["qty"]
+        else:
+            quantity_map[key] = {"quantity": p["qty"], "name": p["name"], "is_foil": is_foil}
+
+    # Catalogue local d'abord, Scryfall uniquement pour les cartes inconnues
+    resolved, resolve_stats = await resolve_identifiers(identifiers_to_fetch)
+    summary.identifiers += resolve_stats["identifiers"]
+    summary.local += resolve_stats["local"]
+
+    # Noms corriges par le matcher approximatif : affiches sous le nom canonique
+    for match in resolve_stats["fuzzy_matches"]:
+        summary.fuzzy_matches.setdefault(match["query"].lower(), match)
+        for is_foil_check in [True, False]:
+            info = quantity_map.get((identifier_key({"name": match["query"]}), is_foil_check))
+            if info and info["name"] != match["name"]:
+                info["corrected_from"] = info["name"]
+                info["name"] = match["name"]
+
+    # Quantites regroupees par (carte, foil) : un seul upsert par ligne UserCards
+    per_card = {}
+    for (key, is_foil_check), info in list(quantity_map.items()):
+        cleaned = resolved.get(key)
+        if cleaned is None:
+            continue
+        del quantity_map[(key, is_foil_check)]
+        if info["quantity"] <= 0:
+            continue
+        entry = per_card.get((cleaned["id"], is_foil_check))
+        if entry is None:
+            per_card[(cleaned["id"], is_foil_check)] = {"card": cleaned, **info}
+        else:
+            entry["quantity"] += info["quantity"]
+
+    card_ops = {}
+    user_card_ops = []
+    window_found = []
+    auto_tags_by_card = {}
+
+    for (card_id, is_foil_check), info in per_card.items():
+        cleaned = info["card"]
+        if card_id not in card_ops:
+            auto_tags_by_card[card_id] = get_automated_tags(cleaned, user_rules)
+            card_doc = with_content_hash({k: v for k, v in cleaned.items() if k != "owners"})
+            card_ops[card_id] = UpdateOne(
+                {"id": card_id},
+                {"$setOnInsert": card_doc, "$addToSet": {"owners": uid}},
+                upsert=True
+            )
+
+        qty = info["quantity"]
+        display_name = info["name"]
+
+        # Upsert sur l'index unique user_card_foil_unique : increment si la ligne existe,
+        # creation complete sinon
+        row_filter = {"user_id": uid, "card_id": card_id, "is_foil": is_foil_check}
+        row_update = {
+            "$inc": {"count": qty},
+            "$addToSet": {"tags": {"$each": auto_tags_by_card[card_id]}},
+            "$setOnInsert": build_user_card_fields(cleaned)
+        }
+        if mark:
+            job_id, seq = mark
+            row_filter[import_mark_field(job_id)] = {"$not": {"$gte": seq}}
+            row_update["$set"] = {import_mark_field(job_id): seq}
+        user_card_ops.append(UpdateOne(row_filter, row_update, upsert=True))
+
+        found_entry = {
+            "id": str(card_id),
+            "name": f"{display_name} (Foil)" if is_foil_check else display_name,
+            "found": True,
+            "quantity": qty
+        }
+        if info.get("corrected_from"):
+            found_entry["corrected_from"] = info["corrected_from"]
+        window_found.append((found_entry, is_foil_check))
+
+    if card_ops:
+        result = await async_cards_collection.bulk_write(list(card_ops.values()), ordered=False)
+        if result.upserted_count:
+            # Nouvelles cartes dans le catalogue : le matcher approximatif doit les connaitre
+            invalidate_matcher()
+    if user_card_ops:
+        await bulk_upsert(async_user_cards_collection, user_card_ops, guarded=bool(mark))
+        await bump_collection_version(uid)
+
+    # Le resume n'avance qu'une fois les ecritures de la fenetre confirmees
+    for found_entry, is_foil_check in window_found:
+        summary.add_found(found_entry, is_foil_check)
+
+    # Correspondances trop incertaines pour etre appliquees : signalees plutot qu'ignorees
+    suggestions = {s["query"].lower(): s for s in resolve_stats["low_confidence"]}
+    for (key, is_foil_check), info in quantity_map.items():
+        is_foil_tag = " (Foil)" if info.get("is_foil") else ""
+        missing_entry = {
+            "id": "unknown",
+            "name": f"{info['name']}{is_foil_tag}",
+            "found": False,
+            "quantity": info["quantity"]
+        }
+        suggestion = suggestions.get(str(info["name"]).lower())
+        if suggestion:
+            missing_entry["suggestion"] = suggestion["name"]
+            missing_entry["confidence"] = suggestion["confidence"]
+            summary.low_confidence.setdefault(suggestion["query"].lower(), suggestion)
+        summary.add_not_found(f"{key}{'_foil' if is_foil_check else '_normal'}", missing_entry)
@@ -0,0 +1,517 @@
+from database import async_import_jobs_collection, async_import_job_chunks_collection, async_history_collection, async_user_cards_collection
+from utils.import_engine import ImportSummary, import_lines, import_entry_text, import_mark_field
+from utils.tags_engine import load_user_rules
+from utils import import_engine
+from pymongo import ReturnDocument
+from collections import Counter
+from datetime import datetime, timedelta
+from uuid import uuid4
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+
+logger = logging.getLogger("import_jobs")
+
+# Un worker qui ne renouvelle plus son bail (crash, arret brutal) perd son job au bout de ce delai
+LEASE_SECONDS = int(os.getenv("IMPORT_LEASE_SECONDS", "60"))
+POLL_SECONDS = float(os.getenv("IMPORT_POLL_SECONDS", "1.0"))
+# Au-dela, le job est considere comme empoisonne (il fait tomber le worker a chaque reprise)
+MAX_ATTEMPTS = 3
+
+# Ordonnancement, tous workers confondus : imports traites en meme temps (au total et par
+# utilisateur), et nombre de blocs traites par tour avant que le job ne repasse en fin de file
+# (un gros import avance par tranches, les petits ne restent pas bloques derriere lui)
+MAX_ACTIVE_JOBS = int(os.getenv("IMPORT_MAX_ACTIVE_JOBS", "4"))
+MAX_ACTIVE_JOBS_PER_USER = int(os.getenv("IMPORT_MAX_ACTIVE_JOBS_PER_USER", "1"))
+SLICE_CHUNKS = int(os.getenv("IMPORT_SLICE_CHUNKS", "10"))
+# Nombre de jobs en attente examines a chaque prise (les premiers de la file)
+CLAIM_SCAN_LIMIT = 50
+
+# Flux de progression (SSE) : relecture du job a cet intervalle quand aucun evenement local
+# n'arrive (job traite par un autre processus), et commentaire de maintien de connexion
+EVENTS_POLL_SECONDS = float(os.getenv("IMPORT_EVENTS_POLL_SECONDS", "1.0"))
+EVENTS_HEARTBEAT_SECONDS = 15
+FINAL_STATUSES = ["completed", "error"]
+# Un contenu deja importe (ou en cours d'import) n'est pas rejoue sans confirmation
+DUPLICATE_STATUSES = ["queued", "processing", "completed"]
+
+# Reveille le worker du processus courant des qu'un job est cree (sinon : scrutation)
+_wake = None
+# Abonnes locaux a la progression d'un job : {job_id: {(boucle, file)}}
+_listeners = {}
+
+
+def wake_worker():
+    if _wake is not None:
+        _wake.set()
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:6]}"
+
+
+class ImportFingerprint:
+    """
+    Empreinte normalisee du contenu d'un import : chaque ligne est ramenee a une forme canonique
+    (espaces reduits, casse ignoree) puis hachee, et les hachages sont additionnes modulo 2^256.
+    Le resultat ne depend ni de l'ordre des lignes ni des lignes vides, et se calcule au fil
+    de l'upload sans garder le fichier en memoire.
+    """
+
+    MODULUS = 2 ** 256
+
+    def __init__(self):
+        self.lines = 0
+        self.total = 0
+
+    def update(self, entry):
+        line = " ".join(import_entry_text(entry).split()).casefold()
+        if not line:
+            return
+        self.lines += 1
+        digest = hashlib.sha256(line.encode("utf-8")).digest()
+        self.total = (self.total + int.from_bytes(digest, "big")) % self.MODULUS
+
+    def hexdigest(self) -> str:
+        return f"{self.lines}:{self.total:064x}"
+
+
+def job_progress(job: dict) -> dict:
+    """Vue publique d'un job, renvoyee par /usercards/import/progress."""
+    if not job:
+        return {"status": "idle", "processed": 0, "total": 0}
+    progress = {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "total": job.get("total", 0),
+        "processed": job.get("processed", 0),
+        "imported": job.get("imported", 0),
+        "not_found": job.get("not_found", 0),
+        "local_hit_ratio": job.get("local_hit_ratio", 0.0),
+    }
+    if job.get("error"):
+        progress["error"] = job["error"]
+    if job.get("history_id"):
+        progress["history_id"] = job["history_id"]
+    return progress
+
+
+def subscribe(job_id: str) -> asyncio.Queue:
+    queue = asyncio.Queue()
+    _listeners.setdefault(job_id, set()).add((asyncio.get_running_loop(), queue))
+    return queue
+
+
+def unsubscribe(job_id: str, queue: asyncio.Queue):
+    listeners = _listeners.get(job_id, set())
+    listeners.difference_update({entry for entry in listeners if entry[1] is queue})
+    if not listeners:
+        _listeners.pop(job_id, None)
+
+
+def publish(job: dict, fields: dict):
+    """Pousse le nouvel etat d'un job aux flux SSE ouverts dans ce processus."""
+    listeners = _listeners.get(job["_id"])
+    if not listeners:
+        return
+    progress = job_progress({**job, **fields})
+    for loop, queue in list(listeners):
+        loop.call_soon_threadsafe(queue.put_nowait, progress)
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def progress_events(job_id: str):
+    """
+    Flux Server-Sent Events d'un job : un evenement "progress" a chaque bloc traite
+    (valeurs cumulees + deltas depuis l'evenement precedent), puis un "summary" final.
+    Les etats sont pousses par le worker local ; a defaut (worker d'un autre processus),
+    le job est relu dans import_jobs toutes les EVENTS_POLL_SECONDS.
+    """
+    queue = subscribe(job_id)
+    try:
+        state = await job_status(await async_import_jobs_collection.find_one({"_id": job_id}))
+        last = None
+        idle = 0.0
+        while True:
+            if state != last:
+                event = {**state, "delta": {
+                    key: state.get(key, 0) - (last or {}).get(key, 0) for key in ["processed", "imported", "not_found"]
+                }}
+                yield format_sse("progress", event)
+                last = state
+                idle = 0.0
+
+            if state["status"] in FINAL_STATUSES or state["status"] == "idle":
+                yield format_sse("summary", state)
+                return
+
+            try:
+                state = await asyncio.wait_for(queue.get(), timeout=EVENTS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                state = await job_status(await async_import_jobs_collection.find_one({"_id": job_id}))
+                idle += EVENTS_POLL_SECONDS
+                if idle >= EVENTS_HEARTBEAT_SECONDS:
+                    yield ": ping\n\n"
+                    idle = 0.0
+    finally:
+        unsubscribe(job_id, queue)
+
+
+async def get_user_job(uid: str, job_id: str = None):
+    query = {"user_id": uid}
+    if job_id:
+        query["_id"] = job_id
+    jobs = await async_import_jobs_collection.find(query).sort("created_at", -1).limit(1).to_list(None)
+    return jobs[0] if jobs else None
+
+
+async def queue_position(job: dict) -> int:
+    """Rang d'un job en attente dans la file (1 = prochain servi), dans l'ordre de claim_job."""
+    scheduled_at = job.get("scheduled_at") or job.get("created_at")
+    ahead = await async_import_jobs_collection.count_documents({"status": "queued", "$or": [
+        {"scheduled_at": {"$lt": scheduled_at}},
+        {"scheduled_at": scheduled_at, "created_at": {"$lt": job.get("created_at")}}
+    ]})
+    return ahead + 1
+
+
+async def job_status(job: dict) -> dict:
+    """job_progress, avec la position dans la file tant que le job attend son tour."""
+    progress = job_progress(job)
+    if progress["status"] == "queued":
+        progress["queue_position"] = await queue_position(job)
+    return progress
+
+
+async def find_duplicate(uid: str, fingerprint: str):
+    """Dernier job de l'utilisateur au contenu identique, termine ou encore dans la file."""
+    jobs = await async_import_jobs_collection.find(
+        {"user_id": uid, "fingerprint": fingerprint, "status": {"$in": DUPLICATE_STATUSES}}
+    ).sort("created_at", -1).limit(1).to_list(None)
+    return jobs[0] if jobs else None
+
+
+async def create_job(uid: str, lines, force: bool = False) -> dict:
+    """
+    Enregistre un import : les lignes non vides (iterable synchrone ou asynchrone) sont stockees
+    par blocs de IMPORT_WRITE_WINDOW dans import_job_chunks, puis le job passe en "queued".
+    Un bloc = une fenetre de traitement = un point de reprise.
+    Si le meme contenu a deja ete importe (meme empreinte) et que force n'est pas demande,
+    aucun job n'est cree : le job precedent est renvoye avec "duplicate": True.
+    """
+    fingerprint = ImportFingerprint()
+    streamed = not isinstance(lines, list)
+    if not streamed:
+        # Contenu deja en memoire (import JSON) : le doublon est detecte avant toute ecriture
+        for line in lines:
+            fingerprint.update(line)
+        previous = None if force else await find_duplicate(uid, fingerprint.hexdigest())
+        if previous:
+            return {**previous, "duplicate": True}
+
+    now = datetime.utcnow()
+    job = {
+        "_id": uuid4().hex,
+        "user_id": uid,
+        "status": "uploading",
+        "total": 0,
+        "processed": 0,
+        "imported": 0,
+        "chunks": 0,
+        "next_chunk": 0,
+        "attempts": 0,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "scheduled_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+    await async_import_jobs_collection.insert_one(job)
+
+    buffer = []
+
+    async def store_chunk():
+        await async_import_job_chunks_collection.insert_one({"job_id": job["_id"], "seq": job["chunks"], "lines": list(buffer)})
+        job["chunks"] += 1
+        buffer.clear()
+
+    async def add(line):
+        line = str(line).strip() if not isinstance(line, dict) else line
+        if not line:
+            return
+        buffer.append(line)
+        job["total"] += 1
+        if streamed:
+            fingerprint.update(line)
+        if len(buffer) >= import_engine.IMPORT_WRITE_WINDOW:
+            await store_chunk()
+
+    try:
+        if hasattr(lines, "__aiter__"):
+            async for line in lines:
+                await add(line)
+        else:
+            for line in lines:
+                await add(line)
+        if buffer:
+            await store_chunk()
+    except BaseException:
+        await delete_job(job["_id"])
+        raise
+
+    job["fingerprint"] = fingerprint.hexdigest()
+    if streamed and not force:
+        # Fichier recu en flux : l'empreinte n'est connue qu'a la fin de l'envoi
+        previous = await find_duplicate(uid, job["fingerprint"])
+        if previous:
+            await delete_job(job["_id"])
+            return {**previous, "duplicate": True}
+
+    await async_import_jobs_collection.update_one(
+        {"_id": job["_id"]},
+        {"$set": {"status": "queued", "total": job["total"], "chunks": job["chunks"], "fingerprint": job["fingerprint"], "updated_at": datetime.utcnow()}}
+    )
+    wake_worker()
+    job["status"] = "queued"
+    return job
+
+
+async def delete_job(job_id: str):
+    await async_import_job_chunks_collection.delete_many({"job_id": job_id})
+    await async_import_jobs_collection.delete_one({"_id": job_id})
+
+
+def _claimable(now: datetime) -> dict:
+    return {"$or": [
+        {"status": "queued"},
+        {"status": "processing", "lease_expires_at": {"$lt": now}}
+    ]}
+
+
+async def _active_jobs(now: datetime) -> list:
+    """Jobs en cours dont le bail est valide, dans l'ordre ou ils ont ete pris."""
+    return await async_import_jobs_collection.find(
+        {"status": "processing", "lease_expires_at": {"$gte": now}},
+        {"user_id": 1, "claimed_at": 1}
+    ).sort([("claimed_at", 1), ("_id", 1)]).to_list(None)
+
+
+async def _within_limits(job: dict) -> bool:
+    """
+    Verification apres la prise : deux workers peuvent avoir vu une place libre en meme temps.
+    Les premiers a avoir pris un job gardent leur place, les suivants rendent le leur.
+    """
+    active = await _active_jobs(datetime.utcnow())
+    ids = [j["_id"] for j in active]
+    if job["_id"] not in ids:
+        return False
+    user_ids = [j["_id"] for j in active if j["user_id"] == job["user_id"]]
+    return ids.index(job["_id"]) < MAX_ACTIVE_JOBS and user_ids.index(job["_id"]) < MAX_ACTIVE_JOBS_PER_USER
+
+
+async def claim_job(worker_id: str):
+    """
+    Prend le prochain job a servir : le premier de la file (scheduled_at, puis created_at) dont
+    l'utilisateur n'a pas deja MAX_ACTIVE_JOBS_PER_USER imports en cours, dans la limite de
+    MAX_ACTIVE_JOBS imports en cours au total. Un job dont le bail a expire (worker mort) est
+    repris a sa place dans la file.
+    """
+    now = datetime.utcnow()
+    active = await _active_jobs(now)
+    if len(active) >= MAX_ACTIVE_JOBS:
+        return None
+    busy = Counter(j["user_id"] for j in active)
+
+    candidates = await async_import_jobs_collection.find(
+        _claimable(now), {"user_id": 1}
+    ).sort([("scheduled_at", 1), ("created_at", 1)]).limit(CLAIM_SCAN_LIMIT).to_list(None)
+
+    for candidate in candidates:
+        if busy[candidate["user_id"]] >= MAX_ACTIVE_JOBS_PER_USER:
+            continue
+        job = await async_import_jobs_collection.find_one_and_update(
+            {"_id": candidate["_id"], **_claimable(now)},
+            {
+                "$set": {"status": "processing", "lease_owner": worker_id, "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS), "claimed_at": now, "updated_at": now},
+                "$inc": {"attempts": 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            # Pris entre-temps par un autre worker
+            continue
+        if await _within_limits(job):
+            return job
+        # Limite depassee par une prise concurrente : le job retourne a sa place dans la file
+        await async_import_jobs_collection.update_one(
+            {"_id": job["_id"], "lease_owner": worker_id},
+            {"$set": {"status": "queued", "lease_owner": None, "lease_expires_at": None}, "$inc": {"attempts": -1}}
+        )
+        return None
+    return None
+
+
+async def _finish(job: dict, worker_id: str, update: dict):
+    """Mise a jour finale, uniquement si le worker detient encore le bail."""
+    update = {**update, "lease_owner": None, "lease_expires_at": None, "updated_at": datetime.utcnow()}
+    res = await async_import_jobs_collection.update_one({"_id": job["_id"], "lease_owner": worker_id}, {"$set": update})
+    if res.matched_count == 1:
+        publish(job, update)
+    return res.matched_count == 1
+
+
+async def _end_turn(job: dict, worker_id: str):
+    """
+    Fin de tranche : le job retourne dans la file avec son point de reprise, et l'utilisateur
+    repasse derriere les autres avec tous ses imports en attente (tourniquet entre utilisateurs).
+    Le job a avance : ses tentatives sont remises a zero.
+    """
+    now = datetime.utcnow()
+    if await _finish(job, worker_id, {"status": "queued", "attempts": 0, "scheduled_at": now}):
+        await async_import_jobs_collection.update_many(
+            {"user_id": job["user_id"], "status": "queued"},
+            {"$max": {"scheduled_at": now}}
+        )
+
+
+async def clear_import_marks(job: dict):
+    """Job termine : plus de reprise possible, les marques de bloc sont retirees de UserCards."""
+    field = import_mark_field(job["_id"])
+    await async_user_cards_collection.update_many({"user_id": job["user_id"], field: {"$exists": True}}, {"$unset": {field: ""}})
+
+
+async def load_summary(job: dict) -> ImportSummary:
+    """
+    Resume cumule des blocs deja traites (seq < next_chunk) : somme des resumes stockes sur
+    chaque bloc, lus par pages de SLICE_CHUNKS. Un job enregistre avant ce format garde son
+    resume cumule dans job["summary"], ses blocs suivants y sont ajoutes.
+    """
+    summary = ImportSummary.from_state(job.get("summary"))
+    next_chunk = job.get("next_chunk", 0)
+    for start in range(0, next_chunk, SLICE_CHUNKS):
+        chunks = await async_import_job_chunks_collection.find(
+            {"job_id": job["_id"], "seq": {"$gte": start, "$lt": min(start + SLICE_CHUNKS, next_chunk)}, "summary": {"$exists": True}},
+            {"summary": 1}
+        ).sort("seq", 1).to_list(None)
+        for chunk in chunks:
+            summary.merge(ImportSummary.from_state(chunk["summary"]))
+    return summary
+
+
+async def process_job(job: dict, worker_id: str, stop_event: asyncio.Event = None):
+    """
+    Traite une tranche de SLICE_CHUNKS blocs d'un job a partir de son dernier point de reprise
+    (next_chunk) ; s'il en reste, le job repasse dans la file pour laisser la place aux autres.
+    Apres chaque bloc, le resume de ce bloc est enregistre sur le bloc lui-meme, puis les
+    compteurs et le point de reprise sur le job, et le bail est prolonge : chaque checkpoint
+    a la taille d'une fenetre, pas celle de l'import. En cas de crash, un autre worker reprend
+    au bloc suivant le dernier checkpoint : seul le bloc en cours au moment du crash peut etre
+    rejoue. Ses ecritures UserCards sont marquees par bloc (import_engine.import_window) : les
+    lignes deja ecrites ne sont pas incrementees une seconde fois, et son resume est reecrit.
+    """
+    job_id = job["_id"]
+    uid = job["user_id"]
+
+    if job.get("attempts", 0) > MAX_ATTEMPTS:
+        if await _finish(job, worker_id, {"status": "error", "error": "Import abandonne apres plusieurs tentatives."}):
+            await clear_import_marks(job)
+        return
+
+    try:
+        summary = await load_summary(job)
+        user_rules = await load_user_rules(uid)
+
+        first_chunk = job.get("next_chunk", 0)
+        for seq in range(first_chunk, job.get("chunks", 0)):
+            if stop_event is not None and stop_event.is_set():
+                # Arret propre : le job retourne dans la file, repris tel quel par un autre worker
+                await _finish(job, worker_id, {"status": "queued"})
+                return
+            if seq - first_chunk >= SLICE_CHUNKS:
+                await _end_turn(job, worker_id)
+                return
+
+            chunk = await async_import_job_chunks_collection.find_one({"job_id": job_id, "seq": seq})
+            window = ImportSummary()
+            await import_lines(chunk["lines"] if chunk else [], uid, user_rules, window, mark=(job_id, seq))
+            await async_import_job_chunks_collection.update_one(
+                {"job_id": job_id, "seq": seq}, {"$set": {"summary": window.to_state()}}
+            )
+            summary.merge(window)
+
+            now = datetime.utcnow()
+            checkpoint = {
+                "next_chunk": seq + 1,
+                "processed": summary.processed,
+                "imported": summary.imported,
+                "not_found": len(summary.not_found),
+                "local_hit_ratio": summary.local_hit_ratio,
+                "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+                "updated_at": now
+            }
+            res = await async_import_jobs_collection.update_one(
+                {"_id": job_id, "lease_owner": worker_id},
+                {"$set": checkpoint}
+            )
+            if res.matched_count == 0:
+                logger.warning(f"Job {job_id} : bail perdu, abandon par {worker_id}")
+                return
+            job.update(checkpoint)
+            publish(job, {})
+
+        # Une seule entree d'historique par job, meme si la fin est rejouee
+        history_entry = summary.to_history(uid)
+        history_entry["job_id"] = job_id
+        history_entry["fingerprint"] = job.get("fingerprint")
+        res = await async_history_collection.update_one({"job_id": job_id}, {"$setOnInsert": history_entry}, upsert=True)
+        history_id = res.upserted_id or (await async_history_collection.find_one({"job_id": job_id}, {"_id": 1}))["_id"]
+
+        final = {
+            "status": "completed",
+            "processed": summary.processed,
+            "imported": summary.imported,
+            "not_found": len(summary.not_found),
+            "local_hit_ratio": summary.local_hit_ratio,
+            "history_id": str(history_id)
+        }
+        if await _finish(job, worker_id, final):
+            await async_import_job_chunks_collection.delete_many({"job_id": job_id})
+            await clear_import_marks(job)
+
+    except Exception as e:
+        logger.error(f"Crash Import (job {job_id}): {e}")
+        if await _finish(job, worker_id, {"status": "error", "error": str(e)}):
+            await clear_import_marks(job)
+
+
+async def run_worker(stop_event: asyncio.Event, worker_id: str = None):
+    """Boucle d'un worker : prend un job, le traite, recommence ; attend quand la file est vide."""
+    global _wake
+    worker_id = worker_id or new_worker_id()
+    _wake = asyncio.Event()
+    logger.info(f"Worker d'import {worker_id} demarre")
+
+    while not stop_event.is_set():
+        try:
+            job = await claim_job(worker_id)
+        except Exception as e:
+            logger.error(f"Worker d'import : lecture de la file impossible ({e})")
+            job = None
+
+        if job:
+            await process_job(job, worker_id, stop_event)
+            continue
+
+        _wake.clear()
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    logger.info(f"Worker d'import {worker_id} arrete")
@@ -1,5 +1,19 @@
 import re
 
+# Grammaire compilee une seule fois (au lieu de re.match/re.sub avec motif texte a chaque ligne)
+_PREFIX_SB = re.compile(r"SB:\s+", re.IGNORECASE)
+_PREFIX_CMDR = re.compile(r"CMDR:\s+", re.IGNORECASE)
+_ZONE_SUFFIX = re.compile(r"\s*\((?:Principal|Mainboard|Sideboard|Reserve|CMDR|Commander)\)$", re.IGNORECASE)
+_FOIL_MARKER = re.compile(r"\*[FE]\*$", re.IGNORECASE)
+_FOIL_WORD = re.compile(r"\bFoil\b", re.IGNORECASE)
+_PATTERN_FULL = re.compile(r"(\d+)[xX]?\s+(.+?)\s+[\(\[]([a-zA-Z0-9]{2,5})[\)\]](?:\s+(\d+[a-zA-Z]*))?$")
+_PATTERN_SIMPLE = re.compile(r"(\d+)[xX]?\s+(.+)$")
+
+# En dessous, lancer des processus coute plus cher que d'analyser les lignes sur place
+MULTIPROCESS_MIN_LINES = 50000
+MULTIPROCESS_CHUNK_SIZE = 5000
+
+
 def parse_mtg_line(line: str):
     """
     Analyse une ligne de texte de decklist MTG et extrait les informations.
@@ -13,53 +27,81 @@ def parse_mtg_line(line: str):
     is_sideboard = False
     is_commander = False
 
+    # Un seul passage sur la ligne en minuscules decide quels motifs ont une chance de s'appliquer
+    lowered = line.lower()
+    if not lowered.isascii():
+        # re.IGNORECASE rapproche aussi "ſ" de "s" et "ı" de "i", ce que lower() ne fait pas
+        lowered = lowered.replace("\u017f", "s").replace("\u0131", "i")
+
     # 1. Detection Sideboard / Commander en debut de ligne
-    if re.match(r"^SB:\s+", line, flags=re.IGNORECASE):
-        is_sideboard = True
-        line = re.sub(r"^SB:\s+", "", line, flags=re.IGNORECASE).strip()
-    elif re.match(r"^CMDR:\s+", line, flags=re.IGNORECASE):
-        is_commander = True
-        line = re.sub(r"^CMDR:\s+", "", line, flags=re.IGNORECASE).strip()
+    if lowered.startswith("sb:"):
+        prefix = _PREFIX_SB.match(line)
+        if prefix:
+            is_sideboard = True
+            line = line[prefix.end():].strip()
+    elif lowered.startswith("cmdr:"):
+        prefix = _PREFIX_CMDR.match(line)
+        if prefix:
+            is_commander = True
+            line = line[prefix.end():].strip()
 
-    # 2. NOUVEAU : Nettoyage des balises de zone en fin de ligne (ex: "(Principal)", "(Sideboard)")
+    # 2. Nettoyage des balises de zone en fin de ligne (ex: "(Principal)", "(Sideboard)")
     # Cela permet d'importer proprement les listes exportées depuis notre propre app ou Arena
-    line = re.sub(r"\s*\((?:Principal|Mainboard|Sideboard|Reserve|CMDR|Commander)\)$", "", line, flags=re.IGNORECASE).strip()
+    if line.endswith(")"):
+        line = _ZONE_SUFFIX.sub("", line).strip()
 
     # 3. Detection Foil
-    if re.search(r"\*[FE]\*$", line, flags=re.IGNORECASE) or re.search(r"\bFoil\b", line, flags=re.IGNORECASE):
-        is_foil = True
-        line = re.sub(r"\*[FE]\*$", "", line, flags=re.IGNORECASE).strip()
-        line = re.sub(r"\bFoil\b", "", line, flags=re.IGNORECASE).strip()
+    if line.endswith("*") or "foil" in lowered:
+        if _FOIL_MARKER.search(line) or _FOIL_WORD.search(line):
+            is_foil = True
+            line = _FOIL_MARKER.sub("", line).strip()
+            line = _FOIL_WORD.sub("", line).strip()
 
     # 4. Regex complete: "4x Lightning Bolt (LEA) 234" ou "1 Black Lotus [M14]"
-    pattern_full = r"^(\d+)[xX]?\s+(.+?)\s+[\(\[]([a-zA-Z0-9]{2,5})[\)\]](?:\s+(\d+[a-zA-Z]*))?$"
-    match_full = re.match(pattern_full, line)
-    
-    if match_full:
-        return {
-            "qty": int(match_full.group(1)),
-            "name": match_full.group(2).strip(),
-            "set": match_full.group(3).lower(),
-            "collector_number": match_full.group(4) if match_full.group(4) else None,
-            "is_foil": is_foil,
-            "is_sideboard": is_sideboard,
-            "is_commander": is_commander
-        }
-        
     # 5. Regex simple: "4x Lightning Bolt" ou "4 Lightning Bolt"
-    pattern_simple = r"^(\d+)[xX]?\s+(.+)$"
-    match_simple = re.match(pattern_simple, line)
-    
-    if match_simple:
-        return {
-            "qty": int(match_simple.group(1)),
-            "name": match_simple.group(2).strip(),
-            "set": None,
-            "collector_number": None,
-            "is_foil": is_foil,
-            "is_sideboard": is_sideboard,
-            "is_commander": is_commander
-        }
+    # Toutes deux exigent un chiffre en tete ; la complete exige une parenthese ou un crochet.
+    if line[:1].isdigit():
+        match_full = _PATTERN_FULL.match(line) if ("(" in line or "[" in line) else None
+        if match_full:
+            qty_text, name, set_code, collector_number = match_full.groups()
+            return {
+                "qty": int(qty_text),
+                "name": name.strip(),
+                "set": set_code.lower(),
+                "collector_number": collector_number or None,
+                "is_foil": is_foil,
+                "is_sideboard": is_sideboard,
+                "is_commander": is_commander
+            }
+
+        # Cas le plus frequent ("4 Lightning Bolt", "4x Lightning Bolt") decoupe sans regex ;
+        # tout ce qui sort de cette forme (tabulation, saut de ligne...) passe par le motif simple.
+        qty_text, sep, rest = line.partition(" ")
+        if qty_text[-1] in "xX":
+            qty_text = qty_text[:-1]
+        if sep and qty_text.isdecimal() and "\n" not in rest:
+            return {
+                "qty": int(qty_text),
+                "name": rest.strip(),
+                "set": None,
+                "collector_number": None,
+                "is_foil": is_foil,
+                "is_sideboard": is_sideboard,
+                "is_commander": is_commander
+            }
+
+        match_simple = _PATTERN_SIMPLE.match(line)
+        if match_simple:
+            qty_text, name = match_simple.groups()
+            return {
+                "qty": int(qty_text),
+                "name": name.strip(),
+                "set": None,
+                "collector_number": None,
+                "is_foil": is_foil,
+                "is_sideboard": is_sideboard,
+                "is_commander": is_commander
+            }
 
     # 6. Cas final: Aucun chiffre (ex: "Black Lotus")
     return {
@@ -70,4 +112,18 @@ def parse_mtg_line(line: str):
         "is_foil": is_foil,
         "is_sideboard": is_sideboard,
         "is_commander": is_commander
-    }
\ No newline at end of file
+    }
+
+
+def parse_lines(lines, processes: int = None):
+    """
+    Version par lot de parse_mtg_line : renvoie, dans l'ordre, le resultat de chaque ligne
+    (None pour les lignes vides). Avec processes > 1 et au moins MULTIPROCESS_MIN_LINES lignes,
+    l'analyse est repartie sur un pool de processus.
+    """
+    lines = lines if isinstance(lines, list) else list(lines)
+    if processes and processes > 1 and len(lines) >= MULTIPROCESS_MIN_LINES:
+        from multiprocessing import Pool
+        with Pool(processes) as pool:
+            return pool.map(parse_mtg_line, lines, chunksize=MULTIPROCESS_CHUNK_SIZE)
+    return [parse_mtg_line(line) for line in lines]
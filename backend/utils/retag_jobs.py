@@ -0,0 +1,240 @@
+from database import async_retag_jobs_collection
+from utils.import_jobs import new_worker_id
+from utils.tags_engine import retag_collection
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger("retag_jobs")
+
+# Re-tag de la collection apres modification des regles (tags_routes) : un job par utilisateur
+# (_id = user_id) dans retag_jobs. Chaque modification ajoute ses tags a pending_tags et
+# reporte le depart de RETAG_DELAY_SECONDS : des modifications rapprochees ne donnent qu'une
+# passe, qui couvre tous les tags touches. Pendant une passe, les nouvelles modifications
+# attendent dans pending_tags et le job repasse dans la file des qu'elle se termine.
+RETAG_DELAY_SECONDS = float(os.getenv("RETAG_DELAY_SECONDS", "2.0"))
+LEASE_SECONDS = int(os.getenv("RETAG_LEASE_SECONDS", "60"))
+POLL_SECONDS = float(os.getenv("RETAG_POLL_SECONDS", "1.0"))
+# Au-dela, la passe est abandonnee (elle echoue ou fait tomber le worker a chaque reprise)
+MAX_ATTEMPTS = 3
+# Passe en erreur : nouvel essai apres RETRY_SECONDS, delai double a chaque tentative
+RETRY_SECONDS = float(os.getenv("RETAG_RETRY_SECONDS", "5.0"))
+
+# Reveille le worker du processus courant des qu'une passe est demandee (sinon : scrutation)
+_wake = None
+
+
+def wake_retag_worker():
+    if _wake is not None:
+        _wake.set()
+
+
+def job_progress(job: dict) -> dict:
+    """Vue publique du job de re-tag d'un utilisateur, renvoyee par /tags/retag/progress."""
+    if not job:
+        return {"status": "idle", "processed": 0, "total": 0}
+    progress = {
+        "status": job["status"],
+        "tags": job.get("tags", []),
+        "pending_tags": job.get("pending_tags", []),
+        "total": job.get("total", 0),
+        "processed": job.get("processed", 0),
+        "modified": job.get("modified", 0),
+        "modes": job.get("modes", {}),
+    }
+    if job.get("scheduled_at") and job["status"] == "queued":
+        progress["scheduled_at"] = job["scheduled_at"].isoformat()
+    if job.get("error"):
+        progress["error"] = job["error"]
+    return progress
+
+
+async def get_retag_job(user_id: str):
+    return await async_retag_jobs_collection.find_one({"_id": str(user_id)})
+
+
+async def request_retag(user_id: str, tag_names) -> dict:
+    """Demande le recalcul de tag_names sur la collection ; renvoie l'etat du job de l'utilisateur."""
+    uid = str(user_id)
+    tags = list(dict.fromkeys(t.strip().lower() for t in tag_names if t and t.strip()))
+    while True:
+        now = datetime.utcnow()
+        try:
+            # Pas de passe en cours : job (re)programme, depart reporte a chaque modification
+            job = await async_retag_jobs_collection.find_one_and_update(
+                {"_id": uid, "status": {"$ne": "processing"}},
+                {
+                    "$set": {"status": "queued", "requested_at": now, "scheduled_at": now + timedelta(seconds=RETAG_DELAY_SECONDS), "updated_at": now},
+                    "$addToSet": {"pending_tags": {"$each": tags}},
+                    "$unset": {"error": ""}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Passe en cours : les tags attendent sa fin
+            job = await async_retag_jobs_collection.find_one_and_update(
+                {"_id": uid, "status": "processing"},
+                {"$set": {"requested_at": now}, "$addToSet": {"pending_tags": {"$each": tags}}},
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                # Passe terminee entre les deux requetes : on reprogramme
+                continue
+        break
+    wake_retag_worker()
+    return job_progress(job)
+
+
+def _claimable(now: datetime) -> dict:
+    return {"$or": [
+        {"status": "queued", "scheduled_at": {"$lte": now}},
+        {"status": "processing", "lease_expires_at": {"$lt": now}}
+    ]}
+
+
+async def claim_retag_job(worker_id: str):
+    """
+    Prend le prochain job dont le delai de regroupement est ecoule (ou dont le worker a perdu
+    son bail). Les tags en attente passent dans tags, ceux d'une passe interrompue y restent.
+    """
+    now = datetime.utcnow()
+    job = await async_retag_jobs_collection.find_one_and_update(
+        _claimable(now),
+        {
+            "$set": {"status": "processing", "lease_owner": worker_id, "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+                     "started_at": now, "processed": 0, "total": 0, "modified": 0, "updated_at": now},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("scheduled_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+    if job is None:
+        return None
+
+    pending = job.get("pending_tags") or []
+    tags = list(dict.fromkeys((job.get("tags") or []) + pending))
+    await async_retag_jobs_collection.update_one(
+        {"_id": job["_id"], "lease_owner": worker_id},
+        {"$set": {"tags": tags}, "$pullAll": {"pending_tags": pending}}
+    )
+    job["tags"] = tags
+    job["pending_tags"] = []
+    return job
+
+
+async def _release(job: dict, worker_id: str, update: dict) -> bool:
+    """Mise a jour de fin de passe, uniquement si le worker detient encore le bail."""
+    update = {**update, "lease_owner": None, "lease_expires_at": None, "updated_at": datetime.utcnow()}
+    res = await async_retag_jobs_collection.update_one({"_id": job["_id"], "lease_owner": worker_id}, {"$set": update})
+    return res.matched_count == 1
+
+
+async def _fail(job: dict, worker_id: str, error: str):
+    """
+    Passe en echec. Les tags a recalculer sont toujours conserves : le job repart dans la file
+    apres un delai croissant tant que MAX_ATTEMPTS n'est pas atteint. Au-dela, il passe en
+    "error" (ses tags seront repris a la prochaine modification de regle), sauf si des tags
+    sont arrives pendant la passe : une nouvelle serie de tentatives commence aussitot.
+    """
+    attempts = job.get("attempts", 0)
+    now = datetime.utcnow()
+    if attempts < MAX_ATTEMPTS:
+        retry_at = now + timedelta(seconds=RETRY_SECONDS * 2 ** max(attempts - 1, 0))
+        await _release(job, worker_id, {"status": "queued", "scheduled_at": retry_at, "error": error})
+        return
+
+    res = await async_retag_jobs_collection.update_one(
+        {"_id": job["_id"], "lease_owner": worker_id, "pending_tags.0": {"$exists": True}},
+        {"$set": {"status": "queued", "scheduled_at": now, "error": error, "attempts": 0,
+                  "lease_owner": None, "lease_expires_at": None, "updated_at": now}}
+    )
+    if res.matched_count == 0:
+        await _release(job, worker_id, {"status": "error", "error": error, "attempts": 0})
+
+
+async def process_retag_job(job: dict, worker_id: str, stop_event: asyncio.Event = None):
+    """
+    Recalcule les tags du job lot par lot (tags_engine.retag_collection). Apres chaque lot, la
+    progression est enregistree et le bail prolonge. Arret du worker : le job retourne dans la
+    file avec ses tags, la passe sera refaite en entier (elle est idempotente).
+    """
+    job_id = job["_id"]
+
+    if job.get("attempts", 0) > MAX_ATTEMPTS:
+        await _fail(job, worker_id, "Re-tag abandonne apres plusieurs tentatives.")
+        return
+
+    async def checkpoint(progress: dict) -> bool:
+        if stop_event is not None and stop_event.is_set():
+            return False
+        now = datetime.utcnow()
+        res = await async_retag_jobs_collection.update_one(
+            {"_id": job_id, "lease_owner": worker_id},
+            {"$set": {"processed": progress["processed"], "total": progress["total"], "modified": progress["modified"],
+                      "modes": progress["modes"], "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS), "updated_at": now}}
+        )
+        if res.matched_count == 0:
+            logger.warning(f"Re-tag {job_id} : bail perdu, abandon par {worker_id}")
+            return False
+        return True
+
+    try:
+        progress = await retag_collection(job_id, job.get("tags") or [], checkpoint)
+    except Exception as e:
+        logger.error(f"Crash Re-tag (utilisateur {job_id}): {e}")
+        await _fail(job, worker_id, str(e))
+        return
+
+    if progress["interrupted"]:
+        if stop_event is not None and stop_event.is_set():
+            await _release(job, worker_id, {"status": "queued", "scheduled_at": datetime.utcnow()})
+        return
+
+    final = {
+        "processed": progress["processed"],
+        "total": progress["total"],
+        "modified": progress["modified"],
+        "modes": progress["modes"],
+        "tags": [],
+        "attempts": 0,
+        "error": None,
+        "finished_at": datetime.utcnow(),
+    }
+    # Aucune modification pendant la passe : termine ; sinon une nouvelle passe suit aussitot
+    res = await async_retag_jobs_collection.update_one(
+        {"_id": job_id, "lease_owner": worker_id, "pending_tags": {"$size": 0}},
+        {"$set": {**final, "status": "completed", "lease_owner": None, "lease_expires_at": None, "updated_at": datetime.utcnow()}}
+    )
+    if res.matched_count == 0:
+        await _release(job, worker_id, {**final, "status": "queued", "scheduled_at": datetime.utcnow()})
+
+
+async def run_retag_worker(stop_event: asyncio.Event, worker_id: str = None):
+    """Boucle du worker de re-tag : prend un job, le traite, recommence ; attend quand la file est vide."""
+    global _wake
+    worker_id = worker_id or new_worker_id()
+    _wake = asyncio.Event()
+    logger.info(f"Worker de re-tag {worker_id} demarre")
+
+    while not stop_event.is_set():
+        try:
+            job = await claim_retag_job(worker_id)
+        except Exception as e:
+            logger.error(f"Worker de re-tag : lecture de la file impossible ({e})")
+            job = None
+
+        if job:
+            await process_retag_job(job, worker_id, stop_event)
+            continue
+
+        _wake.clear()
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    logger.info(f"Worker de re-tag {worker_id} arrete")
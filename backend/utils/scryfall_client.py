@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import time
+import httpx
+
+logger = logging.getLogger("scryfall_client")
+
+SCRYFALL_API = "https://api.scryfall.com"
+HEADERS = {"User-Agent": "AllScans/1.0", "Accept": "application/json"}
+
+# Politique Scryfall : ~10 requetes/s maximum sur api.scryfall.com
+RATE_PER_SECOND = 10.0
+BURST = 10
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+# Un Retry-After demesure ne doit pas bloquer un import pendant des minutes
+MAX_RETRY_AFTER = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+COLLECTION_CHUNK_SIZE = 75
+
+
+class TokenBucket:
+    """
+    Limiteur partage par tout le processus. Les jetons sont reserves (le solde peut
+    devenir negatif) : chaque appelant connait immediatement son temps d'attente et
+    les requetes sont servies dans l'ordre d'arrivee, sans verrou.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+limiter = TokenBucket(RATE_PER_SECOND, BURST)
+
+stats = {
+    "requests": 0,
+    "retries": 0,
+    "errors": 0,
+    "rate_limited": 0,
+    "total_latency": 0.0,
+    "by_status": {},
+}
+
+_client = None
+_client_loop = None
+# Fermetures en cours des clients remplaces (reference gardee jusqu'a la fin de la tache)
+_closing = set()
+
+
+async def _close_quietly(client: httpx.AsyncClient):
+    try:
+        await client.aclose()
+    except Exception as e:
+        # Connexions ouvertes sur une boucle deja fermee : rien de plus a liberer
+        logger.debug(f"Fermeture de l'ancien client Scryfall : {e}")
+
+
+def _discard_client(client, client_loop, loop):
+    """Ferme un client remplace : sur sa boucle si elle tourne encore ailleurs, sinon sur la boucle courante."""
+    if client is None or client.is_closed:
+        return
+    if client_loop is not None and client_loop is not loop and client_loop.is_running():
+        asyncio.run_coroutine_threadsafe(_close_quietly(client), client_loop)
+        return
+    task = loop.create_task(_close_quietly(client))
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Client HTTP unique (keep-alive + pool de connexions), recree si la boucle d'evenements change.
+    L'ancien client est alors ferme pour ne pas laisser son pool de connexions ouvert.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _discard_client(_client, _client_loop, loop)
+        _client = httpx.AsyncClient(
+            timeout=30.0,
+            headers=HEADERS,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    if _closing:
+        await asyncio.gather(*_closing, return_exceptions=True)
+
+
+def _retry_delay(resp, attempt: int) -> float:
+    retry_after = resp.headers.get("Retry-After") if resp is not None else None
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    return BACKOFF_BASE * (2 ** attempt)
+
+
+async def request(method: str, url: str, rate_limited: bool = True, **kwargs) -> httpx.Response:
+    """
+    Envoie une requete via le client partage. Les 429/5xx et erreurs reseau sont
+    rejoues avec un backoff exponentiel ; la derniere reponse (ou exception) est renvoyee.
+    """
+    if url.startswith("/"):
+        url = SCRYFALL_API + url
+
+    client = get_client()
+    resp = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        if rate_limited:
+            await limiter.acquire()
+
+        start = time.perf_counter()
+        stats["requests"] += 1
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            stats["errors"] += 1
+            if attempt == MAX_RETRIES:
+                raise
+            logger.warning(f"Erreur reseau Scryfall ({e}), nouvel essai {attempt + 1}/{MAX_RETRIES}")
+            stats["retries"] += 1
+            await asyncio.sleep(_retry_delay(None, attempt))
+            continue
+        finally:
+            stats["total_latency"] += time.perf_counter() - start
+
+        status_key = str(resp.status_code)
+        stats["by_status"][status_key] = stats["by_status"].get(status_key, 0) + 1
+
+        if resp.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return resp
+
+        if resp.status_code == 429:
+            stats["rate_limited"] += 1
+        stats["retries"] += 1
+        delay = _retry_delay(resp, attempt)
+        logger.warning(f"Scryfall {resp.status_code} sur {url}, nouvel essai dans {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    return resp
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, **kwargs)
+
+
+async def fetch_collection(identifiers: list) -> list:
+    """Resout une liste d'identifiants via /cards/collection, par lots de 75."""
+    found_cards = []
+    for i in range(0, len(identifiers), COLLECTION_CHUNK_SIZE):
+        chunk = identifiers[i:i + COLLECTION_CHUNK_SIZE]
+        try:
+            resp = await post("/cards/collection", json={"identifiers": chunk})
+            if resp.status_code == 200:
+                found_cards.extend(resp.json().get("data", []))
+            elif resp.status_code == 404:
+                # Scryfall renvoie 404 si absolument toutes les cartes du lot sont introuvables
+                logger.warning("Scryfall 404: Aucune carte de ce lot n'a ete trouvee.")
+            else:
+                logger.error(f"Erreur Scryfall Batch: {resp.status_code}")
+        except Exception as e:
+            logger.error(f"Erreur Scryfall Batch: {e}")
+    return found_cards
+
+
+def get_stats() -> dict:
+    requests_count = stats["requests"]
+    return {
+        **stats,
+        "by_status": dict(stats["by_status"]),
+        "avg_latency": stats["total_latency"] / requests_count if requests_count else 0.0,
+    }
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from database import collection_versions_collection, async_collection_versions_collection
+import os
+
+# Cache des reponses de /cards/search. La cle contient la version de la collection de
+# l'utilisateur : un compteur (collection collection_versions, un document par utilisateur)
+# incremente par chaque route qui modifie ses UserCards. Une ecriture rend donc aussitot
+# injoignables toutes les recherches mises en cache avant elle, dans tous les processus ;
+# les entrees perimees sortent ensuite du LRU d'elles-memes.
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))
+
+
+async def get_collection_version(user_id: str) -> int:
+    doc = await async_collection_versions_collection.find_one({"_id": str(user_id)})
+    return doc.get("version", 0) if doc else 0
+
+
+async def bump_collection_version(user_id: str):
+    """A appeler apres toute ecriture dans les UserCards de l'utilisateur."""
+    await async_collection_versions_collection.update_one(
+        {"_id": str(user_id)}, {"$inc": {"version": 1}}, upsert=True
+    )
+
+
+def bump_all_collection_versions(collection=None):
+    """Donnees de cartes rafraichies pour tous leurs proprietaires (synchronisation du catalogue)."""
+    collection = collection if collection is not None else collection_versions_collection
+    collection.update_many({}, {"$inc": {"version": 1}})
+
+
+async def async_bump_all_collection_versions():
+    await async_collection_versions_collection.update_many({}, {"$inc": {"version": 1}})
+
+
+class SearchResultCache:
+    """LRU borne : (user_id, version de la collection, parametres normalises) -> reponse."""
+
+    def __init__(self, max_size: int = SEARCH_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(user_id: str, version: int, params: dict) -> tuple:
+        """
+        Parametres absents (None) ignores, ordre des parametres indifferent. Seules les valeurs
+        simples comptent (appel direct de la route : les valeurs par defaut restent des Query()).
+        """
+        return (str(user_id), version, tuple(sorted(
+            (k, v) for k, v in params.items() if isinstance(v, (str, int, float))
+        )))
+
+    def get(self, key: tuple):
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key: tuple, result: dict):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+search_cache = SearchResultCache()
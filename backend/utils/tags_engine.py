@@ -1,4 +1,31 @@
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
+from database import async_tag_rules_collection, async_collection_versions_collection, async_user_cards_collection, async_cards_collection
+from models.card import COLOR_BITS, color_mask
+from pymongo import UpdateMany
+from utils.search_cache import bump_collection_version
+import operator
+import re
+
+try:
+    import numpy as np
+except ImportError:  # evaluation vectorisee optionnelle : sans NumPy, regles compilees carte par carte
+    np = None
+
+# --- Regles compilees ---
+# evaluate_condition reinterprete chaque condition pour chaque carte (minuscules, ensembles de
+# couleurs, strptime). Une regle est compilee une fois en predicats : valeurs cherchees deja
+# converties, dates lues une seule fois. Les jeux de regles compiles sont gardes par utilisateur,
+# avec la version de ses regles (collection_versions.rules_version, incrementee par tags_routes).
+RULES_CACHE_SIZE = 256
+
+TEXT_FIELDS = ("type_line", "oracle_text", "name", "set")
+NUMERIC_FIELDS = ("cmc", "power", "toughness", "price")
+COLOR_FIELDS = ("color_exact", "color_approx")
+COMPARISONS = {"==": operator.eq, ">": operator.gt, "<": operator.lt}
+
+_compiled_rules = OrderedDict()
 
 def evaluate_condition(card: dict, condition: dict) -> bool:
     field = condition.get("field")
@@ -85,7 +112,11 @@ def evaluate_condition(card: dict, condition: dict) -> bool:
 def get_automated_tags(card_data: dict, rules: list) -> list:
     """
     Parcourt toutes les règles de l'utilisateur et renvoie la liste des tags applicables à cette carte.
+    Accepte aussi un CompiledRuleSet (chemin rapide, a preferer pour evaluer plusieurs cartes).
     """
+    if isinstance(rules, CompiledRuleSet):
+        return rules.tags_for(card_data)
+
     applied_tags = []
     
     for rule in rules:
@@ -106,4 +137,550 @@ def get_automated_tags(card_data: dict, rules: list) -> list:
         if rule_passed and tag_name not in applied_tags:
             applied_tags.append(tag_name)
             
-    return applied_tags
\ No newline at end of file
+    return applied_tags
+
+@lru_cache(maxsize=4096)
+def parse_rule_date(value: str):
+    """Date "YYYY-MM-DD" (les memes dates reviennent d'une carte a l'autre) ; None si invalide."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def _never(card: dict) -> bool:
+    return False
+
+
+def _always(card: dict) -> bool:
+    return True
+
+
+def _compile_condition(condition: dict):
+    field = condition.get("field")
+    op = condition.get("operator")
+    val_str = condition.get("value", "")
+
+    if field in TEXT_FIELDS:
+        search_val = str(val_str).lower()
+        if op == "contains":
+            return lambda card: search_val in str(card.get(field, "")).lower()
+        if op == "not_contains":
+            return lambda card: search_val not in str(card.get(field, "")).lower()
+        if op == "equals":
+            return lambda card: str(card.get(field, "")).lower() == search_val
+        if op == "is_empty":
+            return lambda card: not str(card.get(field, "")).lower()
+        return _never
+
+    if field in NUMERIC_FIELDS:
+        compare = COMPARISONS.get(op)
+        try:
+            search_val = float(val_str)
+        except (ValueError, TypeError):
+            return _never
+        if compare is None:
+            return _never
+
+        def check(card: dict) -> bool:
+            try:
+                if field == "price":
+                    prices = card.get("prices", {})
+                    card_val = float(prices.get("eur") or prices.get("usd") or 0.0)
+                else:
+                    card_val = float(card.get(field, 0.0))
+            except (ValueError, TypeError):
+                return False
+            return compare(card_val, search_val)
+        return check
+
+    if field in COLOR_FIELDS:
+        search_colors = frozenset(c.strip().upper() for c in val_str.split(",") if c.strip())
+        if "C" in search_colors:
+            if field == "color_exact":
+                return lambda card: not set(card.get("colors", []))
+            return _always
+        if field == "color_exact":
+            return lambda card: set(card.get("colors", [])) == search_colors
+        return lambda card: search_colors.issuperset(card.get("colors", []))
+
+    if field == "date_added":
+        if not isinstance(val_str, str):
+            return None
+        compare = COMPARISONS.get(op)
+        search_date = parse_rule_date(val_str)
+        if compare is None or search_date is None:
+            return _never
+
+        def check_date(card: dict) -> bool:
+            card_date_str = card.get("released_at", "")
+            if not card_date_str:
+                return False
+            if not isinstance(card_date_str, str):
+                return evaluate_condition(card, condition)
+            card_date = parse_rule_date(card_date_str)
+            return card_date is not None and compare(card_date, search_date)
+        return check_date
+
+    return _never
+
+
+def compile_condition(condition: dict):
+    """Predicat card -> bool, meme resultat que evaluate_condition(card, condition)."""
+    try:
+        predicate = _compile_condition(condition)
+    except (AttributeError, TypeError):
+        predicate = None
+    if predicate is None:
+        # Valeur de regle inattendue (ni texte ni nombre) : interpretation d'origine, carte par carte
+        return lambda card: evaluate_condition(card, condition)
+    return predicate
+
+
+class CompiledRuleSet:
+    """Regles d'un utilisateur compilees une fois ; tags_for(card) == get_automated_tags(card, rules)."""
+
+    def __init__(self, rules: list):
+        self.source = list(rules)
+        self.rules = []
+        for rule in self.source:
+            conditions = rule.get("conditions", [])
+            tag_name = rule.get("tag_name", "").strip().lower()
+            if not conditions or not tag_name:
+                continue
+            is_or = rule.get("logic", "AND") == "OR"
+            self.rules.append((tag_name, is_or, tuple(compile_condition(c) for c in conditions)))
+        self.tag_names = list(dict.fromkeys(tag_name for tag_name, _, _ in self.rules))
+
+    def __len__(self):
+        return len(self.source)
+
+    def tags_for(self, card_data: dict) -> list:
+        applied_tags = []
+        seen = set()
+        for tag_name, is_or, predicates in self.rules:
+            if tag_name in seen:
+                continue
+            # OR : une condition vraie suffit ; AND : une condition fausse suffit a echouer
+            rule_passed = not is_or
+            for predicate in predicates:
+                if predicate(card_data) == is_or:
+                    rule_passed = is_or
+                    break
+            if rule_passed:
+                applied_tags.append(tag_name)
+                seen.add(tag_name)
+        return applied_tags
+
+
+async def load_user_rules(user_id: str) -> CompiledRuleSet:
+    """Regles compilees de l'utilisateur, recompilees seulement si tags_routes les a modifiees."""
+    uid = str(user_id)
+    doc = await async_collection_versions_collection.find_one({"_id": uid}, {"rules_version": 1})
+    version = doc.get("rules_version", 0) if doc else 0
+
+    cached = _compiled_rules.get(uid)
+    if cached and cached[0] == version:
+        _compiled_rules.move_to_end(uid)
+        return cached[1]
+
+    compiled = CompiledRuleSet(await async_tag_rules_collection.find({"user_id": uid}).to_list(None))
+    _compiled_rules[uid] = (version, compiled)
+    _compiled_rules.move_to_end(uid)
+    while len(_compiled_rules) > RULES_CACHE_SIZE:
+        _compiled_rules.popitem(last=False)
+    return compiled
+
+
+async def invalidate_user_rules(user_id: str):
+    """A appeler apres toute creation, modification ou suppression d'une regle."""
+    uid = str(user_id)
+    _compiled_rules.pop(uid, None)
+    await async_collection_versions_collection.update_one(
+        {"_id": uid}, {"$inc": {"rules_version": 1}}, upsert=True
+    )
+
+
+def clear_rules_cache():
+    _compiled_rules.clear()
+
+
+# --- Regles traduites en filtres Mongo ---
+# Une regle traduite s'applique a un lot de lignes UserCards en deux UpdateMany ($addToSet sur
+# les lignes qui la verifient, $pull sur les autres) au lieu d'une evaluation par carte.
+# La traduction reproduit evaluate_condition sur les champs copies dans UserCards, y compris
+# ses cas limites (champ absent lu comme "" ou 0, valeur nulle lue comme "none").
+# Ce qui ne se traduit pas fidelement (dates, texte non ASCII) renvoie None : evaluation Python.
+NEVER_FILTER = {"_id": {"$in": []}}
+MONGO_COMPARISONS = {"==": "$eq", ">": "$gt", "<": "$lt"}
+RETAG_BATCH_SIZE = 1000
+
+
+def _is_null(field: str) -> dict:
+    """Valeur null presente (str(None) == "none"), a distinguer d'un champ absent (lu comme "")."""
+    return {"$and": [{field: None}, {field: {"$exists": True}}]}
+
+
+def _any_of(clauses: list) -> dict:
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _text_filter(field: str, op: str, search_val: str):
+    if not search_val.isascii():
+        return None
+    pattern = re.escape(search_val)
+
+    if op == "contains":
+        if not search_val:
+            return {}
+        clauses = [{field: {"$regex": pattern, "$options": "i"}}]
+        if search_val in "none":
+            clauses.append(_is_null(field))
+        return _any_of(clauses)
+    if op == "not_contains":
+        if not search_val:
+            return NEVER_FILTER
+        clauses = [{field: {"$not": re.compile(pattern, re.IGNORECASE)}}]
+        if search_val in "none":
+            clauses.append({"$or": [{field: {"$ne": None}}, {field: {"$exists": False}}]})
+        return {"$and": clauses}
+    if op == "equals":
+        if not search_val:
+            return {"$or": [{field: ""}, {field: {"$exists": False}}]}
+        clauses = [{field: {"$regex": f"^{pattern}$", "$options": "i"}}]
+        if search_val == "none":
+            clauses.append(_is_null(field))
+        return _any_of(clauses)
+    if op == "is_empty":
+        return {"$or": [{field: ""}, {field: {"$exists": False}}]}
+    return NEVER_FILTER
+
+
+def _numeric_filter(field: str, op: str, val_str):
+    compare = COMPARISONS.get(op)
+    try:
+        search_val = float(val_str)
+    except (ValueError, TypeError):
+        return NEVER_FILTER
+    if compare is None:
+        return NEVER_FILTER
+    if search_val != search_val:
+        return NEVER_FILTER
+    condition = {MONGO_COMPARISONS[op]: search_val}
+    # Valeur par defaut de evaluate_condition quand le champ (ou tout prix) manque
+    default_matches = compare(0.0, search_val)
+
+    if field == "price":
+        # float(eur or usd or 0.0) : eur s'il est non nul, sinon usd s'il est non nul, sinon 0
+        falsy = {"$in": [None, 0]}
+        clauses = [
+            {"prices.eur": {**condition, "$ne": 0}},
+            {"prices.eur": falsy, "prices.usd": {**condition, "$ne": 0}},
+        ]
+        if default_matches:
+            clauses.append({"prices.eur": falsy, "prices.usd": falsy})
+        return {"$or": clauses}
+
+    # Force / endurance : valeur numerique precalculee (None pour "*", "1+*"...)
+    target = f"{field}_num" if field in ("power", "toughness") else field
+    clauses = [{target: condition}]
+    if default_matches:
+        clauses.append({field: {"$exists": False}})
+    return _any_of(clauses)
+
+
+def _color_filter(field: str, val_str):
+    if not isinstance(val_str, str):
+        return None
+    search_colors = {c.strip().upper() for c in val_str.split(",") if c.strip()}
+    if "C" in search_colors:
+        return {"color_mask": 0} if field == "color_exact" else {}
+
+    mask = color_mask(search_colors)
+    if field == "color_exact":
+        # Les couleurs d'une carte sont toujours prises dans WUBRG
+        return {"color_mask": mask} if search_colors <= COLOR_BITS.keys() else NEVER_FILTER
+    # Sous-ensemble (l'ensemble vide compris) des couleurs autorisees
+    return {"color_mask": {"$in": [m for m in range(32) if m & ~mask == 0]}}
+
+
+def condition_to_mongo_filter(condition: dict):
+    """Filtre Mongo (sur UserCards) equivalent a evaluate_condition, ou None si intraduisible."""
+    field = condition.get("field")
+    op = condition.get("operator")
+    val_str = condition.get("value", "")
+
+    if field in TEXT_FIELDS:
+        return _text_filter(field, op, str(val_str).lower())
+    if field in NUMERIC_FIELDS:
+        return _numeric_filter(field, op, val_str)
+    if field in COLOR_FIELDS:
+        return _color_filter(field, val_str)
+    if field == "date_added":
+        # released_at n'est pas copie dans UserCards
+        return None
+    return NEVER_FILTER
+
+
+def rule_to_mongo_filter(rule: dict):
+    """Conditions AND / OR d'une regle en un seul filtre ; None si une condition est intraduisible."""
+    filters = [condition_to_mongo_filter(c) for c in rule.get("conditions", [])]
+    if not filters or any(f is None for f in filters):
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    return {"$or": filters} if rule.get("logic", "AND") == "OR" else {"$and": filters}
+
+
+def _rules_for_tag(rules: list, tag_name: str) -> list:
+    return [r for r in rules if r.get("conditions") and (r.get("tag_name") or "").strip().lower() == tag_name]
+
+
+def _retag_filter_operations(ids: list, tag_name: str, match: dict) -> list:
+    """Regle traduite : ajouts et retraits decides par Mongo sur les lignes du lot."""
+    return [
+        UpdateMany({"$and": [{"_id": {"$in": ids}, "tags": {"$ne": tag_name}}, match]}, {"$addToSet": {"tags": tag_name}}),
+        UpdateMany({"$and": [{"_id": {"$in": ids}, "tags": tag_name}, {"$nor": [match]}]}, {"$pull": {"tags": tag_name}}),
+    ]
+
+
+# --- Evaluation vectorisee ---
+# Pour les regles qui restent en Python, chaque lot de la collection est charge en colonnes
+# NumPy : chaque condition devient un masque booleen sur toutes les cartes du lot a la fois, et
+# le meme instantane sert a toutes les regles a evaluer.
+
+
+def _float_or_nan(value) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return float("nan")
+
+
+def _card_price(card: dict) -> float:
+    prices = card.get("prices", {})
+    if not isinstance(prices, dict):
+        return float("nan")
+    return _float_or_nan(prices.get("eur") or prices.get("usd") or 0.0)
+
+
+def _date_ordinal(value) -> int:
+    if not value or not isinstance(value, str):
+        return -1
+    parsed = parse_rule_date(value)
+    return parsed.toordinal() if parsed is not None else -1
+
+
+class CollectionSnapshot:
+    """
+    Vue en colonnes d'une liste de cartes (memes valeurs que celles lues par evaluate_condition) :
+    - nombres (cmc, prix, force, endurance) en float64, NaN quand float() echoue (toujours faux) ;
+    - couleurs en masques de bits (un bit par symbole rencontre) ;
+    - released_at en ordinal de date (-1 si absente ou invalide) ;
+    - champs texte (dont set) en codes de categories : une condition texte est evaluee une fois
+      par valeur distincte puis diffusee.
+    """
+
+    def __init__(self, cards: list):
+        if np is None:
+            raise RuntimeError("NumPy est requis pour l'evaluation vectorisee des regles")
+        self.cards = cards
+        self.size = len(cards)
+
+        self.numbers = {
+            "cmc": np.fromiter((_float_or_nan(c.get("cmc", 0.0)) for c in cards), dtype=np.float64, count=self.size),
+            "power": np.fromiter((_float_or_nan(c.get("power", 0.0)) for c in cards), dtype=np.float64, count=self.size),
+            "toughness": np.fromiter((_float_or_nan(c.get("toughness", 0.0)) for c in cards), dtype=np.float64, count=self.size),
+            "price": np.fromiter((_card_price(c) for c in cards), dtype=np.float64, count=self.size),
+        }
+        self.dates = np.fromiter((_date_ordinal(c.get("released_at", "")) for c in cards), dtype=np.int64, count=self.size)
+
+        self.color_bits = {}
+        self.colors = np.fromiter((self._colors_mask(c.get("colors") or []) for c in cards), dtype=np.int64, count=self.size)
+
+        self.texts = {}
+        for field in TEXT_FIELDS:
+            index = {}
+            codes = np.fromiter(
+                (index.setdefault(str(c.get(field, "")), len(index)) for c in cards), dtype=np.int64, count=self.size
+            )
+            self.texts[field] = (list(index), codes)
+
+    def _colors_mask(self, colors) -> int:
+        mask = 0
+        for color in colors:
+            mask |= self.color_bits.setdefault(color, 1 << len(self.color_bits))
+        return mask
+
+    def condition_mask(self, condition: dict):
+        field = condition.get("field")
+        op = condition.get("operator")
+        val_str = condition.get("value", "")
+        empty = np.zeros(self.size, dtype=bool)
+
+        if field in TEXT_FIELDS:
+            predicate = compile_condition(condition)
+            values, codes = self.texts[field]
+            table = np.fromiter((predicate({field: v}) for v in values), dtype=bool, count=len(values))
+            return table[codes] if len(values) else empty
+
+        if field in NUMERIC_FIELDS:
+            compare = COMPARISONS.get(op)
+            try:
+                search_val = float(val_str)
+            except (ValueError, TypeError):
+                return empty
+            return compare(self.numbers[field], search_val) if compare else empty
+
+        if field in COLOR_FIELDS and isinstance(val_str, str):
+            search_colors = {c.strip().upper() for c in val_str.split(",") if c.strip()}
+            if "C" in search_colors:
+                return self.colors == 0 if field == "color_exact" else ~empty
+            search_mask = 0
+            for color in search_colors:
+                search_mask |= self.color_bits.get(color, 0)
+            if field == "color_exact":
+                # Symbole absent de toutes les cartes : aucune egalite possible
+                if any(color not in self.color_bits for color in search_colors):
+                    return empty
+                return self.colors == search_mask
+            return (self.colors & ~search_mask) == 0
+
+        if field == "date_added" and isinstance(val_str, str):
+            compare = COMPARISONS.get(op)
+            search_date = parse_rule_date(val_str)
+            if compare is None or search_date is None:
+                return empty
+            return (self.dates >= 0) & compare(self.dates, search_date.toordinal())
+
+        if field in COLOR_FIELDS or field == "date_added":
+            # Valeur de regle inattendue : meme predicat que le moteur compile, carte par carte
+            predicate = compile_condition(condition)
+            return np.fromiter((predicate(c) for c in self.cards), dtype=bool, count=self.size)
+        return empty
+
+    def rule_mask(self, rule: dict):
+        masks = [self.condition_mask(c) for c in rule.get("conditions", [])]
+        if not masks:
+            return np.zeros(self.size, dtype=bool)
+        if rule.get("logic", "AND") == "OR":
+            return np.logical_or.reduce(masks)
+        return np.logical_and.reduce(masks)
+
+    def tag_masks(self, rules: list) -> dict:
+        """tag -> cartes qui le recoivent (au moins une de ses regles verifiee)."""
+        masks = {}
+        for rule in rules:
+            tag_name = rule.get("tag_name", "").strip().lower()
+            if not rule.get("conditions") or not tag_name:
+                continue
+            mask = self.rule_mask(rule)
+            masks[tag_name] = masks[tag_name] | mask if tag_name in masks else mask
+        return masks
+
+
+async def load_batch_cards(rows: list) -> list:
+    """Carte du catalogue local de chaque ligne UserCards (_id, card_id, tags), dans le meme ordre."""
+    card_ids = list({r["card_id"] for r in rows if r.get("card_id")})
+    cards = {c["id"]: c for c in await async_cards_collection.find(
+        {"id": {"$in": card_ids}}, {"_id": 0, "owners": 0}
+    ).to_list(None)}
+
+    # Carte absente du catalogue : la ligne UserCards (copie des champs) sert de carte
+    orphans = [r["_id"] for r in rows if r.get("card_id") not in cards]
+    full_rows = {}
+    if orphans:
+        full_rows = {r["_id"]: r for r in await async_user_cards_collection.find({"_id": {"$in": orphans}}).to_list(None)}
+    return [cards.get(r.get("card_id")) or full_rows.get(r["_id"], {}) for r in rows]
+
+
+def python_tag_matches(cards: list, rules: list) -> dict:
+    """tag -> cartes (dans l'ordre de cards) verifiant au moins une de ses regles ; vectorise si NumPy est la."""
+    if np is not None:
+        return CollectionSnapshot(cards).tag_masks(rules)
+    compiled = CompiledRuleSet(rules)
+    card_tags = [set(compiled.tags_for(c)) for c in cards]
+    return {tag_name: [tag_name in tags for tags in card_tags] for tag_name in compiled.tag_names}
+
+
+def _retag_delta_operations(rows: list, tag_name: str, matches) -> list:
+    """Regle evaluee en Python : seules les lignes dont le tag doit changer sont ecrites."""
+    if matches is None:
+        matches = [False] * len(rows)
+    to_add, to_remove = [], []
+    for row, match in zip(rows, matches):
+        has_tag = tag_name in (row.get("tags") or [])
+        if match and not has_tag:
+            to_add.append(row["_id"])
+        elif has_tag and not match:
+            to_remove.append(row["_id"])
+    operations = []
+    if to_add:
+        operations.append(UpdateMany({"_id": {"$in": to_add}}, {"$addToSet": {"tags": tag_name}}))
+    if to_remove:
+        operations.append(UpdateMany({"_id": {"$in": to_remove}}, {"$pull": {"tags": tag_name}}))
+    return operations
+
+
+async def retag_collection(user_id: str, tag_names, on_batch=None) -> dict:
+    """
+    Recalcule les tags tag_names sur toute la collection d'apres les regles actuelles de
+    l'utilisateur : ajoutes la ou une de leurs regles s'applique, retires ailleurs (partout
+    si plus aucune regle ne porte ce tag). Seules les donnees locales sont lues (copies des
+    champs dans UserCards, catalogue Cards), jamais Scryfall.
+
+    La collection est parcourue par lots de RETAG_BATCH_SIZE lignes (ordre des _id), avec un
+    seul bulk_write par lot. Apres chaque lot, on_batch(progression) est attendu s'il est
+    fourni ; s'il renvoie False, la passe s'arrete la (interrupted).
+    """
+    uid = str(user_id)
+    rules = (await load_user_rules(uid)).source
+    filters = {}
+    python_rules = []
+    modes = {}
+    for tag_name in dict.fromkeys(t.strip().lower() for t in tag_names if t and t.strip()):
+        tag_rules = _rules_for_tag(rules, tag_name)
+        tag_filters = [rule_to_mongo_filter(r) for r in tag_rules]
+        if all(f is not None for f in tag_filters):
+            # Plus aucune regle pour ce tag : NEVER_FILTER le retire partout
+            filters[tag_name] = _any_of(tag_filters) if tag_filters else NEVER_FILTER
+            modes[tag_name] = "mongo"
+        else:
+            python_rules += tag_rules
+            modes[tag_name] = "python" if np is None else "vector"
+
+    progress = {
+        "processed": 0,
+        "total": await async_user_cards_collection.count_documents({"user_id": uid}),
+        "modified": 0,
+        "modes": modes,
+        "interrupted": False
+    }
+    last_id = None
+    while True:
+        query = {"user_id": uid} if last_id is None else {"user_id": uid, "_id": {"$gt": last_id}}
+        rows = await async_user_cards_collection.find(query, {"card_id": 1, "tags": 1}).sort("_id", 1).limit(RETAG_BATCH_SIZE).to_list(None)
+        if not rows:
+            break
+        last_id = rows[-1]["_id"]
+
+        ids = [r["_id"] for r in rows]
+        operations = []
+        for tag_name, match in filters.items():
+            operations += _retag_filter_operations(ids, tag_name, match)
+        if python_rules:
+            matches = python_tag_matches(await load_batch_cards(rows), python_rules)
+            for tag_name in modes:
+                if tag_name not in filters:
+                    operations += _retag_delta_operations(rows, tag_name, matches.get(tag_name))
+        if operations:
+            progress["modified"] += (await async_user_cards_collection.bulk_write(operations, ordered=False)).modified_count
+        progress["processed"] += len(rows)
+
+        if on_batch is not None and await on_batch(progress) is False:
+            progress["interrupted"] = True
+            break
+
+    if progress["modified"]:
+        await bump_collection_version(uid)
+    return progress
@@ -35,6 +35,8 @@ export default function CardsList() {
   
   const abortControllerRef = useRef(null);
   const observer = useRef();
+  // Curseur renvoye par /cards/search : la page suivante reprend apres la derniere carte affichee
+  const nextCursorRef = useRef(null);
 
   const [selectedCard, setSelectedCard] = useState(null);
 
@@ -191,6 +193,7 @@ export default function CardsList() {
       if (setFilter) params.append("set_code", setFilter);
 
       params.append("page", pageNumber);
+      if (!isNewFilter && nextCursorRef.current) params.append("cursor", nextCursorRef.current);
       params.append("limit", 60); 
       params.append("sort_by", sortBy); 
       params.append("sort_dir", sortDir);
@@ -206,7 +209,8 @@ export default function CardsList() {
       const data = await res.json();
       
       setCards(prevCards => isNewFilter ? data.cards : [...prevCards, ...data.cards]);
-      setHasMore(data.cards.length === 60);
+      nextCursorRef.current = data.next_cursor;
+      setHasMore(Boolean(data.next_cursor));
 
     } catch (err) {
       if (err.name === 'AbortError') return; 
@@ -226,6 +230,7 @@ export default function CardsList() {
     setCards([]); 
     setPage(1);
     setHasMore(true);
+    nextCursorRef.current = null;
     const delayDebounceFn = setTimeout(() => { fetchCards(1, true); }, 300);
     return () => clearTimeout(delayDebounceFn);
     // eslint-disable-next-line
@@ -53,6 +53,7 @@ export default function CollectionManager() {
   
   const [totalDbCount, setTotalDbCount] = useState(0);
   const [processedDbCount, setProcessedDbCount] = useState(0);
+  const [queuePosition, setQueuePosition] = useState(0);
   const [isExporting, setIsExporting] = useState(false);
 
   const [actionModal, setActionModal] = useState({
@@ -113,6 +114,11 @@ export default function CollectionManager() {
 
   const executeAction = async () => {
     const { type, id } = actionModal;
+    if (type === "duplicate") {
+        const { path, requestOptions, linesCount } = actionModal.retry;
+        closeModal();
+        return executeServerImport(path, requestOptions, linesCount);
+    }
     setActionModal(prev => ({ ...prev, status: "loading" }));
 
     if (type === "clear") {
@@ -167,11 +173,11 @@ export default function CollectionManager() {
     setProcessedDbCount(0); setTotalDbCount(0);
 
     if (importFile) {
-        const reader = new FileReader();
-        reader.onprogress = (e) => { if (e.lengthComputable) setProgressReading(Math.round((e.loaded / e.total) * 100)); };
-        reader.onload = (e) => { setProgressReading(100); setTimeout(() => executeCleaning(e.target.result), 300); };
-        reader.onerror = () => { setActionModal({ isOpen: true, type: "error", status: "error", message: "Erreur lecture." }); setImportPhase("idle"); };
-        reader.readAsText(importFile);
+        // Le fichier part tel quel : le serveur le lit en flux et l'analyse ligne par ligne
+        setProgressReading(100); setProgressCleaning(100);
+        const formData = new FormData();
+        formData.append("file", importFile);
+        executeServerImport("/usercards/import/upload", { body: formData }, 0);
     } else {
         setProgressReading(100); setTimeout(() => executeCleaning(importText), 300);
     }
@@ -199,49 +205,82 @@ export default function CollectionManager() {
         setProgressCleaning(Math.floor((currentIndex / lines.length) * 100));
 
         if (currentIndex < lines.length) setTimeout(processChunk, 15); 
-        else setTimeout(() => executeServerImport(parsedData, lines.length), 300);
+        else setTimeout(() => executeServerImport("/usercards/import", {
+            headers: { "Content-Type": "application/json" }, body: JSON.stringify(parsedData)
+        }, lines.length), 300);
     };
     processChunk();
   };
 
-  const executeServerImport = async (parsedData, linesCount) => {
+  const pollImportProgress = (jobId, onProgress, onDone) => {
+    let errorsCount = 0;
+    const interval = setInterval(async () => {
+        try {
+            const progRes = await fetch(`${API_BASE_URL}/usercards/import/progress?job_id=${jobId}&_t=${Date.now()}`, { method: "GET", credentials: "include" });
+            if (progRes.ok) {
+                const data = await progRes.json();
+                if (data.status === "queued" || data.status === "processing") onProgress(data);
+                if (data.status === "completed" || data.status === "error") { clearInterval(interval); onDone(data); }
+            }
+        } catch (err) {
+            errorsCount++;
+            if (errorsCount > 10) {
+                clearInterval(interval); setImportPhase("idle");
+                setActionModal({ isOpen: true, type: "error", status: "error", message: "Perte de connexion." });
+            }
+        }
+    }, 1000);
+  };
+
+  const executeServerImport = async (path, requestOptions, linesCount) => {
     setImportPhase("db");
     try {
-        const res = await fetch(`${API_BASE_URL}/usercards/import`, {
-            method: "POST", headers: { "Content-Type": "application/json" }, credentials: "include", body: JSON.stringify(parsedData),
-        });
+        const res = await fetch(`${API_BASE_URL}${path}`, { method: "POST", credentials: "include", ...requestOptions });
+        if (res.status === 413) throw new Error("Fichier trop volumineux.");
         if (!res.ok) throw new Error("Erreur interne du serveur.");
-
-        let errorsCount = 0;
-        const interval = setInterval(async () => {
-            try {
-                const progRes = await fetch(`${API_BASE_URL}/usercards/import/progress?_t=${Date.now()}`, { method: "GET", credentials: "include" });
-                if (progRes.ok) {
-                    const data = await progRes.json();
-                    if (data.status === "starting" || data.status === "processing") {
-                        setProcessedDbCount(data.processed);
-                        setProgressDb(Math.floor((data.processed / (data.total || linesCount)) * 100));
-                    }
-                    if (data.status === "completed" || data.status === "error") {
-                        clearInterval(interval);
-                        setProgressDb(100); setProcessedDbCount(data.total || linesCount);
-                        setTimeout(() => {
-                            setImportPhase("idle"); setImportText(""); setImportFile(null);
-                            const fileInput = document.getElementById("file-import-input");
-                            if (fileInput) fileInput.value = "";
-                            fetchHistory();
-                            if (data.status === "error") setActionModal({ isOpen: true, type: "error", status: "error", message: data.error || "Erreur serveur." });
-                        }, 1000);
-                    }
-                }
-            } catch (err) {
-                errorsCount++;
-                if (errorsCount > 10) {
-                    clearInterval(interval); setImportPhase("idle");
-                    setActionModal({ isOpen: true, type: "error", status: "error", message: "Perte de connexion." });
-                }
-            }
-        }, 500);
+        const started = await res.json();
+        if (started.duplicate) {
+            // Contenu deja importe : on propose de l'appliquer quand meme plutot que de doubler les quantites
+            setImportPhase("idle");
+            const date = started.created_at ? new Date(started.created_at + "Z").toLocaleString() : "";
+            setActionModal({
+                isOpen: true, type: "duplicate", id: null, status: "confirm",
+                retry: { path: `${path}?force=true`, requestOptions, linesCount },
+                message: `Ce contenu a déjà été importé${date ? ` le ${date}` : ""} (${started.progress.imported} cartes). L'importer quand même ?`
+            });
+            return;
+        }
+        if (started.total) { linesCount = started.total; setTotalDbCount(started.total); }
+
+        const onProgress = (data) => {
+            setQueuePosition(data.status === "queued" ? data.queue_position || 0 : 0);
+            setProcessedDbCount(data.processed);
+            setProgressDb(Math.floor((data.processed / (data.total || linesCount)) * 100));
+        };
+        const onDone = (data) => {
+            setQueuePosition(0); setProgressDb(100); setProcessedDbCount(data.total || linesCount);
+            setTimeout(() => {
+                setImportPhase("idle"); setImportText(""); setImportFile(null);
+                const fileInput = document.getElementById("file-import-input");
+                if (fileInput) fileInput.value = "";
+                fetchHistory();
+                if (data.status === "error") setActionModal({ isOpen: true, type: "error", status: "error", message: data.error || "Erreur serveur." });
+            }, 1000);
+        };
+
+        // Progression poussee par le serveur (SSE) ; scrutation seulement si le flux est indisponible
+        if (window.EventSource) {
+            const source = new EventSource(`${API_BASE_URL}/usercards/import/${started.job_id}/events`, { withCredentials: true });
+            let received = false;
+            source.addEventListener("progress", (e) => { received = true; onProgress(JSON.parse(e.data)); });
+            source.addEventListener("summary", (e) => { source.close(); onDone(JSON.parse(e.data)); });
+            source.onerror = () => {
+                // Coupure avant tout evenement : on repasse sur la scrutation
+                if (!received) { source.close(); pollImportProgress(started.job_id, onProgress, onDone); }
+            };
+        } else {
+            pollImportProgress(started.job_id, onProgress, onDone);
+        }
     } catch (err) {
         setImportPhase("idle");
         setActionModal({ isOpen: true, type: "error", status: "error", message: err.message });
@@ -321,7 +360,7 @@ export default function CollectionManager() {
             <div className="cm-progress-container">
                 {renderProgressBar("Lecture du fichier", progressReading, "reading")}
                 {renderProgressBar("Nettoyage", progressCleaning, "cleaning")}
-                {renderProgressBar("Ajout BDD", progressDb, "db", `(${processedDbCount} / ${totalDbCount})`)}
+                {renderProgressBar("Ajout BDD", progressDb, "db", queuePosition > 0 ? `(en file d'attente, position ${queuePosition})` : `(${processedDbCount} / ${totalDbCount})`)}
             </div>
           ) : (
             <button onClick={handleStartImport} disabled={(!importText.trim() && !importFile) || isExporting} className="btn-action btn-primary">
@@ -443,7 +482,7 @@ export default function CollectionManager() {
       <div className="modal-overlay" onClick={actionModal.status === "confirm" || actionModal.status === "error" || actionModal.status === "success" ? closeModal : null}>
         <div className="modal-box" style={{ width: "450px", flexDirection: "column", padding: "25px", textAlign: "center", alignItems: "center" }} onClick={e => e.stopPropagation()}>
           <h3 style={{ marginTop: 0, color: "var(--primary)", fontSize: "1.4rem", marginBottom: "20px" }}>
-            {actionModal.type === "revert" ? "Annuler l'importation" : actionModal.type === "clear" ? "Effacer l'historique" : "Erreur"}
+            {actionModal.type === "revert" ? "Annuler l'importation" : actionModal.type === "clear" ? "Effacer l'historique" : actionModal.type === "duplicate" ? "Import déjà effectué" : "Erreur"}
           </h3>
           
           {actionModal.status === "confirm" && (
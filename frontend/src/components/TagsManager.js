@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import "../theme.css";
 import { API_BASE_URL } from '../utils/api';
 
@@ -22,6 +22,8 @@ export default function TagsManager({ onClose }) {
     const [ruleLogic, setRuleLogic] = useState("AND"); 
     const [isSubmitting, setIsSubmitting] = useState(false);
     const [editingRuleId, setEditingRuleId] = useState(null);
+    const [retag, setRetag] = useState(null);
+    const retagIntervalRef = useRef(null);
 
     const fetchRules = async () => {
         setLoading(true);
@@ -42,8 +44,28 @@ export default function TagsManager({ onClose }) {
 
     useEffect(() => {
         fetchRules();
+        watchRetag();
+        return () => clearInterval(retagIntervalRef.current);
     }, []);
 
+    // Re-tag de la collection lance cote serveur apres chaque modification de regle
+    const watchRetag = () => {
+        clearInterval(retagIntervalRef.current);
+        const poll = async () => {
+            try {
+                const res = await fetch(`${API_BASE_URL}/tags/retag/progress?_t=${Date.now()}`, { credentials: "include" });
+                if (!res.ok) return;
+                const data = await res.json();
+                setRetag(data);
+                if (data.status !== "queued" && data.status !== "processing") clearInterval(retagIntervalRef.current);
+            } catch (err) {
+                clearInterval(retagIntervalRef.current);
+            }
+        };
+        poll();
+        retagIntervalRef.current = setInterval(poll, 1000);
+    };
+
     const addCondition = () => {
         setConditions([...conditions, { field: "oracle_text", operator: "contains", value: "" }]);
     };
@@ -155,6 +177,7 @@ export default function TagsManager({ onClose }) {
             if (res.ok) {
                 cancelEdit(); 
                 fetchRules(); 
+                watchRetag();
             } else {
                 const errData = await res.json();
                 setError(errData.detail || "Erreur lors de l'enregistrement.");
@@ -177,6 +200,7 @@ export default function TagsManager({ onClose }) {
                 if (editingRuleId === ruleId) {
                     cancelEdit();
                 }
+                watchRetag();
             }
         } catch (err) {
             setError("Erreur lors de la suppression.");
@@ -219,9 +243,21 @@ export default function TagsManager({ onClose }) {
                 <div className="tm-info-banner">
                     <div style={{ display: "flex", alignItems: "center", gap: "10px" }}>
                         <span>
-                            Les modifications effectuées ici ne s'appliqueront à vos cartes qu'après avoir synchronisé votre collection depuis le bouton <strong>"Mettre à jour les données"</strong> de votre profil.
+                            Les modifications effectuées ici sont appliquées automatiquement à toutes les cartes de votre collection, en arrière-plan.
                         </span>
                     </div>
+                    {retag && (retag.status === "queued" || retag.status === "processing") && (
+                        <div style={{ marginTop: "8px", fontSize: "0.9rem" }}>
+                            {retag.status === "queued"
+                                ? "Mise à jour des tags en attente..."
+                                : `Mise à jour des tags : ${retag.processed} / ${retag.total} cartes`}
+                        </div>
+                    )}
+                    {retag && retag.status === "error" && (
+                        <div style={{ marginTop: "8px", fontSize: "0.9rem", color: "var(--danger)" }}>
+                            Échec de la mise à jour des tags : {retag.error}
+                        </div>
+                    )}
                 </div>
 
                 {error && (